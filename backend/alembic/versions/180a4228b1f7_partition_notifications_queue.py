@@ -0,0 +1,102 @@
+"""partition telegram_notifications_queue by day
+
+Revision ID: 180a4228b1f7
+Revises: 8d19b58cd314
+Create Date: 2026-10-18 10:12:41.532118
+
+"""
+from typing import Sequence, Union
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '180a4228b1f7'
+down_revision: Union[str, None] = '8d19b58cd314'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RETENTION_DAYS = 7
+PARTITIONS_AHEAD_DAYS = 7
+UNFINISHED_STATUSES = "('PENDING', 'PROCESSING', 'FAILED')"
+
+
+def _create_day_partition(day) -> None:
+    next_day = day + timedelta(days=1)
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS telegram_notifications_queue_p{day:%Y%m%d}
+        PARTITION OF telegram_notifications_queue
+        FOR VALUES FROM ('{day} 00:00:00+00') TO ('{next_day} 00:00:00+00')
+    """)
+
+
+def upgrade() -> None:
+    # Move the old heap table aside; its index names are global and would clash
+    op.execute("ALTER TABLE telegram_notifications_queue RENAME TO telegram_notifications_queue_legacy")
+    op.execute("ALTER TABLE telegram_notifications_queue_legacy RENAME CONSTRAINT telegram_notifications_queue_pkey TO telegram_notifications_queue_legacy_pkey")
+    for index_name in ('id', 'telegram_id', 'user_id', 'status', 'created_at'):
+        op.execute(f"DROP INDEX IF EXISTS ix_telegram_notifications_queue_{index_name}")
+
+    op.execute("UPDATE telegram_notifications_queue_legacy SET created_at = now() WHERE created_at IS NULL")
+
+    # Partitioned parent, the primary key has to include the partition key
+    op.execute("""
+        CREATE TABLE telegram_notifications_queue (
+            LIKE telegram_notifications_queue_legacy INCLUDING DEFAULTS,
+            CONSTRAINT telegram_notifications_queue_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE IF EXISTS telegram_notifications_queue_id_seq OWNED BY telegram_notifications_queue.id")
+
+    # Safety net for rows outside of the daily partitions (e.g. very old unsent messages)
+    op.execute("CREATE TABLE telegram_notifications_queue_default PARTITION OF telegram_notifications_queue DEFAULT")
+
+    today = datetime.now(timezone.utc).date()
+    for offset in range(-RETENTION_DAYS, PARTITIONS_AHEAD_DAYS + 1):
+        _create_day_partition(today + timedelta(days=offset))
+
+    op.create_index('ix_telegram_notifications_queue_telegram_id', 'telegram_notifications_queue', ['telegram_id'], unique=False)
+    op.create_index('ix_telegram_notifications_queue_user_id', 'telegram_notifications_queue', ['user_id'], unique=False)
+    # Small partial index for the sender hot path (PENDING ordered by created_at)
+    op.create_index(
+        'ix_telegram_notifications_queue_unfinished',
+        'telegram_notifications_queue',
+        ['created_at'],
+        unique=False,
+        postgresql_where=sa.text(f"status IN {UNFINISHED_STATUSES}")
+    )
+
+    # Keep unfinished messages and everything inside the retention window
+    op.execute(f"""
+        INSERT INTO telegram_notifications_queue
+        SELECT * FROM telegram_notifications_queue_legacy
+        WHERE status IN {UNFINISHED_STATUSES}
+           OR created_at >= '{today - timedelta(days=RETENTION_DAYS)} 00:00:00+00'
+    """)
+    op.execute("DROP TABLE telegram_notifications_queue_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE telegram_notifications_queue RENAME TO telegram_notifications_queue_partitioned")
+    op.execute("ALTER TABLE telegram_notifications_queue_partitioned RENAME CONSTRAINT telegram_notifications_queue_pkey TO telegram_notifications_queue_partitioned_pkey")
+    for index_name in ('telegram_id', 'user_id', 'unfinished'):
+        op.execute(f"DROP INDEX IF EXISTS ix_telegram_notifications_queue_{index_name}")
+
+    op.execute("""
+        CREATE TABLE telegram_notifications_queue (
+            LIKE telegram_notifications_queue_partitioned INCLUDING DEFAULTS,
+            CONSTRAINT telegram_notifications_queue_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER TABLE telegram_notifications_queue ALTER COLUMN created_at DROP NOT NULL")
+    op.execute("ALTER SEQUENCE IF EXISTS telegram_notifications_queue_id_seq OWNED BY telegram_notifications_queue.id")
+    op.execute("INSERT INTO telegram_notifications_queue SELECT * FROM telegram_notifications_queue_partitioned")
+    op.execute("DROP TABLE telegram_notifications_queue_partitioned")
+
+    op.create_index(op.f('ix_telegram_notifications_queue_id'), 'telegram_notifications_queue', ['id'], unique=False)
+    op.create_index('ix_telegram_notifications_queue_telegram_id', 'telegram_notifications_queue', ['telegram_id'], unique=False)
+    op.create_index('ix_telegram_notifications_queue_user_id', 'telegram_notifications_queue', ['user_id'], unique=False)
+    op.create_index('ix_telegram_notifications_queue_status', 'telegram_notifications_queue', ['status'], unique=False)
+    op.create_index('ix_telegram_notifications_queue_created_at', 'telegram_notifications_queue', ['created_at'], unique=False)
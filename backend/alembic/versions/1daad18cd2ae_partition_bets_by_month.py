@@ -0,0 +1,125 @@
+"""partition bets by month
+
+Revision ID: 1daad18cd2ae
+Revises: bd224d8012c3
+Create Date: 2026-10-18 13:02:16.270584
+
+Low-lock path: the existing heap is neither copied nor rewritten, it is
+attached as bets_legacy holding everything before the partitioning boundary
+(start of next month, so rows inserted meanwhile still fit).
+
+1. Without blocking writes (autocommit): the (id, created_at) unique index
+   and the BRIN index are built CONCURRENTLY, the range CHECK is added
+   NOT VALID and validated separately (SHARE UPDATE EXCLUSIVE only).
+2. In one short transaction under ACCESS EXCLUSIVE (lock_timeout bounded):
+   rename, swap the primary key onto the prebuilt index, create the empty
+   partitioned parent and ATTACH the old table. Matching indexes, foreign
+   keys and the validated CHECK are reused, so nothing is scanned or built.
+"""
+from typing import Sequence, Union
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1daad18cd2ae'
+down_revision: Union[str, None] = 'bd224d8012c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(day, months: int):
+    month_index = day.month - 1 + months
+    return day.replace(year=day.year + month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def upgrade() -> None:
+    # Boundary at the next month start; right before a month end take the one after,
+    # otherwise new bets could violate the CHECK before the swap
+    now = datetime.now(timezone.utc)
+    boundary_month = _add_months(now.date().replace(day=1), 1)
+    if (datetime(boundary_month.year, boundary_month.month, 1, tzinfo=timezone.utc) - now).days < 1:
+        boundary_month = _add_months(boundary_month, 1)
+    boundary = f"{boundary_month} 00:00:00+00"
+
+    # 1. Prepare the old table without blocking bet placement
+    with op.get_context().autocommit_block():
+        # Primary key of a partitioned table must include the partition key
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS bets_legacy_id_created_at_key ON bets (id, created_at)")
+        # BRIN on created_at: tiny, and bets are inserted in created_at order
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS bets_legacy_created_at_brin ON bets USING brin (created_at)")
+
+        op.execute("SET lock_timeout = '5s'")
+        op.execute(f"ALTER TABLE bets ADD CONSTRAINT bets_legacy_range CHECK (created_at < '{boundary}') NOT VALID")
+        op.execute("RESET lock_timeout")
+        op.execute("ALTER TABLE bets VALIDATE CONSTRAINT bets_legacy_range")
+
+    # 2. Swap under a short exclusive lock: catalog changes only
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute("LOCK TABLE bets IN ACCESS EXCLUSIVE MODE")
+
+    op.execute("ALTER TABLE bets RENAME TO bets_legacy")
+    op.execute("DROP INDEX IF EXISTS ix_bets_id")
+    # Index names are schema-wide, free them for the parent
+    op.execute("ALTER INDEX IF EXISTS ix_bets_user_id RENAME TO bets_legacy_user_id_idx")
+    op.execute("ALTER INDEX IF EXISTS ix_bets_market_id RENAME TO bets_legacy_market_id_idx")
+
+    op.execute("ALTER TABLE bets_legacy DROP CONSTRAINT bets_pkey")
+    op.execute("ALTER TABLE bets_legacy ADD CONSTRAINT bets_legacy_pkey PRIMARY KEY USING INDEX bets_legacy_id_created_at_key")
+
+    # Partitioned parent with the same columns
+    op.execute("""
+        CREATE TABLE bets (
+            LIKE bets_legacy INCLUDING DEFAULTS,
+            CONSTRAINT bets_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE IF EXISTS bets_id_seq OWNED BY bets.id")
+    op.execute("ALTER TABLE bets ADD CONSTRAINT bets_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)")
+    op.execute("ALTER TABLE bets ADD CONSTRAINT bets_market_id_fkey FOREIGN KEY (market_id) REFERENCES markets (id)")
+    op.create_index('ix_bets_user_id', 'bets', ['user_id'], unique=False)
+    op.create_index('ix_bets_market_id', 'bets', ['market_id'], unique=False)
+    op.create_index('ix_bets_created_at_brin', 'bets', ['created_at'], unique=False, postgresql_using='brin')
+
+    # The old table is the historical partition; the validated CHECK lets ATTACH skip the scan
+    # and its prebuilt indexes are attached to the parent's instead of being rebuilt
+    op.execute(f"ALTER TABLE bets ATTACH PARTITION bets_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary}')")
+    op.execute("ALTER TABLE bets_legacy DROP CONSTRAINT bets_legacy_range")
+
+    # Monthly partitions from the boundary on, DEFAULT as a safety net (all empty)
+    for offset in range(MONTHS_AHEAD):
+        month = _add_months(boundary_month, offset)
+        next_month = _add_months(boundary_month, offset + 1)
+        op.execute(f"""
+            CREATE TABLE bets_p{month:%Y%m} PARTITION OF bets
+            FOR VALUES FROM ('{month} 00:00:00+00') TO ('{next_month} 00:00:00+00')
+        """)
+    op.execute("CREATE TABLE bets_default PARTITION OF bets DEFAULT")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE bets RENAME TO bets_partitioned")
+    op.execute("ALTER TABLE bets_partitioned RENAME CONSTRAINT bets_pkey TO bets_partitioned_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_bets_created_at_brin")
+    op.execute("DROP INDEX IF EXISTS ix_bets_user_id")
+    op.execute("DROP INDEX IF EXISTS ix_bets_market_id")
+
+    op.execute("""
+        CREATE TABLE bets (
+            LIKE bets_partitioned INCLUDING DEFAULTS,
+            CONSTRAINT bets_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE IF EXISTS bets_id_seq OWNED BY bets.id")
+    op.execute("INSERT INTO bets SELECT * FROM bets_partitioned")
+    op.execute("DROP TABLE bets_partitioned")
+
+    op.create_foreign_key('bets_user_id_fkey', 'bets', 'users', ['user_id'], ['id'])
+    op.create_foreign_key('bets_market_id_fkey', 'bets', 'markets', ['market_id'], ['id'])
+    op.create_index(op.f('ix_bets_id'), 'bets', ['id'], unique=False)
+    op.create_index(op.f('ix_bets_user_id'), 'bets', ['user_id'], unique=False)
+    op.create_index(op.f('ix_bets_market_id'), 'bets', ['market_id'], unique=False)
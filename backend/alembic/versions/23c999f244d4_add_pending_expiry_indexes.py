@@ -0,0 +1,37 @@
+"""add pending expiry indexes
+
+Revision ID: 23c999f244d4
+Revises: 6a19e566037d
+Create Date: 2026-10-18 18:02:37.614829
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '23c999f244d4'
+down_revision: Union[str, None] = '6a19e566037d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Expiry sweeper scans only pending rows, ordered by expires_at
+    op.execute("""
+        CREATE INDEX ix_transactions_pending_deposit_expires
+        ON transactions (expires_at)
+        WHERE status = 'PENDING' AND type = 'DEPOSIT' AND expires_at IS NOT NULL
+    """)
+    op.execute("""
+        CREATE INDEX ix_payments_pending_expires
+        ON payments (expires_at)
+        WHERE status = 'PENDING' AND expires_at IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_payments_pending_expires")
+    op.execute("DROP INDEX IF EXISTS ix_transactions_pending_deposit_expires")
@@ -0,0 +1,26 @@
+"""add index on users.referrer_id
+
+Revision ID: 268cce572893
+Revises: 57d22b972ecb
+Create Date: 2026-10-18 11:41:09.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '268cce572893'
+down_revision: Union[str, None] = '57d22b972ecb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_referrer_id', 'users', ['referrer_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_referrer_id', table_name='users')
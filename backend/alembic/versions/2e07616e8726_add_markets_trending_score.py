@@ -0,0 +1,62 @@
+"""add markets trending score
+
+Revision ID: 2e07616e8726
+Revises: d540564eaf77
+Create Date: 2026-10-18 15:12:37.904115
+
+"""
+from typing import Sequence, Union
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e07616e8726'
+down_revision: Union[str, None] = 'd540564eaf77'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same constants as TrendingService with the default 24h half-life
+EPOCH = '2025-01-01 00:00:00+00'
+TAU_SECONDS = 24 * 3600 / math.log(2)
+TON_TO_PRED_RATE = 1000
+
+
+def upgrade() -> None:
+    op.add_column('markets', sa.Column('trending_score', sa.Float(), nullable=True))
+
+    # Seed from recent bets (views have no timestamps), log-sum-exp per market
+    op.execute(f"""
+        WITH events AS (
+            SELECT market_id,
+                   ln(1 + ln(1 + amount * CASE WHEN currency::text = 'TON' THEN {TON_TO_PRED_RATE} ELSE 1 END) / 10)
+                   + extract(epoch FROM created_at - timestamptz '{EPOCH}') / {TAU_SECONDS} AS score
+            FROM bets
+            WHERE created_at >= now() - interval '14 days'
+        ),
+        peak AS (
+            SELECT market_id, MAX(score) AS max_score FROM events GROUP BY market_id
+        )
+        UPDATE markets m
+        SET trending_score = s.score
+        FROM (
+            SELECT e.market_id, p.max_score + ln(SUM(exp(e.score - p.max_score))) AS score
+            FROM events e
+            JOIN peak p ON p.market_id = e.market_id
+            GROUP BY e.market_id, p.max_score
+        ) s
+        WHERE m.id = s.market_id
+    """)
+
+    op.execute("""
+        CREATE INDEX ix_markets_trending_open
+        ON markets (trending_score DESC NULLS LAST)
+        WHERE status = 'OPEN'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_markets_trending_open")
+    op.drop_column('markets', 'trending_score')
@@ -0,0 +1,34 @@
+"""add market auto close index
+
+Revision ID: 48ad5287d7d1
+Revises: afeccb56a6ee
+Create Date: 2026-10-18 16:04:26.730518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '48ad5287d7d1'
+down_revision: Union[str, None] = 'afeccb56a6ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE INDEX ix_markets_resolve_date_open
+        ON markets (resolve_date)
+        WHERE status = 'OPEN' AND resolve_date IS NOT NULL
+    """)
+
+    # Add MARKET_CLOSED to NotificationType enum
+    op.execute("ALTER TYPE notificationtype ADD VALUE IF NOT EXISTS 'MARKET_CLOSED'")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_markets_resolve_date_open")
+    # PostgreSQL doesn't support removing enum values, MARKET_CLOSED stays unused
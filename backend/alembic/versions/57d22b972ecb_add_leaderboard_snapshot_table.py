@@ -0,0 +1,44 @@
+"""add leaderboard_snapshot table
+
+Revision ID: 57d22b972ecb
+Revises: 180a4228b1f7
+Create Date: 2026-10-18 11:03:27.904415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '57d22b972ecb'
+down_revision: Union[str, None] = '180a4228b1f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'leaderboard_snapshot',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('period_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('profit', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('bets_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('reward_amount', sa.Integer(), nullable=True),
+        sa.Column('reward_currency', sa.String(length=10), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['period_id'], ['leaderboard_periods.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_leaderboard_snapshot_period_rank', 'leaderboard_snapshot', ['period_id', 'rank'], unique=True)
+    op.create_index('ix_leaderboard_snapshot_user_period', 'leaderboard_snapshot', ['user_id', 'period_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_leaderboard_snapshot_user_period', table_name='leaderboard_snapshot')
+    op.drop_index('ix_leaderboard_snapshot_period_rank', table_name='leaderboard_snapshot')
+    op.drop_table('leaderboard_snapshot')
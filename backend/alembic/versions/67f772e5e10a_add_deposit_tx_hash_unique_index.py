@@ -0,0 +1,53 @@
+"""add deposit tx_hash unique index
+
+Revision ID: 67f772e5e10a
+Revises: 9669e15f16cc
+Create Date: 2026-10-18 20:04:13.218764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '67f772e5e10a'
+down_revision: Union[str, None] = '9669e15f16cc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # One on-chain transfer credits at most one deposit (watcher and manual verify).
+    # The old verify endpoint never rejected a reused hash, so existing duplicates
+    # have to be reconciled by hand before uniqueness can be enforced.
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text("""
+        SELECT tx_hash, array_agg(id ORDER BY id) AS ids
+        FROM transactions
+        WHERE type = 'DEPOSIT' AND tx_hash IS NOT NULL
+        GROUP BY tx_hash
+        HAVING count(*) > 1
+        ORDER BY tx_hash
+    """)).all()
+    if duplicates:
+        report = "\n".join(f"  {row.tx_hash}: transactions {list(row.ids)}" for row in duplicates)
+        raise RuntimeError(
+            f"{len(duplicates)} deposit tx_hash values are used by more than one transaction. "
+            f"Reconcile them (clear tx_hash on the duplicate deposits) and rerun the migration:\n{report}"
+        )
+
+    with op.get_context().autocommit_block():
+        # A failed CONCURRENTLY build leaves an INVALID index behind; rebuild it
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_transactions_deposit_tx_hash")
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY ix_transactions_deposit_tx_hash
+            ON transactions (tx_hash)
+            WHERE type = 'DEPOSIT' AND tx_hash IS NOT NULL
+        """)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_transactions_deposit_tx_hash")
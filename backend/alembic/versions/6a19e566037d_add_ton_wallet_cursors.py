@@ -0,0 +1,40 @@
+"""add ton wallet cursors
+
+Revision ID: 6a19e566037d
+Revises: f00a6f9f3801
+Create Date: 2026-10-18 17:41:26.905317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a19e566037d'
+down_revision: Union[str, None] = 'f00a6f9f3801'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ton_wallet_cursors',
+        sa.Column('address', sa.String(length=255), nullable=False),
+        sa.Column('last_lt', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('address')
+    )
+
+    # Deposit watcher matches memo-less transfers by amount among pending deposits only
+    op.execute("""
+        CREATE INDEX ix_transactions_pending_deposit_amount
+        ON transactions (amount)
+        WHERE status = 'PENDING' AND type = 'DEPOSIT'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_transactions_pending_deposit_amount")
+    op.drop_table('ton_wallet_cursors')
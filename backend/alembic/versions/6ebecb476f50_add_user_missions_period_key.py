@@ -0,0 +1,52 @@
+"""add user_missions period key
+
+Revision ID: 6ebecb476f50
+Revises: e722d425bf27
+Create Date: 2026-10-18 16:55:48.216093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6ebecb476f50'
+down_revision: Union[str, None] = 'e722d425bf27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_missions', sa.Column('period_key', sa.String(length=20), nullable=False, server_default='all'))
+
+    # Existing daily/weekly progress belongs to the current period
+    op.execute("""
+        UPDATE user_missions um
+        SET period_key = CASE m.type
+            WHEN 'daily' THEN 'day:' || to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD')
+            ELSE 'week:' || to_char(date_trunc('week', now() AT TIME ZONE 'UTC'), 'YYYY-MM-DD')
+        END
+        FROM missions m
+        WHERE m.id = um.mission_id AND m.type IN ('daily', 'weekly')
+    """)
+
+    op.execute("ALTER TABLE user_missions DROP CONSTRAINT user_missions_pkey")
+    op.create_primary_key('user_missions_pkey', 'user_missions', ['user_id', 'mission_id', 'period_key'])
+    op.create_index(op.f('ix_user_missions_period_key'), 'user_missions', ['period_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_missions_period_key'), table_name='user_missions')
+    # Keep only the latest period per (user, mission)
+    op.execute("""
+        DELETE FROM user_missions um
+        USING user_missions newer
+        WHERE newer.user_id = um.user_id
+          AND newer.mission_id = um.mission_id
+          AND newer.period_key > um.period_key
+    """)
+    op.execute("ALTER TABLE user_missions DROP CONSTRAINT user_missions_pkey")
+    op.create_primary_key('user_missions_pkey', 'user_missions', ['user_id', 'mission_id'])
+    op.drop_column('user_missions', 'period_key')
@@ -0,0 +1,48 @@
+"""add payment webhook inbox
+
+Revision ID: 9669e15f16cc
+Revises: 23c999f244d4
+Create Date: 2026-10-18 19:12:47.530218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9669e15f16cc'
+down_revision: Union[str, None] = '23c999f244d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'payment_webhook_inbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('invoice_id', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('invoice_id', 'status', name='uq_payment_webhook_inbox_invoice_status')
+    )
+    op.create_index('ix_payment_webhook_inbox_invoice_id', 'payment_webhook_inbox', ['invoice_id'])
+
+    # Inbox worker reads only unprocessed events
+    op.execute("""
+        CREATE INDEX ix_payment_webhook_inbox_unprocessed
+        ON payment_webhook_inbox (received_at)
+        WHERE processed_at IS NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_payment_webhook_inbox_unprocessed")
+    op.drop_index('ix_payment_webhook_inbox_invoice_id', table_name='payment_webhook_inbox')
+    op.drop_table('payment_webhook_inbox')
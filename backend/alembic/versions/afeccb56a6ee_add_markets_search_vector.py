@@ -0,0 +1,39 @@
+"""add markets search vector
+
+Revision ID: afeccb56a6ee
+Revises: 2e07616e8726
+Create Date: 2026-10-18 15:38:52.117430
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'afeccb56a6ee'
+down_revision: Union[str, None] = '2e07616e8726'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated column: kept in sync by Postgres on every title/description change
+    op.execute("""
+        ALTER TABLE markets ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.create_index('ix_markets_search_vector', 'markets', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index(op.f('ix_markets_category'), 'markets', ['category'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_markets_category'), table_name='markets')
+    op.drop_index('ix_markets_search_vector', table_name='markets')
+    op.drop_column('markets', 'search_vector')
@@ -0,0 +1,69 @@
+"""add user_stats table
+
+Revision ID: bd224d8012c3
+Revises: 268cce572893
+Create Date: 2026-10-18 12:20:52.641770
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bd224d8012c3'
+down_revision: Union[str, None] = '268cce572893'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('period_key', sa.String(length=20), nullable=False),
+        sa.Column('realized_profit', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('volume_pred', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('volume_ton', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('bets_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('wins', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('losses', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('current_streak', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('best_streak', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'period_key')
+    )
+
+    # Backfill from existing bets (same aggregation as UserStatsService.reconcile)
+    op.execute("""
+        INSERT INTO user_stats (user_id, period_key, realized_profit, volume_pred, volume_ton, bets_count, wins, losses)
+        SELECT
+            b.user_id,
+            k.period_key,
+            COALESCE(SUM(CASE WHEN b.status = 'WON' THEN b.payout - b.amount
+                              WHEN b.status = 'LOST' THEN -b.amount ELSE 0 END), 0),
+            COALESCE(SUM(b.amount) FILTER (WHERE b.currency = 'PRED'), 0),
+            COALESCE(SUM(b.amount) FILTER (WHERE b.currency = 'TON'), 0),
+            COUNT(*),
+            COUNT(*) FILTER (WHERE b.status = 'WON'),
+            COUNT(*) FILTER (WHERE b.status = 'LOST')
+        FROM bets b
+        CROSS JOIN LATERAL (VALUES
+            ('all'),
+            ('week:' || to_char(date_trunc('week', b.created_at AT TIME ZONE 'UTC'), 'YYYY-MM-DD')),
+            ('month:' || to_char(b.created_at AT TIME ZONE 'UTC', 'YYYY-MM'))
+        ) AS k(period_key)
+        GROUP BY b.user_id, k.period_key
+    """)
+    op.execute("""
+        UPDATE user_stats s
+        SET current_streak = u.win_streak, best_streak = u.win_streak
+        FROM users u
+        WHERE u.id = s.user_id AND s.period_key = 'all'
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_stats')
@@ -0,0 +1,60 @@
+"""add market odds history
+
+Revision ID: d540564eaf77
+Revises: f3631f41daea
+Create Date: 2026-10-18 14:41:09.552871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd540564eaf77'
+down_revision: Union[str, None] = 'f3631f41daea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'market_odds_ticks',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('market_id', sa.BigInteger(), nullable=False),
+        sa.Column('yes_odds', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('no_odds', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('yes_pool_pred', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('no_pool_pred', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('yes_pool_ton', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('no_pool_ton', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_market_odds_ticks_market_created', 'market_odds_ticks', ['market_id', 'created_at'], unique=False)
+    op.create_index('ix_market_odds_ticks_created_at_brin', 'market_odds_ticks', ['created_at'], unique=False, postgresql_using='brin')
+
+    op.create_table(
+        'market_odds_history',
+        sa.Column('market_id', sa.BigInteger(), nullable=False),
+        sa.Column('resolution', sa.String(length=2), nullable=False),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('yes_open', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('yes_high', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('yes_low', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('yes_close', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('no_close', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('ticks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('market_id', 'resolution', 'bucket')
+    )
+    op.create_index('ix_market_odds_history_resolution_bucket', 'market_odds_history', ['resolution', 'bucket'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_market_odds_history_resolution_bucket', table_name='market_odds_history')
+    op.drop_table('market_odds_history')
+    op.drop_index('ix_market_odds_ticks_created_at_brin', table_name='market_odds_ticks')
+    op.drop_index('ix_market_odds_ticks_market_created', table_name='market_odds_ticks')
+    op.drop_table('market_odds_ticks')
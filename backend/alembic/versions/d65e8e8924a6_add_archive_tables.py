@@ -0,0 +1,58 @@
+"""add archived_markets and archived_bets tables
+
+Revision ID: d65e8e8924a6
+Revises: 1daad18cd2ae
+Create Date: 2026-10-18 13:47:30.512993
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd65e8e8924a6'
+down_revision: Union[str, None] = '1daad18cd2ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'archived_markets',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('title', sa.String(length=500), nullable=False),
+        sa.Column('category', sa.String(length=100), nullable=True),
+        sa.Column('outcome', sa.String(length=20), nullable=True),
+        sa.Column('total_volume_pred', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('total_volume_ton', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('bets_count', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archive_uri', sa.String(length=500), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_table(
+        'archived_bets',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('market_id', sa.BigInteger(), nullable=False),
+        sa.Column('position', sa.String(length=10), nullable=False),
+        sa.Column('amount', sa.DECIMAL(precision=20, scale=2), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('odds', sa.DECIMAL(precision=5, scale=2), nullable=False),
+        sa.Column('potential_win', sa.DECIMAL(precision=20, scale=2), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('payout', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_archived_bets_user_created', 'archived_bets', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_archived_bets_user_created', table_name='archived_bets')
+    op.drop_table('archived_bets')
+    op.drop_table('archived_markets')
@@ -0,0 +1,50 @@
+"""add markets promotion rank
+
+Revision ID: e722d425bf27
+Revises: 48ad5287d7d1
+Create Date: 2026-10-18 16:27:13.402958
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e722d425bf27'
+down_revision: Union[str, None] = '48ad5287d7d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Expire promotions that ended before the sweeper existed
+    op.execute("""
+        UPDATE markets SET is_promoted = 'none'
+        WHERE is_promoted <> 'none' AND promoted_until IS NOT NULL AND promoted_until <= now()
+    """)
+
+    op.execute("""
+        ALTER TABLE markets ADD COLUMN promotion_rank smallint
+        GENERATED ALWAYS AS (
+            CASE is_promoted WHEN 'premium' THEN 2 WHEN 'basic' THEN 1 ELSE 0 END
+        ) STORED NOT NULL
+    """)
+
+    op.execute("""
+        CREATE INDEX ix_markets_listing
+        ON markets (status, promotion_rank DESC, total_volume_pred DESC, created_at DESC)
+        WHERE moderation_status = 'APPROVED'
+    """)
+    op.execute("""
+        CREATE INDEX ix_markets_promoted_until_active
+        ON markets (promoted_until)
+        WHERE is_promoted <> 'none' AND promoted_until IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_markets_promoted_until_active")
+    op.execute("DROP INDEX IF EXISTS ix_markets_listing")
+    op.drop_column('markets', 'promotion_rank')
@@ -0,0 +1,27 @@
+"""add user_missions claim key
+
+Revision ID: f00a6f9f3801
+Revises: 6ebecb476f50
+Create Date: 2026-10-18 17:20:11.482530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f00a6f9f3801'
+down_revision: Union[str, None] = '6ebecb476f50'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Idempotency key of the request that claimed the reward (retries get the same response)
+    op.add_column('user_missions', sa.Column('claim_key', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user_missions', 'claim_key')
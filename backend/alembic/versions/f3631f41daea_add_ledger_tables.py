@@ -0,0 +1,93 @@
+"""add ledger tables
+
+Revision ID: f3631f41daea
+Revises: d65e8e8924a6
+Create Date: 2026-10-18 14:05:41.318207
+
+ledger_entries is append-only (enforced by a trigger). Current cached
+balances are seeded as opening entries against system:opening, so that
+journal-derived balances match users.*_balance from the start.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3631f41daea'
+down_revision: Union[str, None] = 'd65e8e8924a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ledger_entries',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('txn_id', sa.String(length=36), nullable=False),
+        sa.Column('account', sa.String(length=50), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=True),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('amount', sa.DECIMAL(precision=20, scale=2), nullable=False),
+        sa.Column('entry_type', sa.String(length=30), nullable=False),
+        sa.Column('reference', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ledger_entries_user_id_id', 'ledger_entries', ['user_id', 'id'], unique=False)
+    op.create_index('ix_ledger_entries_txn_id', 'ledger_entries', ['txn_id'], unique=False)
+    op.create_index('ix_ledger_entries_created_at_brin', 'ledger_entries', ['created_at'], unique=False, postgresql_using='brin')
+
+    op.create_table(
+        'balance_snapshots',
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('balance', sa.DECIMAL(precision=20, scale=2), nullable=False, server_default='0'),
+        sa.Column('last_entry_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'currency')
+    )
+
+    # Append-only journal
+    op.execute("""
+        CREATE OR REPLACE FUNCTION ledger_entries_append_only() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'ledger_entries is append-only';
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER ledger_entries_no_update_delete
+        BEFORE UPDATE OR DELETE ON ledger_entries
+        FOR EACH ROW EXECUTE FUNCTION ledger_entries_append_only()
+    """)
+
+    # Opening balances: user leg + system:opening leg per (user, currency)
+    op.execute("""
+        INSERT INTO ledger_entries (txn_id, account, user_id, currency, amount, entry_type, reference)
+        SELECT 'opening-' || c.currency || '-' || u.id, leg.account, leg.user_id, c.currency,
+               leg.sign * c.balance, 'opening', 'user:' || u.id
+        FROM users u
+        CROSS JOIN LATERAL (VALUES ('PRED', u.pred_balance), ('TON', u.ton_balance)) AS c(currency, balance)
+        CROSS JOIN LATERAL (VALUES ('user', u.id, 1), ('system:opening', NULL::bigint, -1)) AS leg(account, user_id, sign)
+        WHERE c.balance <> 0
+        ORDER BY u.id, c.currency, leg.sign DESC
+    """)
+    op.execute("""
+        INSERT INTO balance_snapshots (user_id, currency, balance, last_entry_id)
+        SELECT user_id, currency, SUM(amount), MAX(id)
+        FROM ledger_entries
+        WHERE account = 'user'
+        GROUP BY user_id, currency
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('balance_snapshots')
+    op.execute("DROP TRIGGER IF EXISTS ledger_entries_no_update_delete ON ledger_entries")
+    op.execute("DROP FUNCTION IF EXISTS ledger_entries_append_only()")
+    op.drop_index('ix_ledger_entries_created_at_brin', table_name='ledger_entries')
+    op.drop_index('ix_ledger_entries_txn_id', table_name='ledger_entries')
+    op.drop_index('ix_ledger_entries_user_id_id', table_name='ledger_entries')
+    op.drop_table('ledger_entries')
@@ -2,18 +2,25 @@
 Admin Panel API Endpoints
 Requires admin authentication (to be implemented)
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc, case, String, or_, and_
-from app.core.database import get_db
+from app.core.database import get_db, AsyncSessionLocal
 from app.models.user import User
 from app.models.market import Market, MarketStatus, MarketOutcome, ModerationStatus
 from app.models.bet import Bet, BetStatus
 from app.models.mission import Mission
-from pydantic import BaseModel
+from app.services.ledger_service import LedgerService
+from app.services.mission_service import MissionService
+from app.services.user_stats_service import UserStatsService
+from app.services.withdrawal_batch_service import WithdrawalBatchService
+from pydantic import BaseModel, Field
 from decimal import Decimal
 from typing import List, Optional
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -242,8 +249,8 @@ async def resolve_market(
     if not market:
         raise HTTPException(status_code=404, detail="Market not found")
 
-    if market.status != MarketStatus.OPEN:
-        raise HTTPException(status_code=400, detail="Market is not open")
+    if market.status not in (MarketStatus.OPEN, MarketStatus.CLOSED):
+        raise HTTPException(status_code=400, detail="Market is already resolved or cancelled")
 
     # Parse outcome
     outcome = resolve_data.outcome.upper()
@@ -262,6 +269,7 @@ async def resolve_market(
         select(Bet).where(Bet.market_id == market_id, Bet.status == BetStatus.PENDING)
     )
     bets = bets_result.scalars().all()
+    ledger_moves = []
 
     if outcome == "CANCELLED":
         # Refund all bets
@@ -277,6 +285,9 @@ async def resolve_market(
                 user.pred_balance += bet.amount
             else:
                 user.ton_balance += bet.amount
+            ledger_moves.append(LedgerService.movement(
+                bet.user_id, bet.amount, bet.currency, "refund", LedgerService.BETS, f"bet:{bet.id}"
+            ))
 
     else:
         # Calculate payouts for winners
@@ -290,6 +301,8 @@ async def resolve_market(
             winning_pool = market.no_pool_pred if bets[0].currency == "PRED" else market.no_pool_ton
             losing_pool = market.yes_pool_pred if bets[0].currency == "PRED" else market.yes_pool_ton
 
+        stats_results = []
+
         for bet in bets:
             user_result = await db.execute(select(User).where(User.id == bet.user_id))
             user = user_result.scalar_one()
@@ -310,10 +323,14 @@ async def resolve_market(
                     user.pred_balance += bet.payout
                 else:
                     user.ton_balance += bet.payout
+                ledger_moves.append(LedgerService.movement(
+                    bet.user_id, bet.payout, bet.currency, "payout", LedgerService.BETS, f"bet:{bet.id}"
+                ))
 
                 # Update user stats
                 user.total_wins += 1
                 user.win_streak += 1
+                stats_results.append((bet.user_id, bet.created_at, True, bet.payout - bet.amount))
 
                 # Update rank based on win streak
                 if user.win_streak >= 50:
@@ -337,17 +354,26 @@ async def resolve_market(
                 # Update user stats
                 user.total_losses += 1
                 user.win_streak = 0  # Reset streak
+                stats_results.append((bet.user_id, bet.created_at, False, -bet.amount))
 
                 # Potentially downrank
                 if user.total_losses > user.total_wins * 2:
                     user.rank = "Bronze"
 
+        # Realised profit / wins / losses in user_stats, same transaction
+        await UserStatsService.record_bets_resolved(db, stats_results)
+
+    # Balance movements go to the ledger in one bulk insert
+    await LedgerService.post(db, ledger_moves)
+
     await db.commit()
 
-    # Update mission progress for all users who had bets on this market
+    # Update mission progress for all users who had bets on this market (in the background)
     try:
         from app.services.mission_service import MissionService
         user_ids = set(bet.user_id for bet in bets)
+        if await MissionService.schedule_refresh(user_ids):
+            user_ids = set()
         for user_id in user_ids:
             try:
                 await MissionService.check_and_update_all_missions(db, user_id)
@@ -577,18 +603,28 @@ async def update_user_balance(
     Manually update user balance (admin only)
     """
 
-    result = await db.execute(select(User).where(User.id == user_id))
+    # Row lock: the ledger adjustment is the difference with the current balance
+    result = await db.execute(select(User).where(User.id == user_id).with_for_update())
     user = result.scalar_one_or_none()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    ledger_moves = []
+
     if pred_balance is not None:
+        ledger_moves.append(LedgerService.movement(
+            user_id, pred_balance - user.pred_balance, "PRED", "admin_adjustment", LedgerService.ADJUSTMENTS
+        ))
         user.pred_balance = pred_balance
 
     if ton_balance is not None:
+        ledger_moves.append(LedgerService.movement(
+            user_id, ton_balance - user.ton_balance, "TON", "admin_adjustment", LedgerService.ADJUSTMENTS
+        ))
         user.ton_balance = ton_balance
 
+    await LedgerService.post(db, ledger_moves)
     await db.commit()
 
     return {
@@ -655,19 +691,14 @@ async def get_user_activity(
     )
     recent_bets = bets_result.scalars().all()
 
-    # Calculate profit
-    profit_result = await db.execute(
-        select(
-            func.sum(
-                case(
-                    (Bet.status == BetStatus.WON, Bet.payout - Bet.amount),
-                    (Bet.status == BetStatus.LOST, -Bet.amount),
-                    else_=Decimal("0.00")
-                )
-            )
-        ).where(Bet.user_id == user_id)
-    )
-    total_profit = profit_result.scalar() or Decimal("0.00")
+    # Profit from denormalised user_stats (primary key lookup)
+    total_profit = await UserStatsService.get_profit(db, user_id)
+
+    # Balances derived from the ledger (latest snapshot + journal tail), next to the cached ones
+    ledger_balances = {
+        currency.lower(): await LedgerService.get_balance(db, user_id, currency)
+        for currency in ("PRED", "TON")
+    }
 
     return {
         "user_id": user.id,
@@ -677,6 +708,7 @@ async def get_user_activity(
             "pred": user.pred_balance,
             "ton": user.ton_balance
         },
+        "ledger_balances": ledger_balances,
         "stats": {
             "total_bets": user.total_bets,
             "total_wins": user.total_wins,
@@ -848,8 +880,8 @@ async def close_market(
     if not market:
         raise HTTPException(status_code=404, detail="Market not found")
 
-    if market.status != MarketStatus.OPEN:
-        raise HTTPException(status_code=400, detail="Market is not open")
+    if market.status not in (MarketStatus.OPEN, MarketStatus.CLOSED):
+        raise HTTPException(status_code=400, detail="Market is already resolved or cancelled")
 
     market.status = MarketStatus.CLOSED
 
@@ -888,6 +920,7 @@ async def cancel_market(
     bets = bets_result.scalars().all()
 
     refunded_count = 0
+    ledger_moves = []
     for bet in bets:
         bet.status = BetStatus.REFUNDED
         bet.payout = bet.amount
@@ -900,9 +933,13 @@ async def cancel_market(
             user.pred_balance += bet.amount
         else:
             user.ton_balance += bet.amount
+        ledger_moves.append(LedgerService.movement(
+            bet.user_id, bet.amount, bet.currency, "refund", LedgerService.BETS, f"bet:{bet.id}"
+        ))
 
         refunded_count += 1
 
+    await LedgerService.post(db, ledger_moves)
     await db.commit()
 
     return {
@@ -954,6 +991,23 @@ async def get_all_missions(
     return [MissionResponse.model_validate(mission) for mission in missions]
 
 
+async def _backfill_mission_progress(mission: Mission) -> None:
+    """
+    Recompute progress of all users for a new or edited mission (set-based)
+
+    Runs in its own session, so a failed backfill never rolls back (and
+    expires) the request session's objects.
+    """
+    mission_id = mission.id
+    async with AsyncSessionLocal() as db:
+        try:
+            await MissionService.backfill_mission(db, mission)
+        except Exception as e:
+            # Progress is still updated per user on the next missions request
+            await db.rollback()
+            logger.error(f"Failed to backfill progress for mission {mission_id}: {e}")
+
+
 @router.post("/missions")
 async def create_mission(
     mission_data: CreateMissionRequest,
@@ -975,6 +1029,8 @@ async def create_mission(
     await db.commit()
     await db.refresh(new_mission)
 
+    await _backfill_mission_progress(new_mission)
+
     return {
         "id": new_mission.id,
         "title": new_mission.title,
@@ -1005,6 +1061,9 @@ async def update_mission(
     mission.is_active = mission_data.is_active
 
     await db.commit()
+    await db.refresh(mission)
+
+    await _backfill_mission_progress(mission)
 
     return {
         "id": mission_id,
@@ -2613,6 +2672,10 @@ async def reject_withdrawal(
         
         # Refund PRED to user
         user.pred_balance += withdrawal.pred_amount
+        await LedgerService.record(
+            db, user.id, withdrawal.pred_amount, "PRED", "withdrawal_refund", LedgerService.WITHDRAWALS,
+            f"withdrawal:{withdrawal.id}"
+        )
         
         # Update withdrawal
         withdrawal.status = WithdrawalStatus.REJECTED
@@ -2651,6 +2714,119 @@ async def reject_withdrawal(
         raise HTTPException(status_code=500, detail="Failed to reject withdrawal")
 
 
+class WithdrawalPayoutRequest(BaseModel):
+    """Request model for building a payout batch"""
+    withdrawal_ids: Optional[List[int]] = None  # Default: oldest pending requests
+    limit: int = Field(WithdrawalBatchService.MAX_BATCH_SIZE, ge=1, le=WithdrawalBatchService.MAX_BATCH_SIZE)
+
+
+class WithdrawalBatchApproveRequest(BaseModel):
+    """Request model for approving withdrawals paid by one multi-send transaction"""
+    withdrawal_ids: List[int] = Field(..., min_length=1, max_length=WithdrawalBatchService.MAX_BATCH_SIZE)
+    tx_hash: str
+    admin_note: Optional[str] = None
+
+
+class WithdrawalBatchRejectRequest(BaseModel):
+    """Request model for rejecting withdrawals in bulk"""
+    withdrawal_ids: List[int] = Field(..., min_length=1, max_length=WithdrawalBatchService.MAX_BATCH_SIZE)
+    reason: str
+
+
+@router.post("/withdrawals/batch/payout")
+async def build_withdrawal_payout(
+    request: WithdrawalPayoutRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Move pending withdrawals to PROCESSING and download the payout file
+
+    Returns a CSV (address,amount in TON) for a multi-send wallet.
+    After sending, approve the same IDs with the payout tx_hash
+    (IDs are listed in the X-Withdrawal-Ids header).
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    try:
+        payout = await WithdrawalBatchService.export_payout(
+            db, withdrawal_ids=request.withdrawal_ids, limit=request.limit
+        )
+    except Exception as e:
+        logger.error(f"Error building withdrawal payout: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to build withdrawal payout")
+
+    filename = f"payout_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(
+        content=payout["file"],
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Withdrawal-Ids": ",".join(str(i) for i in payout["withdrawal_ids"]),
+            "X-Total-Ton": str(payout["total_ton"]),
+        }
+    )
+
+
+@router.post("/withdrawals/batch/approve")
+async def approve_withdrawals_batch(
+    request: WithdrawalBatchApproveRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Approve many withdrawals paid by one multi-send transaction
+
+    - Updates withdrawals and their transactions to COMPLETED in one DB transaction
+    - Queues a notification for every user
+    - Requests that are not PENDING/PROCESSING are skipped
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    try:
+        approved = await WithdrawalBatchService.approve(
+            db, request.withdrawal_ids, request.tx_hash, request.admin_note
+        )
+    except Exception as e:
+        logger.error(f"Error approving withdrawals batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to approve withdrawals")
+
+    return {
+        "success": True,
+        "approved": approved,
+        "skipped": sorted(set(request.withdrawal_ids) - set(approved)),
+        "tx_hash": request.tx_hash
+    }
+
+
+@router.post("/withdrawals/batch/reject")
+async def reject_withdrawals_batch(
+    request: WithdrawalBatchRejectRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Reject many withdrawals at once
+
+    - Refunds PRED to user balances (with ledger entries)
+    - Queues a notification for every user
+    - Requests that are not PENDING/PROCESSING are skipped
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    try:
+        rejected = await WithdrawalBatchService.reject(db, request.withdrawal_ids, request.reason)
+    except Exception as e:
+        logger.error(f"Error rejecting withdrawals batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to reject withdrawals")
+
+    return {
+        "success": True,
+        "rejected": rejected,
+        "skipped": sorted(set(request.withdrawal_ids) - set(rejected))
+    }
+
+
 @router.get("/withdrawals/stats")
 async def get_withdrawal_stats(db: AsyncSession = Depends(get_db)):
     """Get withdrawal statistics"""
@@ -2689,3 +2865,70 @@ async def get_withdrawal_stats(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         logger.error(f"Error getting withdrawal stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get withdrawal stats")
+
+
+# ============ Payment Webhooks ============
+
+class PaymentWebhookEventResponse(BaseModel):
+    """CryptoCloud webhook inbox event"""
+    id: int
+    invoice_id: str
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    received_at: datetime
+    processed_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class PaymentWebhookReplayRequest(BaseModel):
+    """Request model for replaying stored webhooks"""
+    event_ids: Optional[List[int]] = None
+    invoice_id: Optional[str] = None
+
+
+@router.get("/payments/webhooks", response_model=List[PaymentWebhookEventResponse])
+async def get_payment_webhooks(
+    invoice_id: Optional[str] = Query(None, description="Filter by invoice ID"),
+    only_problems: bool = Query(False, description="Only unprocessed or failed events"),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get stored CryptoCloud webhooks (newest first)"""
+    from app.models.payment import PaymentWebhookEvent
+
+    query = select(PaymentWebhookEvent).order_by(desc(PaymentWebhookEvent.received_at)).limit(limit)
+    if invoice_id:
+        query = query.where(PaymentWebhookEvent.invoice_id == invoice_id)
+    if only_problems:
+        query = query.where(or_(
+            PaymentWebhookEvent.processed_at.is_(None),
+            PaymentWebhookEvent.last_error.isnot(None)
+        ))
+
+    result = await db.execute(query)
+    return [PaymentWebhookEventResponse.model_validate(event) for event in result.scalars().all()]
+
+
+@router.post("/payments/webhooks/replay")
+async def replay_payment_webhooks(
+    request: PaymentWebhookReplayRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue stored CryptoCloud webhooks for reprocessing
+
+    Processing is idempotent: an already completed payment is not credited twice.
+    """
+    if not request.event_ids and not request.invoice_id:
+        raise HTTPException(status_code=400, detail="Provide event_ids or invoice_id")
+
+    from app.services.payment_inbox_service import PaymentInboxService
+
+    queued = await PaymentInboxService.replay(db, event_ids=request.event_ids, invoice_id=request.invoice_id)
+    return {
+        "success": True,
+        "queued": queued
+    }
@@ -4,6 +4,7 @@ from sqlalchemy import select
 from app.core.database import get_db
 from app.models.user import User
 from app.core.config import settings
+from app.services.ledger_service import LedgerService
 from pydantic import BaseModel
 from jose import jwt
 from datetime import datetime, timedelta
@@ -99,6 +100,10 @@ async def telegram_auth(
             referral_code=referral_code
         )
         db.add(user)
+        await db.flush()
+        await LedgerService.record(
+            db, user.id, settings.INITIAL_PRED_BALANCE, "PRED", "signup_bonus", LedgerService.SIGNUP
+        )
         await db.commit()
         await db.refresh(user)
     elif auth_data.photo_url and user.photo_url != auth_data.photo_url:
@@ -151,6 +156,10 @@ async def register_user(
             referral_code=referral_code
         )
         db.add(user)
+        await db.flush()
+        await LedgerService.record(
+            db, user.id, settings.INITIAL_PRED_BALANCE, "PRED", "signup_bonus", LedgerService.SIGNUP
+        )
         await db.commit()
         await db.refresh(user)
 
@@ -173,6 +182,12 @@ async def register_user(
                     bonus = Decimal(settings.REFERRAL_BONUS_PRED)
                     user.pred_balance += bonus
                     referrer.pred_balance += bonus
+                    await LedgerService.post(db, [
+                        LedgerService.movement(user.id, bonus, "PRED", "referral_bonus",
+                                               LedgerService.REFERRALS, f"referrer:{referrer.id}"),
+                        LedgerService.movement(referrer.id, bonus, "PRED", "referral_bonus",
+                                               LedgerService.REFERRALS, f"referral:{user.id}"),
+                    ])
 
                     await db.commit()
                     await db.refresh(user)
@@ -5,9 +5,13 @@ from app.core.database import get_db
 from app.models.bet import Bet, BetPosition, BetCurrency, BetStatus
 from app.models.market import Market, MarketStatus
 from app.models.user import User
+from app.services.ledger_service import LedgerService
+from app.services.odds_history_service import OddsHistoryService
+from app.services.trending_service import TrendingService
+from app.services.user_stats_service import UserStatsService
 from pydantic import BaseModel
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timezone
 
 router = APIRouter()
 
@@ -70,6 +74,10 @@ async def place_bet(
     if market.status != MarketStatus.OPEN:
         raise HTTPException(status_code=400, detail="Market is not open")
 
+    # Auto-close runs every few seconds; do not accept bets in between
+    if market.resolve_date and market.resolve_date <= datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail="Market is closed for betting")
+
     # Get user
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
@@ -146,6 +154,10 @@ async def place_bet(
 
     market.bets_count += 1
 
+    # Odds chart tick, same transaction as the bet
+    await OddsHistoryService.record_tick(db, market)
+    await TrendingService.record_bet(db, market.id, bet_data.amount, currency.value)
+
     # Create bet
     bet = Bet(
         user_id=user_id,
@@ -180,13 +192,22 @@ async def place_bet(
         logger.info(f"User {user_id} rank updated from {old_rank} to {user.rank} (total_bets: {user.total_bets})")
 
     db.add(bet)
+    await db.flush()
+    await LedgerService.record(
+        db, user_id, -bet_data.amount, currency, "bet", LedgerService.BETS, f"bet:{bet.id}"
+    )
+
+    # Per-user stats are updated in the same transaction as the bet
+    await UserStatsService.record_bet_placed(db, user_id, bet_data.amount, currency.value)
+
     await db.commit()
     await db.refresh(bet)
 
-    # Update mission progress after bet creation
+    # Update mission progress after bet creation (in the background when Redis is up)
     try:
         from app.services.mission_service import MissionService
-        await MissionService.check_and_update_all_missions(db, user_id)
+        if not await MissionService.schedule_refresh([user_id]):
+            await MissionService.check_and_update_all_missions(db, user_id)
     except Exception as e:
         # Log error but don't fail the bet
         import logging
@@ -202,15 +223,9 @@ async def get_bet_history(
     limit: int = 20,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get user bet history"""
-    query = select(Bet).where(
-        Bet.user_id == user_id
-    ).order_by(desc(Bet.created_at)).limit(limit)
-
-    result = await db.execute(query)
-    bets = result.scalars().all()
-
-    return bets
+    """Get user bet history (live bets merged with archived ones)"""
+    from app.services.archive_service import ArchiveService
+    return await ArchiveService.get_user_history(db, user_id, limit)
 
 
 @router.get("/active/{user_id}", response_model=list[BetResponse])
@@ -1,18 +1,20 @@
 """
 Leaderboard endpoints
 """
-from fastapi import APIRouter, Depends, Query, Path
+from fastapi import APIRouter, Depends, Query, Path, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, case, desc, and_
 from app.core.database import get_db
 from app.models.user import User
-from app.models.bet import Bet, BetStatus
 from app.models.leaderboard_reward import LeaderboardReward, RewardPeriod
-from app.models.leaderboard_period import LeaderboardPeriod, PeriodType, PeriodStatus
+from app.models.leaderboard_period import LeaderboardPeriod
+from app.models.user_stats import UserStats
+from app.services.leaderboard_service import LeaderboardService
+from app.services.user_stats_service import UserStatsService
 from pydantic import BaseModel
 from decimal import Decimal
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 
 router = APIRouter()
 
@@ -46,6 +48,51 @@ class LeaderboardEntry(BaseModel):
         from_attributes = True
 
 
+class LeaderboardPeriodInfo(BaseModel):
+    """Closed leaderboard period"""
+    id: int
+    period_type: str
+    start_date: datetime
+    end_date: datetime
+    participants_count: int
+    winners_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class SnapshotEntry(BaseModel):
+    """Frozen leaderboard entry of a closed period"""
+    rank: int
+    user_id: int
+    username: str | None
+    first_name: str | None
+    photo_url: str | None
+    profit: Decimal
+    bets_count: int
+    reward: int | None
+    reward_currency: str | None
+
+
+class RankedUserEntry(BaseModel):
+    """Leaderboard entry with global rank"""
+    rank: int
+    user_id: int
+    username: str | None
+    first_name: str | None
+    photo_url: str | None
+    rank_badge: str
+    profit: Decimal
+    is_current_user: bool
+
+
+class AroundMeResponse(BaseModel):
+    """User's rank with neighbours"""
+    rank: int | None
+    total_players: int
+    entries: List[RankedUserEntry]
+
+
 @router.get("/", response_model=List[LeaderboardEntry])
 async def get_leaderboard(
     limit: int = 100,
@@ -67,54 +114,14 @@ async def get_leaderboard(
     - total_wins: Total number of wins
     """
 
-    # Calculate date range based on last closed period
-    now = datetime.now()
-
     # Determine period type
     if period == "week":
-        period_type = PeriodType.WEEK
         reward_period = RewardPeriod.WEEK
     else:  # month
-        period_type = PeriodType.MONTH
         reward_period = RewardPeriod.MONTH
 
-    # Find last closed period of this type
-    last_period_query = select(LeaderboardPeriod).where(
-        and_(
-            LeaderboardPeriod.period_type == period_type,
-            LeaderboardPeriod.status == PeriodStatus.CLOSED
-        )
-    ).order_by(desc(LeaderboardPeriod.closed_at)).limit(1)
-
-    last_period_result = await db.execute(last_period_query)
-    last_period = last_period_result.scalar_one_or_none()
-
-    if period == "week":
-        # НЕДЕЛИ ВСЕГДА: Понедельник 00:00 - Воскресенье 23:59
-        if last_period:
-            # Следующий понедельник после закрытия предыдущего периода
-            days_until_monday = (7 - last_period.end_date.weekday()) % 7
-            if days_until_monday == 0:
-                days_until_monday = 7  # Если закрыли в воскресенье, берем следующий понедельник
-            start_date = last_period.end_date + timedelta(days=days_until_monday)
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        else:
-            # Начало текущей недели (понедельник)
-            start_date = now - timedelta(days=now.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    else:
-        # МЕСЯЦЫ ВСЕГДА: 1-е число 00:00 - Последнее число 23:59
-        if last_period:
-            # 1-е число следующего месяца после закрытия предыдущего
-            if last_period.end_date.month == 12:
-                # Если декабрь, переходим на январь следующего года
-                start_date = last_period.end_date.replace(year=last_period.end_date.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            else:
-                # Иначе просто следующий месяц
-                start_date = last_period.end_date.replace(month=last_period.end_date.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            # Начало текущего месяца
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    # Period start only changes when a period is closed, so it is cached
+    start_date = await LeaderboardService.get_current_period_start(db=db, period_type=period)
 
     # Get rewards for this period
     rewards_query = select(LeaderboardReward).where(
@@ -128,33 +135,17 @@ async def get_leaderboard(
         r.id: r for r in rewards_result.scalars().all()
     }
 
-    # Calculate profit for each user (only for bets in period)
-    # profit = sum(payouts from won bets) - sum(amounts from lost bets)
-    profit_subquery = (
-        select(
-            Bet.user_id,
-            func.sum(
-                case(
-                    (Bet.status == BetStatus.WON, Bet.payout - Bet.amount),
-                    (Bet.status == BetStatus.LOST, -Bet.amount),
-                    else_=Decimal("0.00")
-                )
-            ).label("profit"),
-            func.count().label("bets_count")
-        )
-        .where(Bet.created_at >= start_date)
-        .group_by(Bet.user_id)
-        .subquery()
-    )
+    # Period profit comes from user_stats (one row per user and period)
+    period_key = UserStatsService.period_key(period, start_date)
 
     # Main query
     query = (
         select(
             User,
-            func.coalesce(profit_subquery.c.profit, Decimal("0.00")).label("profit"),
-            func.coalesce(profit_subquery.c.bets_count, 0).label("period_bets")
+            func.coalesce(UserStats.realized_profit, Decimal("0.00")).label("profit"),
+            func.coalesce(UserStats.bets_count, 0).label("period_bets")
         )
-        .outerjoin(profit_subquery, User.id == profit_subquery.c.user_id)
+        .outerjoin(UserStats, and_(UserStats.user_id == User.id, UserStats.period_key == period_key))
         .where(User.total_bets > 0)  # Show all users with any bets (not just in period)
     )
 
@@ -177,8 +168,8 @@ async def get_leaderboard(
     else:
         query = query.order_by(desc("profit"))
 
-    # Add secondary sort by total_wins
-    query = query.order_by(desc(User.total_wins))
+    # Add secondary sort by total_wins, then id (same order as the rank index)
+    query = query.order_by(desc(User.total_wins), User.id)
     query = query.limit(limit)
 
     result = await db.execute(query)
@@ -256,59 +247,133 @@ async def get_user_rank(
     db: AsyncSession = Depends(get_db)
 ):
     """Get user's current rank in leaderboard for a period"""
+    result = await LeaderboardService.get_user_rank(db=db, user_id=user_id, period_type=period)
 
-    # Calculate profit for all users
-    profit_subquery = (
-        select(
-            Bet.user_id,
-            func.sum(
-                case(
-                    (Bet.status == BetStatus.WON, Bet.payout - Bet.amount),
-                    (Bet.status == BetStatus.LOST, -Bet.amount),
-                    else_=Decimal("0.00")
-                )
-            ).label("profit")
+    if result["rank"] is None:
+        result["message"] = "User not in leaderboard (no bets placed)"
+
+    return result
+
+
+async def _build_ranked_entries(db: AsyncSession, entries: list, current_user_id: int) -> List[RankedUserEntry]:
+    """Attach user profiles to (rank, user_id, profit) tuples with one query"""
+    if not entries:
+        return []
+
+    result = await db.execute(
+        select(User).where(User.id.in_([user_id for _, user_id, _ in entries]))
+    )
+    users = {u.id: u for u in result.scalars().all()}
+
+    return [
+        RankedUserEntry(
+            rank=rank,
+            user_id=user_id,
+            username=users[user_id].username,
+            first_name=users[user_id].first_name,
+            photo_url=users[user_id].photo_url,
+            rank_badge=users[user_id].rank,
+            profit=profit,
+            is_current_user=user_id == current_user_id
         )
-        .group_by(Bet.user_id)
-        .subquery()
+        for rank, user_id, profit in entries
+        if user_id in users
+    ]
+
+
+@router.get("/around/{user_id}", response_model=AroundMeResponse)
+async def get_leaderboard_around_user(
+    user_id: int,
+    period: str = Query("week", regex="^(week|month)$"),
+    k: int = Query(5, ge=1, le=25),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get user's rank with K neighbours above and below"""
+    window = await LeaderboardService.get_rank_window(
+        db=db,
+        user_id=user_id,
+        period_type=period,
+        neighbours=k
     )
 
-    # Get all users with their profits
-    query = (
-        select(
-            User.id,
-            func.coalesce(profit_subquery.c.profit, Decimal("0.00")).label("profit")
+    return AroundMeResponse(
+        rank=window["rank"],
+        total_players=window["total_players"],
+        entries=await _build_ranked_entries(db, window["entries"], user_id)
+    )
+
+
+@router.get("/friends/{user_id}", response_model=List[RankedUserEntry])
+async def get_friends_leaderboard(
+    user_id: int,
+    period: str = Query("week", regex="^(week|month)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get leaderboard of user's referral circle (referrer, co-referrals and own referrals)"""
+    entries = await LeaderboardService.get_referral_circle_ranks(
+        db=db,
+        user_id=user_id,
+        period_type=period
+    )
+
+    return await _build_ranked_entries(db, entries, user_id)
+
+
+@router.get("/periods", response_model=List[LeaderboardPeriodInfo])
+async def get_past_periods(
+    period: Optional[str] = Query(None, regex="^(week|month)$"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get closed leaderboard periods (newest first)"""
+    periods = await LeaderboardService.get_closed_periods(db=db, period_type=period, limit=limit)
+
+    return [
+        LeaderboardPeriodInfo(
+            id=p.id,
+            period_type=p.period_type.value.lower(),
+            start_date=p.start_date,
+            end_date=p.end_date,
+            participants_count=p.participants_count or 0,
+            winners_count=p.winners_count or 0
         )
-        .outerjoin(profit_subquery, User.id == profit_subquery.c.user_id)
-        .where(User.total_bets > 0)
-        .order_by(desc("profit"), desc(User.total_wins))
+        for p in periods
+    ]
+
+
+@router.get("/history/{period_id}", response_model=List[SnapshotEntry])
+async def get_period_history(
+    period_id: int,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get frozen rankings of a closed period from its snapshot"""
+    rows = await LeaderboardService.get_period_snapshot(
+        db=db,
+        period_id=period_id,
+        limit=limit,
+        offset=offset
     )
 
-    result = await db.execute(query)
-    all_users = result.all()
-
-    # Find user's rank
-    user_rank = None
-    user_profit = Decimal("0.00")
-
-    for rank, (uid, profit) in enumerate(all_users, start=1):
-        if uid == user_id:
-            user_rank = rank
-            user_profit = profit
-            break
-
-    if user_rank is None:
-        return {
-            "user_id": user_id,
-            "rank": None,
-            "total_players": len(all_users),
-            "profit": Decimal("0.00"),
-            "message": "User not in leaderboard (no bets placed)"
-        }
-
-    return {
-        "user_id": user_id,
-        "rank": user_rank,
-        "total_players": len(all_users),
-        "profit": user_profit
-    }
+    if not rows and offset == 0:
+        period_exists = await db.scalar(
+            select(func.count(LeaderboardPeriod.id)).where(LeaderboardPeriod.id == period_id)
+        )
+        if not period_exists:
+            raise HTTPException(status_code=404, detail="Period not found")
+
+    return [
+        SnapshotEntry(
+            rank=snapshot.rank,
+            user_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            photo_url=user.photo_url,
+            profit=snapshot.profit,
+            bets_count=snapshot.bets_count,
+            reward=snapshot.reward_amount,
+            reward_currency=snapshot.reward_currency
+        )
+        for snapshot, user in rows
+    ]
@@ -4,6 +4,10 @@ from sqlalchemy import select, func, desc
 from app.core.database import get_db
 from app.models.market import Market, MarketStatus, ModerationStatus
 from app.core.s3 import s3_client
+from app.services.ledger_service import LedgerService
+from app.services.odds_history_service import OddsHistoryService
+from app.services.trending_service import TrendingService
+from app.services.market_search_service import MarketSearchService
 from pydantic import BaseModel
 from decimal import Decimal
 from datetime import datetime
@@ -44,6 +48,8 @@ class MarketCreate(BaseModel):
 @router.get("/", response_model=list[MarketResponse])
 async def get_markets(
     status: str = Query(default="open"),
+    category: Optional[str] = Query(default=None),
+    sort: str = Query(default="default", pattern="^(default|trending)$"),
     limit: int = Query(default=20, le=100),
     offset: int = Query(default=0),
     db: AsyncSession = Depends(get_db)
@@ -54,12 +60,25 @@ async def get_markets(
     if status != "all":
         query = query.where(Market.status == MarketStatus(status))
 
-    # Order by promoted first, then by volume
-    query = query.order_by(
-        desc(Market.is_promoted),
-        desc(Market.total_volume_pred),
-        desc(Market.created_at)
-    ).limit(limit).offset(offset)
+    if category:
+        # Same mapping as the category facets ("other" includes uncategorized markets)
+        query = query.where(MarketSearchService.category_filter(category))
+
+    if sort == "trending":
+        # Time-decayed activity, top-N read from ix_markets_trending_open
+        query = query.order_by(
+            Market.trending_score.desc().nulls_last(),
+            desc(Market.id)
+        )
+    else:
+        # Order by promoted first, then by volume (served by ix_markets_listing)
+        query = query.order_by(
+            desc(Market.promotion_rank),
+            desc(Market.total_volume_pred),
+            desc(Market.created_at)
+        )
+
+    query = query.limit(limit).offset(offset)
 
     result = await db.execute(query)
     markets = result.scalars().all()
@@ -67,6 +86,51 @@ async def get_markets(
     return markets
 
 
+class MarketSearchResponse(BaseModel):
+    items: list[MarketResponse]
+    total: int
+    facets: list[dict]
+
+
+@router.get("/search", response_model=MarketSearchResponse)
+async def search_markets(
+    q: str = Query(..., min_length=2, max_length=200),
+    category: Optional[str] = Query(default=None),
+    status: str = Query(default="open"),
+    limit: int = Query(default=20, le=100),
+    offset: int = Query(default=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Full-text search over market title and description
+
+    Supports Russian and English word forms. Facets are category counts
+    for the whole query (before the category filter).
+    """
+    found = await MarketSearchService.search(db, q, category, status, limit, offset)
+
+    markets_by_id = {}
+    if found["market_ids"]:
+        result = await db.execute(select(Market).where(Market.id.in_(found["market_ids"])))
+        markets_by_id = {market.id: market for market in result.scalars().all()}
+
+    return MarketSearchResponse(
+        # Keep relevance order of the (possibly cached) id list
+        items=[markets_by_id[market_id] for market_id in found["market_ids"] if market_id in markets_by_id],
+        total=found["total"],
+        facets=found["facets"]
+    )
+
+
+@router.get("/categories")
+async def get_market_categories(
+    status: str = Query(default="open"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Market counts per category (cached aggregate)"""
+    return await MarketSearchService.get_category_facets(db, status)
+
+
 @router.get("/{market_id}", response_model=MarketResponse)
 async def get_market(market_id: int, db: AsyncSession = Depends(get_db)):
     """Get market details"""
@@ -78,11 +142,35 @@ async def get_market(market_id: int, db: AsyncSession = Depends(get_db)):
 
     # Increment views
     market.views_count += 1
+    await TrendingService.record_view(db, market.id)
     await db.commit()
 
     return market
 
 
+@router.get("/{market_id}/history")
+async def get_market_history(
+    market_id: int,
+    range_key: str = Query(default="24h", alias="range", pattern="^(1h|24h|7d|30d|all)$"),
+    points: int = Query(default=OddsHistoryService.MAX_POINTS, ge=10, le=OddsHistoryService.MAX_POINTS),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Odds chart data for a market
+
+    Points come from downsampled 1m/1h/1d candles, so the number of points
+    is bounded by `points` regardless of how many bets the market has.
+    The last point is the current odds.
+    """
+    result = await db.execute(select(Market).where(Market.id == market_id))
+    market = result.scalar_one_or_none()
+
+    if not market:
+        raise HTTPException(status_code=404, detail="Market not found")
+
+    return await OddsHistoryService.get_history(db, market, range_key, points)
+
+
 @router.post("/create-event")
 async def create_user_event(
     user_id: int = Form(...),
@@ -339,6 +427,10 @@ async def promote_market(
         )
 
     db.add(transaction)
+    await LedgerService.record(
+        db, user.id, -Decimal(str(price)), request.currency.upper(), "promotion",
+        LedgerService.PROMOTIONS, f"market:{market.id}"
+    )
 
     # Update market promotion
     promo_type = promotion_prices[request.promotion_type]['type']
@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select
 from app.core.database import get_db
-from app.models.mission import Mission, UserMission
+from app.models.mission import Mission
 from app.models.user import User
 from app.services.mission_service import MissionService
 from pydantic import BaseModel
 from decimal import Decimal
-from datetime import datetime
 from typing import Optional
 
 router = APIRouter()
@@ -35,72 +34,13 @@ class MissionResponse(BaseModel):
 
 @router.get("/{user_id}", response_model=list[MissionResponse])
 async def get_missions(user_id: int, db: AsyncSession = Depends(get_db)):
-    """Get available missions for user with auto-update progress"""
-    # Update all missions progress first
-    await MissionService.check_and_update_all_missions(db, user_id)
+    """
+    Get available missions for user with progress
 
-    # Get active missions
-    result = await db.execute(
-        select(Mission).where(Mission.is_active == True).order_by(Mission.type, Mission.id)
-    )
-    missions = result.scalars().all()
-
-    # Get user progress
-    result = await db.execute(
-        select(UserMission).where(UserMission.user_id == user_id)
-    )
-    user_missions = {um.mission_id: um for um in result.scalars().all()}
-
-    # Combine data
-    response = []
-    for mission in missions:
-        user_mission = user_missions.get(mission.id)
-
-        # Get target from requirements
-        target = _get_mission_target(mission.requirements)
-
-        # Get icon URL (custom or default)
-        icon = mission.custom_icon_url or mission.icon or "🎯"
-
-        response.append(MissionResponse(
-            id=mission.id,
-            title=mission.title,
-            description=mission.description,
-            icon=icon if not mission.custom_icon_url else mission.icon,
-            custom_icon_url=mission.custom_icon_url,
-            reward_amount=mission.reward_amount,
-            reward_currency=mission.reward_currency,
-            type=mission.type,
-            requirements=mission.requirements,
-            progress=user_mission.progress if user_mission else 0,
-            target=target,
-            completed=user_mission.completed if user_mission else False,
-            claimed=user_mission.claimed if user_mission else False,
-            channel_url=mission.channel_url
-        ))
-
-    return response
-
-
-def _get_mission_target(requirements: dict) -> int:
-    """Extract target value from requirements"""
-    if "bets_count" in requirements:
-        return requirements["bets_count"]
-    elif "wins_count" in requirements:
-        return requirements["wins_count"]
-    elif "win_streak" in requirements:
-        return requirements["win_streak"]
-    elif "category_bets" in requirements:
-        return requirements["category_bets"]["count"]
-    elif "referrals_count" in requirements:
-        return requirements["referrals_count"]
-    elif "daily_bets" in requirements:
-        return requirements["daily_bets"]
-    elif "weekly_bets" in requirements:
-        return requirements["weekly_bets"]
-    elif "subscription" in requirements:
-        return 1
-    return 0
+    Served from a per-user cache or a single joined query; progress is
+    recalculated in the background (bets, market resolution, periodic refresh).
+    """
+    return await MissionService.get_user_missions(db, user_id)
 
 
 @router.post("/check-subscription/{user_id}/{mission_id}")
@@ -127,11 +67,12 @@ async def check_subscription(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Check subscription
+    # Check subscription (bypass cache: the user may have just subscribed)
     subscribed = await MissionService.check_channel_subscription(
         user_id=user.telegram_id,
         channel_id=mission.channel_id,
-        channel_username=mission.channel_username
+        channel_username=mission.channel_username,
+        use_cache=False
     )
 
     # Update mission progress
@@ -141,7 +82,8 @@ async def check_subscription(
             user_id=user_id,
             mission_id=mission_id,
             progress=1,
-            completed=True
+            completed=True,
+            period_key=MissionService.period_key(mission.type)
         )
 
     return {
@@ -155,48 +97,33 @@ async def check_subscription(
 async def claim_mission_reward(
     user_id: int,
     mission_id: int,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=64),
     db: AsyncSession = Depends(get_db)
 ):
-    """Claim mission reward"""
-    # Get user mission
-    result = await db.execute(
-        select(UserMission).where(
-            and_(
-                UserMission.user_id == user_id,
-                UserMission.mission_id == mission_id
-            )
-        )
-    )
-    user_mission = result.scalar_one_or_none()
-
-    if not user_mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
-
-    if not user_mission.completed:
-        raise HTTPException(status_code=400, detail="Mission not completed")
-
-    if user_mission.claimed:
-        raise HTTPException(status_code=400, detail="Reward already claimed")
+    """
+    Claim mission reward
 
+    The claim, balance credit and ledger entries are a single conditional
+    statement, so concurrent taps credit the reward once. Retrying with the
+    same Idempotency-Key header returns the original success response.
+    """
     # Get mission
     result = await db.execute(select(Mission).where(Mission.id == mission_id))
     mission = result.scalar_one_or_none()
 
-    # Get user
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    if not mission:
+        raise HTTPException(status_code=404, detail="Mission not found")
 
-    # Give reward
-    if mission.reward_currency == "PRED":
-        user.pred_balance += mission.reward_amount
-    else:
-        user.ton_balance += mission.reward_amount
+    claim = await MissionService.claim_reward(db, user_id, mission, idempotency_key)
 
-    # Mark as claimed
-    user_mission.claimed = True
-    user_mission.claimed_at = datetime.utcnow()
+    if claim["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Mission not found")
 
-    await db.commit()
+    if claim["status"] == "not_completed":
+        raise HTTPException(status_code=400, detail="Mission not completed")
+
+    if claim["status"] == "already_claimed":
+        raise HTTPException(status_code=400, detail="Reward already claimed")
 
     return {
         "success": True,
@@ -204,5 +131,5 @@ async def claim_mission_reward(
             "amount": float(mission.reward_amount),
             "currency": mission.reward_currency
         },
-        "new_balance": float(user.pred_balance if mission.reward_currency == "PRED" else user.ton_balance)
+        "new_balance": float(claim["new_balance"])
     }
@@ -15,6 +15,7 @@ from app.core.database import get_db
 from app.models.user import User
 from app.models.payment import Payment
 from app.services.cryptocloud_service import PaymentService
+from app.services.payment_inbox_service import PaymentInboxService
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
@@ -182,10 +183,12 @@ async def payment_callback(
     URL: https://thepred.tech/api/payment/callback
 
     This endpoint is called by CryptoCloud when payment status changes.
-    It processes the payment and credits user's PRED balance.
+    The event is stored in the webhook inbox and acknowledged immediately;
+    PaymentInboxService credits the user's TON balance in the background.
+    Repeated webhooks with the same (invoice_id, status) are ignored.
 
     **Security**: CryptoCloud sends webhook data as form-data or JSON
-    **Important**: Always return 200 status to prevent webhook retries
+    **Important**: Always return 200 status once the event is stored
 
     Expected data:
     ```
@@ -199,44 +202,29 @@ async def payment_callback(
     ```
     """
     try:
-        logger.info("=" * 50)
-        logger.info("📨 Received webhook from CryptoCloud")
-
         # Try to get data as form-data first
         try:
             form_data = await request.form()
             data = {key: form_data.get(key) for key in form_data}
-            logger.info(f"📝 Form data: {data}")
         except Exception:
             # If not form-data, try JSON
             data = await request.json()
-            logger.info(f"📝 JSON data: {data}")
-
-        # Validate status
-        if data.get("status") != "success":
-            logger.warning(f"⚠️ Non-success status: {data.get('status')}")
-            return {"status": "processed", "message": "Non-success status"}
 
-        # Validate invoice_id
-        if not data.get("invoice_id"):
-            logger.error("❌ Missing invoice_id")
-            return {"status": "processed", "message": "Missing invoice_id"}
+        logger.info(f"📨 CryptoCloud webhook: invoice_id={data.get('invoice_id')}, status={data.get('status')}")
 
-        # Process payment
-        payment_service = PaymentService(db)
-        success = await payment_service.process_payment_webhook(data)
+        created = await PaymentInboxService.store(db, data)
 
-        if success:
-            logger.info("✅ Payment processed successfully")
-            return {"status": "success", "message": "Payment processed"}
-        else:
-            logger.warning("⚠️ Payment processing failed")
-            return {"status": "processed", "message": "Processing failed"}
+        if created is None:
+            logger.error("❌ Webhook missing invoice_id or status")
+            return {"status": "processed", "message": "Missing invoice_id or status"}
+        if not created:
+            return {"status": "success", "message": "Duplicate webhook"}
+        return {"status": "success", "message": "Webhook accepted"}
 
     except Exception as e:
         logger.error(f"❌ Webhook error: {str(e)}")
-        # Return 200 even on error to prevent CryptoCloud from retrying
-        return {"status": "error", "message": str(e)}
+        # Event was not stored - let CryptoCloud retry
+        raise HTTPException(status_code=500, detail="Failed to store webhook")
 
 
 @router.get("/successful-payment")
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, func
 from app.core.database import get_db
 from app.models.user import User
+from app.services.ledger_service import LedgerService
 from pydantic import BaseModel
 from decimal import Decimal
 
@@ -104,6 +105,12 @@ async def activate_referral(
     from app.core.config import settings
     user.pred_balance += Decimal(settings.REFERRAL_BONUS_PRED)
     referrer.pred_balance += Decimal(settings.REFERRAL_BONUS_PRED)
+    await LedgerService.post(db, [
+        LedgerService.movement(user.id, Decimal(settings.REFERRAL_BONUS_PRED), "PRED", "referral_bonus",
+                               LedgerService.REFERRALS, f"referrer:{referrer.id}"),
+        LedgerService.movement(referrer.id, Decimal(settings.REFERRAL_BONUS_PRED), "PRED", "referral_bonus",
+                               LedgerService.REFERRALS, f"referral:{user.id}"),
+    ])
 
     await db.commit()
 
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from pydantic import BaseModel, field_validator
 
@@ -10,9 +11,9 @@ from app.core.config import settings
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
 from app.models.user import User
 from app.models.wallet import WalletAddress
-from app.services.ton_service import TONService
-from app.services.telegram_queue_service import TelegramQueueService
-from app.models.telegram_notification import NotificationType
+from app.services.ton_service import TonAPIError, get_ton_service
+from app.services.deposit_watcher_service import DepositWatcherService
+from app.services.ledger_service import LedgerService
 from app.utils.ton_helpers import (
     ton_to_pred,
     validate_deposit_amount,
@@ -72,6 +73,7 @@ class DepositResponse(BaseModel):
     expected_pred: int
     conversion_rate: int
     expires_at: datetime
+    comment: str  # Transfer comment; deposits carrying it are credited automatically
 
 
 class VerifyDepositResponse(BaseModel):
@@ -189,7 +191,8 @@ async def create_deposit(
         amount_ton=data.amount_ton,
         expected_pred=pred_amount,
         conversion_rate=get_conversion_rate(),
-        expires_at=expires_at
+        expires_at=expires_at,
+        comment=DepositWatcherService.deposit_memo(transaction.id)
     )
 
 
@@ -202,19 +205,12 @@ async def verify_deposit(
     """
     Проверить депозит на blockchain
 
-    Пользователь отправляет tx_hash после совершения транзакции.
-    Backend проверяет на blockchain и начисляет PRED.
+    Пользователь отправляет хэш события после совершения транзакции, если
+    deposit watcher не нашел перевод сам (например, перевод без комментария).
+    Зачисление идет тем же запросом, что и у watcher: только pending депозит
+    и только по хэшу транзакции кошелька платформы, поэтому один перевод
+    не может быть зачислен дважды.
     """
-    # Получить пользователя
-    user_result = await db.execute(select(User).where(User.id == user_id))
-    current_user = user_result.scalar_one_or_none()
-
-    if not current_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-
     # Получить транзакцию
     transaction = await db.get(Transaction, data.transaction_id)
 
@@ -224,7 +220,7 @@ async def verify_deposit(
             detail="Transaction not found"
         )
 
-    if transaction.user_id != user_id:
+    if transaction.user_id != user_id or transaction.type != TransactionType.DEPOSIT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
@@ -236,89 +232,91 @@ async def verify_deposit(
             detail=f"Transaction already processed with status: {transaction.status}"
         )
 
-    # Проверить что транзакция не истекла
-    if transaction.expires_at and datetime.now() > transaction.expires_at:
-        transaction.status = TransactionStatus.FAILED
-        transaction.description = "Deposit timeout expired"
-        await db.commit()
-
+    # Найти входящий перевод на кошелек платформы
+    ton = get_ton_service()
+    try:
+        trace = await ton.get_trace(data.tx_hash)
+        account = await ton.get_account_info(transaction.deposit_address) if trace else None
+    except TonAPIError as e:
+        logger.error(f"TonAPI unavailable while verifying deposit: {e}")
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Deposit request expired. Please create a new one."
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Blockchain API unavailable, try again later"
         )
 
-    # Проверить на blockchain
-    ton_service = TONService(
-        api_url=settings.TON_API_URL,
-        api_key=settings.TON_API_KEY if settings.TON_API_KEY else None
-    )
+    transfer = None
+    if trace and account and account.get("address"):
+        transfer = DepositWatcherService.find_incoming(trace, account["address"])
 
-    verification = await ton_service.verify_transaction(
-        tx_hash=data.tx_hash,
-        expected_destination=transaction.deposit_address,
-        expected_amount=transaction.amount,
-        tolerance=Decimal("0.01")  # 0.01 TON tolerance
-    )
-
-    if not verification["valid"]:
-        error_msg = verification.get("error", "Transaction verification failed")
+    if transfer is None:
         logger.warning(
             f"Deposit verification failed: user={user_id}, "
-            f"tx={data.transaction_id}, error={error_msg}"
+            f"tx={data.transaction_id}, hash={data.tx_hash}"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Verification failed: no transfer to the deposit address found"
         )
 
+    # Перевод с комментарием принадлежит депозиту из комментария
+    if transfer["memo_id"] and transfer["memo_id"] != transaction.id:
+        logger.warning(
+            f"Deposit verification rejected: user={user_id}, tx={data.transaction_id}, "
+            f"hash={data.tx_hash} is tagged for deposit #{transfer['memo_id']}"
+        )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Verification failed: {error_msg}"
+            detail="Verification failed: transfer belongs to another deposit"
         )
 
-    # Проверить что транзакция успешна
-    if not verification.get("success", True):
+    if transfer["amount"] < transaction.amount - DepositWatcherService.AMOUNT_TOLERANCE:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Transaction failed on blockchain"
+            detail=f"Verification failed: amount mismatch. Expected: {transaction.amount}, Got: {transfer['amount']}"
         )
 
-    # Начислить PRED и TON
-    pred_amount = int(transaction.converted_amount)
+    # Один перевод - один депозит
+    used = await db.scalar(
+        select(Transaction.id).where(Transaction.tx_hash == transfer["hash"]).limit(1)
+    )
+    if used is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Transaction hash already used"
+        )
 
-    current_user.pred_balance += pred_amount
-    current_user.ton_balance += transaction.amount
+    # Зачислить (PRED, TON, журнал, уведомление) - только если депозит еще pending
+    try:
+        credited = await DepositWatcherService.credit(db, [(transfer, transaction.id)])
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Transaction hash already used"
+        )
 
-    # Обновить транзакцию
-    transaction.status = TransactionStatus.COMPLETED
-    transaction.tx_hash = data.tx_hash
-    transaction.ton_address = verification.get("sender")
-    transaction.confirmations = verification.get("confirmations", 1)
-    transaction.completed_at = datetime.now()
+    if not credited:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Transaction already processed"
+        )
 
-    await db.commit()
-    await db.refresh(current_user)
+    pred_amount = int(transaction.converted_amount)
+    balances = (await db.execute(
+        select(User.pred_balance, User.ton_balance).where(User.id == user_id)
+    )).one()
 
     logger.info(
         f"Deposit completed: user={user_id}, "
         f"amount={transaction.amount} TON, pred={pred_amount}"
     )
 
-    # Отправить уведомление
-    await TelegramQueueService.add_notification(
-        db=db,
-        telegram_id=current_user.telegram_id,
-        message_text=(
-            f"✅ <b>Депозит успешно зачислен!</b>\n\n"
-            f"💎 TON: <b>+{transaction.amount}</b>\n"
-            f"🪙 PRED: <b>+{pred_amount}</b>\n\n"
-            f"Новый баланс: <b>{current_user.pred_balance}</b> PRED"
-        ),
-        notification_type=NotificationType.SYSTEM,
-        user_id=user_id
-    )
-
     return VerifyDepositResponse(
         success=True,
         pred_credited=pred_amount,
-        new_pred_balance=current_user.pred_balance,
-        new_ton_balance=current_user.ton_balance
+        new_pred_balance=balances.pred_balance,
+        new_ton_balance=balances.ton_balance
     )
 
 
@@ -357,7 +355,8 @@ async def get_deposit_status(
         "created_at": transaction.created_at,
         "completed_at": transaction.completed_at,
         "expires_at": transaction.expires_at,
-        "expired": datetime.now() > transaction.expires_at if transaction.expires_at else False
+        # expires_at is timestamptz (loaded as an aware datetime)
+        "expired": datetime.now(timezone.utc) > transaction.expires_at if transaction.expires_at else False
     }
 
 
@@ -395,6 +394,10 @@ async def convert_ton_to_pred(
     # Конвертировать
     user.ton_balance -= amount_ton
     user.pred_balance += pred_amount
+    await LedgerService.post(db, [
+        LedgerService.movement(user_id, -amount_ton, "TON", "exchange", LedgerService.EXCHANGE),
+        LedgerService.movement(user_id, pred_amount, "PRED", "exchange", LedgerService.EXCHANGE),
+    ])
 
     # Создать транзакцию для истории
     transaction = Transaction(
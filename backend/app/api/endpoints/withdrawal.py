@@ -18,6 +18,7 @@ from app.core.database import get_db
 from app.models.user import User
 from app.models.withdrawal import WithdrawalRequest, WithdrawalStatus
 from app.models.transaction import Transaction, TransactionType, TransactionStatus
+from app.services.ledger_service import LedgerService
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
@@ -138,9 +139,14 @@ async def create_withdrawal_request(
         )
 
         db.add(withdrawal)
+        await db.flush()
 
         # Deduct PRED from user balance immediately (hold funds)
         user.pred_balance -= pred_amount
+        await LedgerService.record(
+            db, user_id, -pred_amount, "PRED", "withdrawal_hold", LedgerService.WITHDRAWALS,
+            f"withdrawal:{withdrawal.id}"
+        )
 
         # Create transaction record
         transaction = Transaction(
@@ -265,6 +271,10 @@ async def cancel_withdrawal_request(
 
         # Refund PRED
         user.pred_balance += withdrawal.pred_amount
+        await LedgerService.record(
+            db, user_id, withdrawal.pred_amount, "PRED", "withdrawal_refund", LedgerService.WITHDRAWALS,
+            f"withdrawal:{withdrawal.id}"
+        )
 
         # Update withdrawal status
         withdrawal.status = WithdrawalStatus.CANCELLED
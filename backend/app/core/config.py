@@ -31,6 +31,9 @@ class Settings(BaseSettings):
     TON_API_KEY: str = ""  # Optional, for higher rate limits on tonapi.io
     TON_API_URL: str = "https://tonapi.io/v2"  # TON API endpoint
     TON_DEPOSIT_ADDRESS: str = ""  # Platform wallet address for deposits
+    TON_API_TIMEOUT_SECONDS: int = 10  # Per-request timeout
+    TON_API_CONCURRENCY: int = 5  # Max parallel TonAPI requests per process
+    TON_API_MAX_RETRIES: int = 3  # Retries on 429/5xx/network errors (exponential backoff)
 
     # TON Conversion & Limits
     TON_TO_PRED_RATE: int = 1000  # 1 TON = 1000 PRED
@@ -47,6 +50,9 @@ class Settings(BaseSettings):
     COMMISSION_PRED: float = 0.01  # 1%
     COMMISSION_TON: float = 0.05   # 5%
 
+    # Trending markets feed
+    TRENDING_HALF_LIFE_HOURS: float = 24.0  # Bet/view weight halves every N hours
+
     # Sentry
     SENTRY_DSN: Optional[str] = None
 
@@ -57,9 +63,19 @@ class Settings(BaseSettings):
     S3_BUCKET: str = "thepred-events"
     S3_PUBLIC_URL: str = "https://thepred.store"
 
+    # Cold storage archive (resolved markets and their bets)
+    ARCHIVE_AFTER_DAYS: int = 90  # Archive markets resolved more than N days ago
+    ARCHIVE_STORAGE: str = "s3"  # s3 (S3_ARCHIVE_BUCKET) or local
+    S3_ARCHIVE_BUCKET: str = "thepred-archive"  # Private bucket (no public policy), not S3_BUCKET
+    ARCHIVE_LOCAL_DIR: str = "/app/archive"  # Used when ARCHIVE_STORAGE=local
+
     # Telegram Bot
     BOT_TOKEN: Optional[str] = None
     WEBAPP_URL: str = "https://thepred.store"
+    TELEGRAM_API_CONCURRENCY: int = 20  # Max parallel Bot API requests per process (channel subscription checks)
+
+    # Telegram notifications queue
+    NOTIFICATION_COALESCE_WINDOW_SECONDS: int = 60  # Merge messages of one type per user within this window (0 = off)
 
     # CryptoCloud Payment Gateway
     CRYPTOCLOUD_API_KEY: str = ""
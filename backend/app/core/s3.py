@@ -16,6 +16,7 @@ class S3Client:
         self.access_key = settings.S3_ACCESS_KEY
         self.secret_key = settings.S3_SECRET_KEY
         self.bucket = settings.S3_BUCKET
+        self.archive_bucket = settings.S3_ARCHIVE_BUCKET
         self.public_url = settings.S3_PUBLIC_URL
 
     async def init_bucket(self):
@@ -57,6 +58,20 @@ class S3Client:
         except Exception as e:
             logger.error(f"Error initializing bucket: {e}")
 
+    async def init_archive_bucket(self):
+        """Initialize private archive bucket (no bucket policy - not publicly readable)"""
+        async with self.session.client(
+            's3',
+            endpoint_url=self.endpoint,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+        ) as s3:
+            try:
+                await s3.head_bucket(Bucket=self.archive_bucket)
+            except Exception:
+                await s3.create_bucket(Bucket=self.archive_bucket)
+                logger.info(f"Created private bucket {self.archive_bucket}")
+
     async def upload_file(
         self,
         file_content: bytes,
@@ -95,6 +110,32 @@ class S3Client:
             logger.error(f"Error uploading file: {e}")
             return None
 
+    async def put_private_object(
+        self,
+        key: str,
+        body: bytes,
+        content_type: str = "application/octet-stream"
+    ) -> str:
+        """
+        Upload object to the private archive bucket under an explicit key
+        Returns: s3:// URI of the object. Raises on failure.
+        """
+        async with self.session.client(
+            's3',
+            endpoint_url=self.endpoint,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+        ) as s3:
+            await s3.put_object(
+                Bucket=self.archive_bucket,
+                Key=key,
+                Body=body,
+                ContentType=content_type
+            )
+
+        logger.info(f"Uploaded object {key} to bucket {self.archive_bucket}")
+        return f"s3://{self.archive_bucket}/{key}"
+
     async def delete_file(self, file_url: str) -> bool:
         """Delete file from S3 by URL"""
         try:
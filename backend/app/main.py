@@ -70,6 +70,12 @@ async def shutdown_event():
     stop_scheduler()
     logger.info("Scheduler stopped")
 
+    from app.services.channel_subscription_service import ChannelSubscriptionService
+    await ChannelSubscriptionService.close()
+
+    from app.services.ton_service import close_ton_service
+    await close_ton_service()
+
 
 @app.get("/")
 async def root():
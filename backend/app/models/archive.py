@@ -0,0 +1,47 @@
+"""
+Archive Models - Сводки заархивированных рынков и ставок
+
+Полные строки лежат в Parquet файлах (S3/MinIO или локально), в БД
+остаются только тонкие строки, нужные для истории пользователя.
+"""
+from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class ArchivedMarket(Base):
+    """Сводка заархивированного рынка"""
+    __tablename__ = "archived_markets"
+
+    id = Column(BigInteger, primary_key=True)  # ID исходного рынка
+    title = Column(String(500), nullable=False)
+    category = Column(String(100), nullable=True)
+    outcome = Column(String(20), nullable=True)
+    total_volume_pred = Column(DECIMAL(20, 2), default=0, nullable=False)
+    total_volume_ton = Column(DECIMAL(20, 2), default=0, nullable=False)
+    bets_count = Column(BigInteger, default=0, nullable=False)
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Где лежат полные строки рынка и его ставок
+    archive_uri = Column(String(500), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class ArchivedBet(Base):
+    """Тонкая строка заархивированной ставки (для GET /bets/history)"""
+    __tablename__ = "archived_bets"
+    __table_args__ = (
+        Index("ix_archived_bets_user_created", "user_id", "created_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True)  # ID исходной ставки
+    user_id = Column(BigInteger, nullable=False)
+    market_id = Column(BigInteger, nullable=False)
+    position = Column(String(10), nullable=False)
+    amount = Column(DECIMAL(20, 2), nullable=False)
+    currency = Column(String(10), nullable=False)
+    odds = Column(DECIMAL(5, 2), nullable=False)
+    potential_win = Column(DECIMAL(20, 2), nullable=False)
+    status = Column(String(20), nullable=False)
+    payout = Column(DECIMAL(20, 2), default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
+from datetime import datetime, timezone
 
 
 class BetPosition(str, enum.Enum):
@@ -22,9 +23,21 @@ class BetStatus(str, enum.Enum):
 
 
 class Bet(Base):
+    """
+    Ставка пользователя
+
+    Таблица партиционирована по месяцам (RANGE по created_at): запросы
+    за период затрагивают одну-две партиции, будущие партиции создает
+    scheduler (PartitionService.ensure_bets_partitions).
+    """
     __tablename__ = "bets"
+    __table_args__ = (
+        Index("ix_bets_created_at_brin", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
+    # PK партиционированной таблицы включает ключ партиционирования
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id"), nullable=False, index=True)
     market_id = Column(BigInteger, ForeignKey("markets.id"), nullable=False, index=True)
 
@@ -38,5 +51,11 @@ class Bet(Base):
     payout = Column(DECIMAL(20, 2), default=0.00, nullable=False)
 
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        nullable=False
+    )
     resolved_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,37 @@
+"""
+Leaderboard Snapshot Model - Замороженные результаты закрытых периодов
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DECIMAL, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class LeaderboardSnapshot(Base):
+    """
+    Места участников закрытого периода лидерборда
+
+    Пишется один раз при закрытии периода, история читается
+    диапазоном по (period_id, rank) без пересчета ставок.
+    """
+    __tablename__ = "leaderboard_snapshot"
+    __table_args__ = (
+        Index("ix_leaderboard_snapshot_period_rank", "period_id", "rank", unique=True),
+        Index("ix_leaderboard_snapshot_user_period", "user_id", "period_id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    period_id = Column(Integer, ForeignKey("leaderboard_periods.id", ondelete="CASCADE"), nullable=False)
+    rank = Column(Integer, nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    profit = Column(DECIMAL(20, 2), default=0, nullable=False)
+    bets_count = Column(Integer, default=0, nullable=False)
+
+    # Награда за место (NULL если место без награды)
+    reward_amount = Column(Integer, nullable=True)
+    reward_currency = Column(String(10), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<LeaderboardSnapshot period={self.period_id} #{self.rank} user={self.user_id} profit={self.profit}>"
@@ -0,0 +1,59 @@
+"""
+Ledger Models - Журнал движений балансов (double-entry)
+
+Каждое движение - транзакция (txn_id) из двух и более проводок, сумма
+проводок транзакции равна нулю. Строки journal только добавляются:
+UPDATE/DELETE запрещены триггером в БД. users.pred_balance/ton_balance
+остаются кэшем баланса и сверяются с журналом фоновой задачей.
+"""
+from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class LedgerEntry(Base):
+    """
+    Проводка журнала
+
+    account: "user" для проводок по балансу пользователя (user_id обязателен)
+    или "system:<name>" для контрсчетов платформы (bets, payouts, deposits,
+    withdrawals, rewards, ...). amount со знаком: + зачисление, - списание.
+    """
+    __tablename__ = "ledger_entries"
+    __table_args__ = (
+        Index("ix_ledger_entries_user_id_id", "user_id", "id"),
+        Index("ix_ledger_entries_txn_id", "txn_id"),
+        Index("ix_ledger_entries_created_at_brin", "created_at", postgresql_using="brin"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    txn_id = Column(String(36), nullable=False)
+    account = Column(String(50), nullable=False)
+    user_id = Column(BigInteger, nullable=True)  # Без FK: журнал переживает пользователя
+    currency = Column(String(10), nullable=False)
+    amount = Column(DECIMAL(20, 2), nullable=False)
+    entry_type = Column(String(30), nullable=False)  # bet, payout, refund, deposit, ...
+    reference = Column(String(100), nullable=True)  # bet:123, market:5, withdrawal:7, ...
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<LedgerEntry {self.id} {self.account} user={self.user_id} {self.amount} {self.currency}>"
+
+
+class BalanceSnapshot(Base):
+    """
+    Снимок баланса пользователя по журналу
+
+    balance = сумма проводок пользователя с id <= last_entry_id.
+    Текущий баланс = balance + сумма проводок после last_entry_id.
+    """
+    __tablename__ = "balance_snapshots"
+
+    user_id = Column(BigInteger, primary_key=True)
+    currency = Column(String(10), primary_key=True)
+    balance = Column(DECIMAL(20, 2), default=0, nullable=False)
+    last_entry_id = Column(BigInteger, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<BalanceSnapshot user={self.user_id} {self.balance} {self.currency} @ {self.last_entry_id}>"
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, BigInteger, String, Text, DECIMAL, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, BigInteger, SmallInteger, String, Text, DECIMAL, DateTime, ForeignKey, Enum, Float, Index, Computed, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -25,11 +27,41 @@ class ModerationStatus(str, enum.Enum):
 
 class Market(Base):
     __tablename__ = "markets"
+    __table_args__ = (
+        # sort=trending: top-N open markets straight from the index
+        Index(
+            "ix_markets_trending_open",
+            text("trending_score DESC NULLS LAST"),
+            postgresql_where=text("status = 'OPEN'")
+        ),
+        Index("ix_markets_search_vector", "search_vector", postgresql_using="gin"),
+        # Default listing order of approved markets (get_markets)
+        Index(
+            "ix_markets_listing",
+            "status",
+            text("promotion_rank DESC"),
+            text("total_volume_pred DESC"),
+            text("created_at DESC"),
+            postgresql_where=text("moderation_status = 'APPROVED'")
+        ),
+        # Promotion expiry sweeper
+        Index(
+            "ix_markets_promoted_until_active",
+            "promoted_until",
+            postgresql_where=text("is_promoted <> 'none' AND promoted_until IS NOT NULL")
+        ),
+        # Auto-close sweeper: only open markets with a resolve date
+        Index(
+            "ix_markets_resolve_date_open",
+            "resolve_date",
+            postgresql_where=text("status = 'OPEN' AND resolve_date IS NOT NULL")
+        ),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     title = Column(String(500), nullable=False)
     description = Column(Text, nullable=True)
-    category = Column(String(100), nullable=True)
+    category = Column(String(100), nullable=True, index=True)
     photo_url = Column(String(500), nullable=True)
     moderation_status = Column(Enum(ModerationStatus), default=ModerationStatus.APPROVED, nullable=False)
 
@@ -45,6 +77,19 @@ class Market(Base):
     yes_pool_ton = Column(DECIMAL(20, 2), default=0.00, nullable=False)
     no_pool_ton = Column(DECIMAL(20, 2), default=0.00, nullable=False)
 
+    # Full-text search (Russian + English stemming), see MarketSearchService; not loaded by default
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+
     # Status
     status = Column(Enum(MarketStatus), default=MarketStatus.OPEN, nullable=False)
     outcome = Column(Enum(MarketOutcome), nullable=True)
@@ -58,9 +103,21 @@ class Market(Base):
     views_count = Column(BigInteger, default=0, nullable=False)
     bets_count = Column(BigInteger, default=0, nullable=False)
 
+    # Time-decayed activity (log-sum-exp, see TrendingService); NULL = no activity yet
+    trending_score = Column(Float, nullable=True)
+
     # Promotion
     is_promoted = Column(String(50), default="none", nullable=False)  # none, basic, premium
     promoted_until = Column(DateTime(timezone=True), nullable=True)
+    # Sortable level derived from is_promoted: premium=2, basic=1, none=0
+    promotion_rank = Column(
+        SmallInteger,
+        Computed(
+            "CASE is_promoted WHEN 'premium' THEN 2 WHEN 'basic' THEN 1 ELSE 0 END",
+            persisted=True
+        ),
+        nullable=False
+    )
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,58 @@
+"""
+Market Odds Models - История коэффициентов рынков для графиков
+
+market_odds_ticks - сырые снимки пулов на каждую ставку (только добавление,
+хранятся недолго). market_odds_history - свечи 1m/1h/1d, которые строит
+фоновая задача из тиков (1m) и из более мелких свечей (1h, 1d).
+"""
+from sqlalchemy import Column, BigInteger, Integer, String, DECIMAL, DateTime, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class MarketOddsTick(Base):
+    """Снимок коэффициентов и пулов рынка после ставки"""
+    __tablename__ = "market_odds_ticks"
+    __table_args__ = (
+        Index("ix_market_odds_ticks_market_created", "market_id", "created_at"),
+        Index("ix_market_odds_ticks_created_at_brin", "created_at", postgresql_using="brin"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    market_id = Column(BigInteger, nullable=False)
+    yes_odds = Column(DECIMAL(5, 2), nullable=False)
+    no_odds = Column(DECIMAL(5, 2), nullable=False)
+    yes_pool_pred = Column(DECIMAL(20, 2), default=0, nullable=False)
+    no_pool_pred = Column(DECIMAL(20, 2), default=0, nullable=False)
+    yes_pool_ton = Column(DECIMAL(20, 2), default=0, nullable=False)
+    no_pool_ton = Column(DECIMAL(20, 2), default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class MarketOddsCandle(Base):
+    """
+    Свеча yes_odds за интервал
+
+    resolution: "1m", "1h" или "1d"; bucket - начало интервала (UTC).
+    no_odds на графике = 100 - yes_odds, поэтому хранится только закрытие.
+    """
+    __tablename__ = "market_odds_history"
+    __table_args__ = (
+        Index("ix_market_odds_history_resolution_bucket", "resolution", "bucket"),
+    )
+
+    market_id = Column(BigInteger, primary_key=True)
+    resolution = Column(String(2), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+
+    yes_open = Column(DECIMAL(5, 2), nullable=False)
+    yes_high = Column(DECIMAL(5, 2), nullable=False)
+    yes_low = Column(DECIMAL(5, 2), nullable=False)
+    yes_close = Column(DECIMAL(5, 2), nullable=False)
+    no_close = Column(DECIMAL(5, 2), nullable=False)
+    ticks = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<MarketOddsCandle market={self.market_id} {self.resolution} {self.bucket} {self.yes_close}>"
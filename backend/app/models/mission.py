@@ -31,14 +31,24 @@ class Mission(Base):
 
 
 class UserMission(Base):
+    """
+    Прогресс пользователя по миссии за период
+
+    period_key: "day:YYYY-MM-DD" для daily, "week:YYYY-MM-DD" (понедельник UTC)
+    для weekly и "all" для остальных миссий. Новый период - новая строка,
+    поэтому сброс прогресса не требует удаления; старые периоды удаляются
+    фоновой задачей небольшими пакетами.
+    """
     __tablename__ = "user_missions"
 
     user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
     mission_id = Column(BigInteger, ForeignKey("missions.id"), primary_key=True)
+    period_key = Column(String(20), primary_key=True, default="all", index=True)
 
     progress = Column(Integer, default=0, nullable=False)
     completed = Column(Boolean, default=False, nullable=False)
     claimed = Column(Boolean, default=False, nullable=False)
+    claim_key = Column(String(64), nullable=True)  # Idempotency-Key of the claiming request
 
     # Timestamps
     started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
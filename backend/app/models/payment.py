@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, BigInteger, Integer, String, DECIMAL, DateTime, ForeignKey, Enum, Text, Index, UniqueConstraint, text
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -18,6 +18,14 @@ class PaymentStatus(str, enum.Enum):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Expiry sweeper
+        Index(
+            "ix_payments_pending_expires",
+            "expires_at",
+            postgresql_where=text("status = 'PENDING' AND expires_at IS NOT NULL")
+        ),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id"), nullable=False, index=True)
@@ -48,3 +56,34 @@ class Payment(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     expires_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class PaymentWebhookEvent(Base):
+    """
+    Inbox входящих webhook CryptoCloud
+
+    Callback только сохраняет событие и сразу отвечает, зачисление делает
+    PaymentInboxService. Повтор того же (invoice_id, status) не создает
+    второго события.
+    """
+    __tablename__ = "payment_webhook_inbox"
+    __table_args__ = (
+        UniqueConstraint("invoice_id", "status", name="uq_payment_webhook_inbox_invoice_status"),
+        # Выборка необработанных событий
+        Index(
+            "ix_payment_webhook_inbox_unprocessed",
+            "received_at",
+            postgresql_where=text("processed_at IS NULL")
+        ),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    invoice_id = Column(String(255), nullable=False, index=True)
+    status = Column(String(50), nullable=False)  # Статус из webhook: success, fail, cancelled, ...
+    payload = Column(Text, nullable=False)  # Исходные данные webhook (JSON)
+
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,11 +1,11 @@
 """
 Telegram Notifications Queue Model
 """
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Enum as SQLEnum, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Enum as SQLEnum, DateTime, Boolean, Index, text
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 class NotificationStatus(str, enum.Enum):
@@ -20,6 +20,7 @@ class NotificationStatus(str, enum.Enum):
 class NotificationType(str, enum.Enum):
     """Тип уведомления"""
     LEADERBOARD_REWARD = "LEADERBOARD_REWARD"  # Награда за место в лидерборде
+    MARKET_CLOSED = "MARKET_CLOSED"  # Прием ставок закрыт по resolve_date
     MARKET_RESOLVED = "MARKET_RESOLVED"  # Рынок разрешен
     BET_WON = "BET_WON"  # Ставка выиграла
     BET_LOST = "BET_LOST"  # Ставка проиграла
@@ -29,10 +30,30 @@ class NotificationType(str, enum.Enum):
 
 
 class TelegramNotification(Base):
-    """Очередь Telegram уведомлений"""
+    """
+    Очередь Telegram уведомлений
+
+    Таблица партиционирована по дням (RANGE по created_at): старые дни
+    удаляются целиком через DETACH + DROP партиции, а pending-выборка
+    идет по маленькому partial индексу незавершенных сообщений.
+    """
     __tablename__ = "telegram_notifications_queue"
+    __table_args__ = (
+        Index(
+            "ix_telegram_notifications_queue_unfinished",
+            "created_at",
+            postgresql_where=text("status IN ('PENDING', 'PROCESSING', 'FAILED')")
+        ),
+        Index(
+            "ix_telegram_notifications_queue_sent_at",
+            "sent_at",
+            postgresql_where=text("status = 'SENT'")
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    # PK партиционированной таблицы обязан включать ключ партиционирования
+    id = Column(Integer, primary_key=True, autoincrement=True)
 
     # Получатель
     telegram_id = Column(BigInteger, nullable=False, index=True)
@@ -44,7 +65,7 @@ class TelegramNotification(Base):
     notification_type = Column(SQLEnum(NotificationType), nullable=False)
 
     # Статус отправки
-    status = Column(SQLEnum(NotificationStatus), default=NotificationStatus.PENDING, nullable=False, index=True)
+    status = Column(SQLEnum(NotificationStatus), default=NotificationStatus.PENDING, nullable=False)
     attempts = Column(Integer, default=0)  # Количество попыток отправки
     max_attempts = Column(Integer, default=5)  # Максимум попыток
 
@@ -61,7 +82,12 @@ class TelegramNotification(Base):
     notification_metadata = Column(Text, nullable=True)  # JSON для дополнительной информации
 
     # Автоматические поля
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        primary_key=True,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
+    )
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     def __repr__(self):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, BigInteger, String, DECIMAL, DateTime, ForeignKey, Enum, Index, text
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -22,6 +22,27 @@ class TransactionStatus(str, enum.Enum):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Deposit watcher: memo-less transfers are matched by amount among pending deposits
+        Index(
+            "ix_transactions_pending_deposit_amount",
+            "amount",
+            postgresql_where=text("status = 'PENDING' AND type = 'DEPOSIT'")
+        ),
+        # One on-chain transfer credits at most one deposit
+        Index(
+            "ix_transactions_deposit_tx_hash",
+            "tx_hash",
+            unique=True,
+            postgresql_where=text("type = 'DEPOSIT' AND tx_hash IS NOT NULL")
+        ),
+        # Expiry sweeper
+        Index(
+            "ix_transactions_pending_deposit_expires",
+            "expires_at",
+            postgresql_where=text("status = 'PENDING' AND type = 'DEPOSIT' AND expires_at IS NOT NULL")
+        ),
+    )
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id"), nullable=False, index=True)
@@ -48,3 +69,12 @@ class Transaction(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     expires_at = Column(DateTime(timezone=True), nullable=True)  # For pending deposits
+
+
+class TonWalletCursor(Base):
+    """Позиция чтения входящих транзакций кошелька платформы (logical time)"""
+    __tablename__ = "ton_wallet_cursors"
+
+    address = Column(String(255), primary_key=True)
+    last_lt = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -26,7 +26,7 @@ class User(Base):
     win_streak = Column(BigInteger, default=0, nullable=False)
 
     # Referral
-    referrer_id = Column(BigInteger, ForeignKey("users.id"), nullable=True)
+    referrer_id = Column(BigInteger, ForeignKey("users.id"), nullable=True, index=True)
     referral_code = Column(String(50), unique=True, nullable=True)
 
     # Ban system
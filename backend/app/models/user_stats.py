@@ -0,0 +1,38 @@
+"""
+User Stats Model - Денормализованная статистика пользователя
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DECIMAL, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class UserStats(Base):
+    """
+    Агрегаты по ставкам пользователя за период
+
+    period_key: "all" (за все время), "week:YYYY-MM-DD" (понедельник недели UTC)
+    или "month:YYYY-MM". Обновляется в той же транзакции, что и ставка /
+    разрешение рынка; сверяется с таблицей bets фоновой задачей.
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period_key = Column(String(20), primary_key=True)
+
+    # Реализованный профит: WON -> payout - amount, LOST -> -amount
+    realized_profit = Column(DECIMAL(20, 2), default=0, nullable=False)
+
+    # Объем ставок по валютам
+    volume_pred = Column(DECIMAL(20, 2), default=0, nullable=False)
+    volume_ton = Column(DECIMAL(20, 2), default=0, nullable=False)
+
+    bets_count = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    losses = Column(Integer, default=0, nullable=False)
+    current_streak = Column(Integer, default=0, nullable=False)
+    best_streak = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<UserStats user={self.user_id} {self.period_key} profit={self.realized_profit}>"
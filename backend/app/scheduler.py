@@ -1,63 +1,362 @@
-"""Background scheduler for periodic tasks like mission resets"""
+"""Background scheduler for periodic tasks like mission period pruning"""
 import asyncio
 import logging
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from app.core.database import AsyncSessionLocal
 from app.services.mission_service import MissionService
+from app.services.user_stats_service import UserStatsService
+from app.services.partition_service import PartitionService
+from app.services.archive_service import ArchiveService
+from app.services.ledger_service import LedgerService
+from app.services.odds_history_service import OddsHistoryService
+from app.services.market_lifecycle_service import MarketLifecycleService
+from app.services.channel_subscription_service import ChannelSubscriptionService
+from app.services.deposit_watcher_service import DepositWatcherService
+from app.services.deposit_expiry_service import DepositExpiryService
+from app.services.payment_inbox_service import PaymentInboxService
+from app.services.leaderboard_service import LeaderboardService
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
 
-async def reset_daily_missions_job():
-    """Reset all daily missions at midnight UTC"""
+async def prune_mission_periods_job():
+    """Delete progress rows of past daily/weekly mission periods in small batches"""
     try:
-        logger.info("Starting daily missions reset...")
+        logger.info("Starting mission periods pruning...")
         async with AsyncSessionLocal() as db:
-            await MissionService.reset_daily_missions(db)
-            logger.info("✓ Daily missions reset completed successfully")
+            deleted = await MissionService.prune_old_periods(db)
+            logger.info(f"✓ Mission periods pruned ({deleted} rows)")
     except Exception as e:
-        logger.error(f"✗ Failed to reset daily missions: {e}", exc_info=True)
+        logger.error(f"✗ Failed to prune mission periods: {e}", exc_info=True)
 
 
-async def reset_weekly_missions_job():
-    """Reset all weekly missions every Monday at midnight UTC"""
+async def reconcile_user_stats_job():
+    """Reconcile user_stats counters against bets"""
     try:
-        logger.info("Starting weekly missions reset...")
+        logger.info("Starting user_stats reconciliation...")
         async with AsyncSessionLocal() as db:
-            await MissionService.reset_weekly_missions(db)
-            logger.info("✓ Weekly missions reset completed successfully")
+            fixed = await UserStatsService.reconcile(db)
+            logger.info(f"✓ user_stats reconciliation completed ({fixed} rows fixed)")
     except Exception as e:
-        logger.error(f"✗ Failed to reset weekly missions: {e}", exc_info=True)
+        logger.error(f"✗ Failed to reconcile user_stats: {e}", exc_info=True)
+
+
+async def create_bets_partitions_job():
+    """Create upcoming monthly partitions of the bets table"""
+    try:
+        async with AsyncSessionLocal() as db:
+            created = await PartitionService.ensure_bets_partitions(db, months_ahead=3)
+            logger.info(f"✓ Bets partitions checked ({created} created)")
+    except Exception as e:
+        logger.error(f"✗ Failed to create bets partitions: {e}", exc_info=True)
+
+
+async def archive_resolved_markets_job():
+    """Move markets resolved long ago (and their bets) to cold storage"""
+    try:
+        total_markets = 0
+        async with AsyncSessionLocal() as db:
+            # Bounded number of batches per run
+            for _ in range(20):
+                result = await ArchiveService.archive_resolved_markets(db)
+                if not result["markets"]:
+                    break
+                total_markets += result["markets"]
+        logger.info(f"✓ Archive completed ({total_markets} markets archived)")
+    except Exception as e:
+        logger.error(f"✗ Failed to archive resolved markets: {e}", exc_info=True)
+
+
+async def snapshot_balances_job():
+    """Fold the ledger tail into balance snapshots"""
+    try:
+        async with AsyncSessionLocal() as db:
+            updated = await LedgerService.snapshot_balances(db)
+            logger.info(f"✓ Balance snapshots updated ({updated} rows)")
+    except Exception as e:
+        logger.error(f"✗ Failed to snapshot balances: {e}", exc_info=True)
+
+
+async def audit_ledger_job():
+    """Verify cached user balances against the ledger journal"""
+    try:
+        logger.info("Starting ledger audit...")
+        async with AsyncSessionLocal() as db:
+            result = await LedgerService.audit(db)
+            logger.info(
+                f"✓ Ledger audit completed ({result['checked']} balances, "
+                f"{result['mismatches']} mismatches, {result['unbalanced_txns']} unbalanced txns)"
+            )
+    except Exception as e:
+        logger.error(f"✗ Failed to audit ledger: {e}", exc_info=True)
+
+
+async def downsample_odds_history_job():
+    """Build 1m/1h/1d odds candles from recent ticks"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await OddsHistoryService.downsample(db)
+    except Exception as e:
+        logger.error(f"✗ Failed to downsample odds history: {e}", exc_info=True)
+
+
+async def prune_odds_history_job():
+    """Delete raw odds ticks and fine-grained candles past retention"""
+    try:
+        async with AsyncSessionLocal() as db:
+            deleted = await OddsHistoryService.prune(db)
+            logger.info(f"✓ Odds history pruned ({deleted} rows)")
+    except Exception as e:
+        logger.error(f"✗ Failed to prune odds history: {e}", exc_info=True)
+
+
+async def close_due_markets_job():
+    """Close open markets whose resolve_date has passed"""
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await MarketLifecycleService.close_due_markets(db)
+            if result["closed"]:
+                logger.info(f"✓ Closed {result['closed']} due markets ({result['notified']} notifications queued)")
+    except Exception as e:
+        logger.error(f"✗ Failed to close due markets: {e}", exc_info=True)
+
+
+async def expire_promotions_job():
+    """Unpin markets whose promotion has expired"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await MarketLifecycleService.expire_promotions(db)
+    except Exception as e:
+        logger.error(f"✗ Failed to expire promotions: {e}", exc_info=True)
+
+
+async def reverify_channel_subscriptions_job():
+    """Re-check subscription missions for all users against the Bot API"""
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await ChannelSubscriptionService.reverify_all(db)
+            logger.info(f"✓ Channel subscriptions re-verified ({result['checked']} checks, {result['subscribed']} subscribed)")
+    except Exception as e:
+        logger.error(f"✗ Failed to re-verify channel subscriptions: {e}", exc_info=True)
+
+
+async def refresh_missions_job():
+    """Recalculate mission progress for users queued by bets, resolutions and reads"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await MissionService.process_refresh_queue(db)
+    except Exception as e:
+        logger.error(f"✗ Failed to refresh mission progress: {e}", exc_info=True)
+
+
+async def watch_deposits_job():
+    """Credit TON deposits found in the platform wallet's incoming transactions"""
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await DepositWatcherService.poll(db)
+            if result["credited"]:
+                logger.info(f"✓ Deposits credited: {result['credited']} ({result['scanned']} transactions scanned)")
+    except Exception as e:
+        logger.error(f"✗ Failed to watch deposits: {e}", exc_info=True)
+
+
+async def expire_pending_deposits_job():
+    """Expire stale pending TON deposits and unpaid CryptoCloud invoices"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await DepositExpiryService.sweep(db)
+    except Exception as e:
+        logger.error(f"✗ Failed to expire pending deposits: {e}", exc_info=True)
+
+
+async def drain_payment_inbox_job():
+    """Process stored CryptoCloud webhooks (credit completed payments)"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await PaymentInboxService.drain(db)
+    except Exception as e:
+        logger.error(f"✗ Failed to drain payment webhook inbox: {e}", exc_info=True)
+
+
+async def rebuild_rank_index_job():
+    """Rebuild the Redis rank index of the current week and month leaderboards"""
+    for period_type in ("week", "month"):
+        try:
+            async with AsyncSessionLocal() as db:
+                await LeaderboardService.rebuild_rank_index(db, period_type)
+        except Exception as e:
+            logger.error(f"✗ Failed to rebuild {period_type} rank index: {e}", exc_info=True)
 
 
 def start_scheduler():
     """Start the background scheduler with all jobs"""
-    # Daily missions reset - every day at 00:00 UTC
+    # Mission progress is keyed by period (resets are implicit), old periods pruned at 00:10 UTC
+    scheduler.add_job(
+        prune_mission_periods_job,
+        trigger=CronTrigger(hour=0, minute=10, timezone='UTC'),
+        id='prune_mission_periods',
+        name='Prune Mission Periods',
+        replace_existing=True
+    )
+
+    # user_stats reconciliation - every day at 03:00 UTC
+    scheduler.add_job(
+        reconcile_user_stats_job,
+        trigger=CronTrigger(hour=3, minute=0, timezone='UTC'),
+        id='reconcile_user_stats',
+        name='Reconcile User Stats',
+        replace_existing=True
+    )
+
+    # Bets partitions - every day at 01:00 UTC (idempotent, 3 months ahead)
+    scheduler.add_job(
+        create_bets_partitions_job,
+        trigger=CronTrigger(hour=1, minute=0, timezone='UTC'),
+        id='create_bets_partitions',
+        name='Create Bets Partitions',
+        replace_existing=True
+    )
+
+    # Cold storage archive - every day at 04:00 UTC
+    scheduler.add_job(
+        archive_resolved_markets_job,
+        trigger=CronTrigger(hour=4, minute=0, timezone='UTC'),
+        id='archive_resolved_markets',
+        name='Archive Resolved Markets',
+        replace_existing=True
+    )
+
+    # Balance snapshots - every hour at :15
+    scheduler.add_job(
+        snapshot_balances_job,
+        trigger=CronTrigger(minute=15, timezone='UTC'),
+        id='snapshot_balances',
+        name='Snapshot Balances',
+        replace_existing=True
+    )
+
+    # Ledger audit - every day at 05:00 UTC
+    scheduler.add_job(
+        audit_ledger_job,
+        trigger=CronTrigger(hour=5, minute=0, timezone='UTC'),
+        id='audit_ledger',
+        name='Audit Ledger',
+        replace_existing=True
+    )
+
+    # Odds candles - every minute
+    scheduler.add_job(
+        downsample_odds_history_job,
+        trigger=CronTrigger(minute='*', timezone='UTC'),
+        id='downsample_odds_history',
+        name='Downsample Odds History',
+        replace_existing=True
+    )
+
+    # Odds history retention - every day at 02:00 UTC
+    scheduler.add_job(
+        prune_odds_history_job,
+        trigger=CronTrigger(hour=2, minute=0, timezone='UTC'),
+        id='prune_odds_history',
+        name='Prune Odds History',
+        replace_existing=True
+    )
+
+    # Mission progress refresh queue - every 5 seconds
+    scheduler.add_job(
+        refresh_missions_job,
+        trigger=IntervalTrigger(seconds=5),
+        id='refresh_missions',
+        name='Refresh Mission Progress',
+        replace_existing=True
+    )
+
+    # TON deposit watcher - every 15 seconds
+    scheduler.add_job(
+        watch_deposits_job,
+        trigger=IntervalTrigger(seconds=15),
+        id='watch_deposits',
+        name='Watch TON Deposits',
+        replace_existing=True
+    )
+
+    # Pending deposits/payments expiry - every 5 minutes
+    scheduler.add_job(
+        expire_pending_deposits_job,
+        trigger=CronTrigger(minute='*/5', timezone='UTC'),
+        id='expire_pending_deposits',
+        name='Expire Pending Deposits',
+        replace_existing=True
+    )
+
+    # CryptoCloud webhook inbox - every 5 seconds (SKIP LOCKED, safe on several replicas)
+    scheduler.add_job(
+        drain_payment_inbox_job,
+        trigger=IntervalTrigger(seconds=5),
+        id='drain_payment_inbox',
+        name='Drain Payment Webhook Inbox',
+        replace_existing=True
+    )
+
+    # Leaderboard rank index (Redis) - every minute, expires after RANK_INDEX_TTL
+    scheduler.add_job(
+        rebuild_rank_index_job,
+        trigger=IntervalTrigger(seconds=60),
+        id='rebuild_rank_index',
+        name='Rebuild Leaderboard Rank Index',
+        replace_existing=True
+    )
+
+    # Auto-close due markets - every 10 seconds (SKIP LOCKED, safe on several replicas)
+    scheduler.add_job(
+        close_due_markets_job,
+        trigger=IntervalTrigger(seconds=10),
+        id='close_due_markets',
+        name='Close Due Markets',
+        replace_existing=True
+    )
+
+    # Promotion expiry - every minute
     scheduler.add_job(
-        reset_daily_missions_job,
-        trigger=CronTrigger(hour=0, minute=0, timezone='UTC'),
-        id='reset_daily_missions',
-        name='Reset Daily Missions',
+        expire_promotions_job,
+        trigger=CronTrigger(minute='*', timezone='UTC'),
+        id='expire_promotions',
+        name='Expire Promotions',
         replace_existing=True
     )
 
-    # Weekly missions reset - every Monday at 00:00 UTC
+    # Channel subscriptions re-verification - every day at 06:00 UTC
     scheduler.add_job(
-        reset_weekly_missions_job,
-        trigger=CronTrigger(day_of_week='mon', hour=0, minute=0, timezone='UTC'),
-        id='reset_weekly_missions',
-        name='Reset Weekly Missions',
+        reverify_channel_subscriptions_job,
+        trigger=CronTrigger(hour=6, minute=0, timezone='UTC'),
+        id='reverify_channel_subscriptions',
+        name='Re-verify Channel Subscriptions',
         replace_existing=True
     )
 
     scheduler.start()
     logger.info("✓ Scheduler started successfully")
-    logger.info(f"  - Daily missions reset: Every day at 00:00 UTC")
-    logger.info(f"  - Weekly missions reset: Every Monday at 00:00 UTC")
+    logger.info(f"  - Mission periods pruning: Every day at 00:10 UTC")
+    logger.info(f"  - user_stats reconciliation: Every day at 03:00 UTC")
+    logger.info(f"  - Bets partitions: Every day at 01:00 UTC")
+    logger.info(f"  - Resolved markets archive: Every day at 04:00 UTC")
+    logger.info(f"  - Balance snapshots: Every hour at :15")
+    logger.info(f"  - Ledger audit: Every day at 05:00 UTC")
+    logger.info(f"  - Odds history downsampling: Every minute")
+    logger.info(f"  - Odds history retention: Every day at 02:00 UTC")
+    logger.info(f"  - Mission progress refresh queue: Every 5 seconds")
+    logger.info(f"  - TON deposit watcher: Every 15 seconds")
+    logger.info(f"  - Pending deposits expiry: Every 5 minutes")
+    logger.info(f"  - CryptoCloud webhook inbox: Every 5 seconds")
+    logger.info(f"  - Leaderboard rank index: Every minute")
+    logger.info(f"  - Due markets auto-close: Every 10 seconds")
+    logger.info(f"  - Promotion expiry: Every minute")
+    logger.info(f"  - Channel subscriptions re-verification: Every day at 06:00 UTC")
 
 
 def stop_scheduler():
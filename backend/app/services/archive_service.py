@@ -0,0 +1,182 @@
+"""
+Archive Service - Перенос старых рынков и ставок в холодное хранилище
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, desc, text, and_
+from app.core.config import settings
+from app.models.market import Market, MarketStatus
+from app.models.bet import Bet, BetStatus
+from app.models.archive import ArchivedBet
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+import asyncio
+import enum
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveService:
+    """
+    Архивация разрешенных рынков и их ставок
+
+    Полные строки пишутся в Parquet (zstd) в S3/MinIO или локально,
+    затем в одной транзакции в БД создаются тонкие строки archived_*
+    и удаляются исходные. Если запись файла не удалась - БД не трогаем.
+    """
+
+    @staticmethod
+    def _rows_to_parquet(rows: List[Dict]) -> bytes:
+        """Сериализовать строки в Parquet"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        normalized = [
+            {k: (v.value if isinstance(v, enum.Enum) else v) for k, v in row.items()}
+            for row in rows
+        ]
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pylist(normalized), buffer, compression="zstd")
+        return buffer.getvalue()
+
+    @staticmethod
+    async def _store(key: str, body: bytes) -> str:
+        """Сохранить файл архива, вернуть его URI"""
+        if settings.ARCHIVE_STORAGE == "local":
+            path = Path(settings.ARCHIVE_LOCAL_DIR) / key
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            await asyncio.to_thread(path.write_bytes, body)
+            return f"file://{path}"
+
+        # Архивы содержат user_id - только приватный бакет, не публичный S3_BUCKET
+        from app.core.s3 import s3_client
+        await s3_client.init_archive_bucket()
+        return await s3_client.put_private_object(key, body, content_type="application/vnd.apache.parquet")
+
+    @staticmethod
+    async def archive_resolved_markets(
+        db: AsyncSession,
+        older_than_days: int = None,
+        batch_size: int = 50
+    ) -> Dict:
+        """
+        Заархивировать один пакет рынков, разрешенных больше N дней назад
+
+        Args:
+            db: Database session
+            older_than_days: Возраст разрешения рынка (по умолчанию ARCHIVE_AFTER_DAYS)
+            batch_size: Максимум рынков за один пакет
+
+        Returns:
+            Количество заархивированных рынков и ставок, URI файла
+        """
+        days = older_than_days if older_than_days is not None else settings.ARCHIVE_AFTER_DAYS
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+
+        # Рынки без незавершенных ставок; SKIP LOCKED - параллельные запуски не мешают друг другу
+        pending_bets = select(Bet.id).where(
+            and_(Bet.market_id == Market.id, Bet.status == BetStatus.PENDING)
+        ).exists()
+
+        # search_vector - производная колонка, в архив не пишется
+        market_columns = [column for column in Market.__table__.c if column.name != "search_vector"]
+        result = await db.execute(
+            select(*market_columns)
+            .where(and_(
+                Market.status.in_([MarketStatus.RESOLVED, MarketStatus.CANCELLED]),
+                Market.resolved_at < cutoff,
+                ~pending_bets
+            ))
+            .order_by(Market.resolved_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        markets = [dict(row._mapping) for row in result.all()]
+
+        if not markets:
+            await db.rollback()
+            return {"markets": 0, "bets": 0, "archive_uri": None}
+
+        market_ids = [m["id"] for m in markets]
+        result = await db.execute(
+            select(Bet.__table__).where(Bet.market_id.in_(market_ids)).order_by(Bet.id)
+        )
+        bets = [dict(row._mapping) for row in result.all()]
+
+        # 1. Файлы архива (если не получилось - исключение, БД откатится)
+        now = datetime.now(timezone.utc)
+        prefix = f"archive/{now:%Y/%m}/{now:%Y%m%dT%H%M%S}-{market_ids[0]}"
+        try:
+            markets_body = await asyncio.to_thread(ArchiveService._rows_to_parquet, markets)
+            bets_body = await asyncio.to_thread(ArchiveService._rows_to_parquet, bets) if bets else None
+            archive_uri = await ArchiveService._store(f"{prefix}-markets.parquet", markets_body)
+            if bets_body:
+                await ArchiveService._store(f"{prefix}-bets.parquet", bets_body)
+        except Exception:
+            await db.rollback()
+            raise
+
+        # 2. Тонкие строки + удаление исходных в одной транзакции
+        try:
+            await db.execute(
+                text("""
+                    INSERT INTO archived_bets
+                        (id, user_id, market_id, position, amount, currency, odds, potential_win, status, payout, created_at)
+                    SELECT id, user_id, market_id, position::text, amount, currency::text, odds, potential_win,
+                           lower(status::text), payout, created_at
+                    FROM bets
+                    WHERE market_id = ANY(:market_ids)
+                    ON CONFLICT (id) DO NOTHING
+                """),
+                {"market_ids": market_ids}
+            )
+            await db.execute(
+                text("""
+                    INSERT INTO archived_markets
+                        (id, title, category, outcome, total_volume_pred, total_volume_ton, bets_count, resolved_at, archive_uri)
+                    SELECT id, title, category, lower(outcome::text), total_volume_pred, total_volume_ton,
+                           bets_count, resolved_at, :archive_uri
+                    FROM markets
+                    WHERE id = ANY(:market_ids)
+                    ON CONFLICT (id) DO NOTHING
+                """),
+                {"market_ids": market_ids, "archive_uri": archive_uri}
+            )
+            await db.execute(delete(Bet).where(Bet.market_id.in_(market_ids)))
+            await db.execute(delete(Market).where(Market.id.in_(market_ids)))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        logger.info(f"📦 Заархивировано {len(markets)} рынков и {len(bets)} ставок -> {archive_uri}")
+
+        return {"markets": len(markets), "bets": len(bets), "archive_uri": archive_uri}
+
+    @staticmethod
+    async def get_user_history(db: AsyncSession, user_id: int, limit: int = 20) -> List:
+        """
+        История ставок пользователя: живые и архивные ставки по убыванию даты
+
+        Архивные строки имеют те же поля, что и Bet, поэтому ответ
+        не отличается для клиента.
+        """
+        result = await db.execute(
+            select(Bet).where(Bet.user_id == user_id).order_by(desc(Bet.created_at)).limit(limit)
+        )
+        live = list(result.scalars().all())
+
+        result = await db.execute(
+            select(ArchivedBet)
+            .where(ArchivedBet.user_id == user_id)
+            .order_by(desc(ArchivedBet.created_at))
+            .limit(limit)
+        )
+        archived = list(result.scalars().all())
+
+        if not archived:
+            return live
+
+        return sorted(live + archived, key=lambda bet: bet.created_at, reverse=True)[:limit]
@@ -0,0 +1,273 @@
+"""
+Channel Subscription Service - Проверка подписки на Telegram каналы
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.mission import Mission, UserMission
+from app.models.user import User
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import aiohttp
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelSubscriptionService:
+    """
+    getChatMember с кэшем и ограничением нагрузки на Bot API
+
+    - одна aiohttp сессия на процесс
+    - результат кэшируется в Redis: подписка надолго, отсутствие подписки
+      ненадолго (пользователь может подписаться прямо сейчас)
+    - одинаковые проверки, выполняющиеся одновременно, объединяются
+    - одновременных запросов к Bot API не больше TELEGRAM_API_CONCURRENCY
+    """
+
+    MEMBER_STATUSES = ("member", "administrator", "creator")
+
+    CACHE_KEY = "tg_member:{chat_id}:{user_id}"
+    POSITIVE_TTL = 6 * 3600  # секунд
+    NEGATIVE_TTL = 60  # секунд
+
+    REQUEST_TIMEOUT = 10  # секунд
+    MAX_RETRY_AFTER = 30  # секунд, дольше ждать 429 не имеет смысла
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _in_flight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    @classmethod
+    def _get_session(cls) -> aiohttp.ClientSession:
+        if cls._session is None or cls._session.closed:
+            cls._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=cls.REQUEST_TIMEOUT)
+            )
+        return cls._session
+
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(settings.TELEGRAM_API_CONCURRENCY)
+        return cls._semaphore
+
+    @classmethod
+    async def close(cls) -> None:
+        """Закрыть общую HTTP сессию (при остановке приложения)"""
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @classmethod
+    async def _get_chat_member(cls, bot_token: str, chat_id: str, user_id: int) -> Optional[bool]:
+        """
+        Один запрос getChatMember
+
+        Returns:
+            True/False - подписан или нет, None - чат не найден / ошибка API
+        """
+        url = f"https://api.telegram.org/bot{bot_token}/getChatMember"
+        params = {"chat_id": chat_id, "user_id": user_id}
+
+        for _ in range(2):
+            async with cls._get_semaphore():
+                async with cls._get_session().get(url, params=params) as response:
+                    data = await response.json(content_type=None)
+
+            if response.status == 429:
+                retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+                if retry_after > cls.MAX_RETRY_AFTER:
+                    break
+                logger.warning(f"⚠️ Bot API 429, повтор через {retry_after}с")
+                await asyncio.sleep(retry_after)
+                continue
+
+            if response.status == 200 and data.get("ok"):
+                return data["result"]["status"] in cls.MEMBER_STATUSES
+
+            # 400 user not found - пользователь не в канале
+            description = (data.get("description") or "").lower()
+            if "user not found" in description or "participant_id_invalid" in description:
+                return False
+            return None
+
+        return None
+
+    @classmethod
+    async def _check_uncached(
+        cls,
+        bot_token: str,
+        user_id: int,
+        channel_id: Optional[str],
+        channel_username: Optional[str]
+    ) -> Optional[bool]:
+        """Проверка по ID канала, при ошибке - по @username"""
+        result = None
+        if channel_id:
+            result = await cls._get_chat_member(bot_token, channel_id, user_id)
+        if result is None and channel_username:
+            result = await cls._get_chat_member(bot_token, f"@{channel_username}", user_id)
+        return result
+
+    @classmethod
+    async def is_member(
+        cls,
+        user_id: int,
+        channel_id: Optional[str],
+        channel_username: Optional[str],
+        use_cache: bool = True,
+        bot_token: Optional[str] = None
+    ) -> bool:
+        """
+        Подписан ли пользователь на канал
+
+        Args:
+            user_id: Telegram ID пользователя
+            channel_id: ID канала
+            channel_username: @username канала (без @)
+            use_cache: Читать результат из Redis
+            bot_token: Токен бота (по умолчанию BOT_TOKEN)
+        """
+        bot_token = bot_token or settings.BOT_TOKEN
+        if not bot_token:
+            logger.error("BOT_TOKEN not found in environment")
+            return False
+
+        chat_key = channel_id or f"@{channel_username}"
+        cache_key = cls.CACHE_KEY.format(chat_id=chat_key, user_id=user_id)
+
+        redis = None
+        try:
+            redis = await get_redis()
+            if use_cache:
+                cached = await redis.get(cache_key)
+                if cached is not None:
+                    return cached == "1"
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен для кэша подписок: {e}")
+            redis = None
+
+        # Объединение одинаковых одновременных проверок
+        flight_key = (chat_key, user_id)
+        future = cls._in_flight.get(flight_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        cls._in_flight[flight_key] = future
+        try:
+            try:
+                result = await cls._check_uncached(bot_token, user_id, channel_id, channel_username)
+            except Exception as e:
+                logger.error(f"Error checking channel subscription: {e}")
+                result = None
+
+            subscribed = bool(result)
+            # Ошибки API не кэшируем
+            if redis is not None and result is not None:
+                try:
+                    await redis.set(
+                        cache_key,
+                        "1" if subscribed else "0",
+                        ex=cls.POSITIVE_TTL if subscribed else cls.NEGATIVE_TTL
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось закэшировать подписку: {e}")
+
+            future.set_result(subscribed)
+            return subscribed
+        finally:
+            cls._in_flight.pop(flight_key, None)
+            if not future.done():
+                future.set_result(False)
+
+    @classmethod
+    async def check_many(
+        cls,
+        checks: Iterable[Tuple[int, Optional[str], Optional[str]]],
+        use_cache: bool = True
+    ) -> List[bool]:
+        """Проверить несколько (user_id, channel_id, channel_username) параллельно"""
+        return await asyncio.gather(*[
+            cls.is_member(user_id, channel_id, channel_username, use_cache=use_cache)
+            for user_id, channel_id, channel_username in checks
+        ])
+
+    @classmethod
+    async def reverify_all(cls, db: AsyncSession, page_size: int = 500) -> Dict[str, int]:
+        """
+        Перепроверить подписки всех пользователей на каналы миссий
+
+        Идет по users страницами (keyset по id), проверяет в обход кэша
+        (обновляя его) и отмечает выполненные subscription миссии одним
+        INSERT ... ON CONFLICT на страницу.
+
+        Returns:
+            Количество проверок и найденных подписок
+        """
+        result = await db.execute(
+            select(Mission).where(
+                Mission.type == "subscription",
+                Mission.is_active == True
+            )
+        )
+        missions = [m for m in result.scalars().all() if m.channel_id or m.channel_username]
+        if not missions:
+            return {"checked": 0, "subscribed": 0}
+
+        from app.services.mission_service import MissionService
+        period_keys = {m.id: MissionService.period_key(m.type) for m in missions}
+
+        checked = 0
+        subscribed_total = 0
+        last_id = 0
+
+        while True:
+            result = await db.execute(
+                select(User.id, User.telegram_id)
+                .where(User.id > last_id, User.is_banned == False)
+                .order_by(User.id)
+                .limit(page_size)
+            )
+            users = result.all()
+            if not users:
+                break
+            last_id = users[-1].id
+
+            pairs = [(user, mission) for user in users for mission in missions]
+            results = await cls.check_many(
+                [(user.telegram_id, mission.channel_id, mission.channel_username) for user, mission in pairs],
+                use_cache=False
+            )
+            checked += len(pairs)
+
+            now = datetime.now(timezone.utc)
+            rows = [
+                {
+                    "user_id": user.id,
+                    "mission_id": mission.id,
+                    "period_key": period_keys[mission.id],
+                    "progress": 1,
+                    "completed": True,
+                    "claimed": False,
+                    "completed_at": now,
+                }
+                for (user, mission), subscribed in zip(pairs, results) if subscribed
+            ]
+            if rows:
+                stmt = insert(UserMission).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[UserMission.user_id, UserMission.mission_id, UserMission.period_key],
+                    set_={"progress": 1, "completed": True},
+                    where=UserMission.completed == False
+                )
+                await db.execute(stmt)
+                await db.commit()
+                subscribed_total += len(rows)
+
+        logger.info(f"✅ Подписки перепроверены: {checked} проверок, {subscribed_total} подписаны")
+        return {"checked": checked, "subscribed": subscribed_total}
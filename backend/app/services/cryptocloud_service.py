@@ -4,7 +4,6 @@ CryptoCloud Payment Gateway Service
 Handles:
 - Creating payment invoices
 - Checking payment status
-- Processing webhooks
 """
 import httpx
 import json
@@ -18,8 +17,6 @@ from sqlalchemy import select
 
 from app.core.config import settings
 from app.models.payment import Payment, PaymentStatus, PaymentMethod
-from app.models.user import User
-from app.models.transaction import Transaction, TransactionType, TransactionStatus
 
 logger = logging.getLogger(__name__)
 
@@ -232,101 +229,3 @@ class PaymentService:
         )
         result = await self.db.execute(query)
         return result.scalars().all()
-
-    async def process_payment_webhook(self, webhook_data: Dict) -> bool:
-        """
-        Process webhook from CryptoCloud
-
-        Expected webhook data:
-        {
-            "invoice_id": "uuid",
-            "amount_crypto": "0.001",
-            "currency": "BTC",
-            "status": "success",
-            ...
-        }
-
-        Returns:
-            True if processed successfully
-        """
-        try:
-            invoice_id = webhook_data.get("invoice_id")
-            status = webhook_data.get("status")
-
-            if not invoice_id:
-                logger.error("Webhook missing invoice_id")
-                return False
-
-            # Find payment
-            payment = await self.get_payment_by_invoice_id(invoice_id)
-            if not payment:
-                logger.error(f"Payment not found for invoice_id: {invoice_id}")
-                return False
-
-            # Check if already processed
-            if payment.status == PaymentStatus.COMPLETED:
-                logger.info(f"Payment {payment.id} already completed")
-                return True
-
-            # Process based on status
-            if status == "success":
-                await self._complete_payment(payment, webhook_data)
-                logger.info(f"Payment {payment.id} completed successfully")
-                return True
-            elif status in ["fail", "cancelled"]:
-                payment.status = PaymentStatus.FAILED
-                await self.db.commit()
-                logger.info(f"Payment {payment.id} failed/cancelled")
-                return True
-            else:
-                logger.warning(f"Unknown payment status: {status}")
-                return False
-
-        except Exception as e:
-            logger.error(f"Error processing webhook: {str(e)}")
-            await self.db.rollback()
-            return False
-
-    async def _complete_payment(self, payment: Payment, webhook_data: Dict):
-        """Complete payment and credit user balance"""
-        try:
-            # Update payment
-            payment.status = PaymentStatus.COMPLETED
-            payment.completed_at = datetime.utcnow()
-            payment.crypto_amount = Decimal(str(webhook_data.get("amount_crypto", 0)))
-            payment.crypto_currency = webhook_data.get("currency", "")
-            payment.payment_data = json.dumps(webhook_data)
-
-            # Get user
-            query = select(User).where(User.id == payment.user_id)
-            result = await self.db.execute(query)
-            user = result.scalars().first()
-
-            if not user:
-                raise Exception(f"User {payment.user_id} not found")
-
-            # Credit TON balance (not PRED!)
-            # Calculate TON amount from USD (approximate rate, actual from CryptoCloud)
-            ton_amount = Decimal(str(float(payment.amount) * settings.USD_TO_TON_RATE))
-            user.ton_balance += ton_amount
-
-            # Create transaction record
-            transaction = Transaction(
-                user_id=user.id,
-                type=TransactionType.DEPOSIT,
-                currency="TON",
-                amount=ton_amount,
-                status=TransactionStatus.COMPLETED,
-                description=f"CryptoCloud deposit: ${payment.amount} USDT → {ton_amount} TON",
-                completed_at=datetime.utcnow()
-            )
-            self.db.add(transaction)
-
-            await self.db.commit()
-
-            logger.info(f"User {user.id} credited {ton_amount} TON (Payment {payment.id})")
-
-        except Exception as e:
-            await self.db.rollback()
-            logger.error(f"Error completing payment: {str(e)}")
-            raise
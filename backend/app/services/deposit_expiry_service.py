@@ -0,0 +1,116 @@
+"""
+Deposit Expiry Service - Истечение незавершенных депозитов и платежей
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DepositExpiryService:
+    """
+    Пакетное истечение pending депозитов (transactions) и платежей CryptoCloud
+
+    Строки выбираются по partial индексам expires_at среди pending и берутся
+    через FOR UPDATE SKIP LOCKED, каждый пакет - отдельная короткая транзакция.
+    """
+
+    BATCH_SIZE = 500
+
+    # TON перевод мог уйти перед самым истечением: deposit watcher должен успеть
+    # его зачислить, пока депозит еще pending
+    DEPOSIT_GRACE = "1 hour"
+
+    @staticmethod
+    async def _sweep(db: AsyncSession, statement: str, batch_size: int, max_batches: int) -> int:
+        expired_total = 0
+
+        for _ in range(max_batches):
+            try:
+                result = await db.execute(text(statement), {"batch_size": batch_size})
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+            expired = result.rowcount or 0
+            expired_total += expired
+            if expired < batch_size:
+                break
+
+        return expired_total
+
+    @staticmethod
+    async def expire_deposits(db: AsyncSession, batch_size: int = BATCH_SIZE, max_batches: int = 20) -> int:
+        """
+        Отметить FAILED pending TON депозиты, срок которых истек
+
+        Returns:
+            Количество истекших депозитов
+        """
+        return await DepositExpiryService._sweep(
+            db,
+            f"""
+                WITH expired AS (
+                    SELECT id
+                    FROM transactions
+                    WHERE status = 'PENDING'
+                      AND type = 'DEPOSIT'
+                      AND expires_at IS NOT NULL
+                      AND expires_at < now() - interval '{DepositExpiryService.DEPOSIT_GRACE}'
+                    ORDER BY expires_at
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE transactions t
+                SET status = 'FAILED', description = 'Deposit timeout expired'
+                FROM expired
+                WHERE t.id = expired.id
+            """,
+            batch_size,
+            max_batches
+        )
+
+    @staticmethod
+    async def expire_payments(db: AsyncSession, batch_size: int = BATCH_SIZE, max_batches: int = 20) -> int:
+        """
+        Отметить CANCELLED неоплаченные счета CryptoCloud с истекшим сроком
+
+        Поздний webhook об успешной оплате по-прежнему завершает платеж.
+
+        Returns:
+            Количество истекших платежей
+        """
+        return await DepositExpiryService._sweep(
+            db,
+            """
+                WITH expired AS (
+                    SELECT id
+                    FROM payments
+                    WHERE status = 'PENDING'
+                      AND expires_at IS NOT NULL
+                      AND expires_at < now()
+                    ORDER BY expires_at
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE payments p
+                SET status = 'CANCELLED', updated_at = now()
+                FROM expired
+                WHERE p.id = expired.id
+            """,
+            batch_size,
+            max_batches
+        )
+
+    @staticmethod
+    async def sweep(db: AsyncSession) -> Dict[str, int]:
+        """Истечь депозиты и платежи"""
+        deposits = await DepositExpiryService.expire_deposits(db)
+        payments = await DepositExpiryService.expire_payments(db)
+
+        if deposits or payments:
+            logger.info(f"⌛ Истекло: {deposits} TON депозитов, {payments} платежей CryptoCloud")
+        return {"deposits": deposits, "payments": payments}
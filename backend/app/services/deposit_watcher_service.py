@@ -0,0 +1,336 @@
+"""
+Deposit Watcher Service - Автоматическое зачисление TON депозитов
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.models.transaction import TonWalletCursor
+from app.models.telegram_notification import NotificationType
+from app.services.ledger_service import LedgerService
+from app.services.telegram_queue_service import TelegramQueueService
+from app.services.ton_service import TONService, get_ton_service
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+class DepositWatcherService:
+    """
+    Чтение входящих транзакций кошелька платформы и зачисление депозитов
+
+    Транзакции читаются страницами по возрастанию logical time, позиция
+    (ton_wallet_cursors.last_lt) сохраняется в той же транзакции БД, что и
+    зачисления страницы, поэтому каждый перевод обрабатывается ровно один раз.
+
+    Сопоставление с pending депозитами:
+    - по комментарию "ThePred Deposit #<transaction_id>" (его отправляет Mini App)
+    - без комментария - по сумме, если ей соответствует ровно один pending депозит
+    """
+
+    PAGE_SIZE = 100
+    MAX_PAGES = 10
+    AMOUNT_TOLERANCE = Decimal("0.01")  # TON
+
+    MEMO_PATTERN = re.compile(r"deposit\s*#\s*(\d+)", re.IGNORECASE)
+
+    @staticmethod
+    def deposit_memo(transaction_id: int) -> str:
+        """Комментарий к переводу, по которому депозит находится автоматически"""
+        return f"ThePred Deposit #{transaction_id}"
+
+    @staticmethod
+    def parse_incoming(tx: Dict) -> Optional[Dict]:
+        """
+        Входящий перевод TON из транзакции TonAPI
+
+        Returns:
+            {"hash", "lt", "amount", "sender", "memo_id"} или None для исходящих,
+            неуспешных и bounce транзакций
+        """
+        in_msg = tx.get("in_msg") or {}
+        source = (in_msg.get("source") or {}).get("address")
+        if not source or not tx.get("success", False) or tx.get("aborted"):
+            return None
+        if in_msg.get("bounced"):
+            return None
+
+        value = int(in_msg.get("value") or 0)
+        if value <= 0:
+            return None
+
+        memo_id = None
+        comment = (in_msg.get("decoded_body") or {}).get("text")
+        if comment:
+            match = DepositWatcherService.MEMO_PATTERN.search(comment)
+            if match:
+                memo_id = int(match.group(1))
+
+        return {
+            "hash": tx.get("hash"),
+            "lt": int(tx.get("lt") or 0),
+            "amount": TONService.nanoton_to_ton(value),
+            "sender": source,
+            "memo_id": memo_id,
+        }
+
+    @staticmethod
+    def find_incoming(trace: Dict, address: str) -> Optional[Dict]:
+        """
+        Входящий перевод на address внутри трейса TonAPI
+
+        Нужен для ручной проверки: пользователь присылает хэш события, а зачисление
+        идет по хэшу транзакции кошелька платформы - тому же, что пишет watcher.
+
+        Args:
+            trace: JSON /traces/{trace_id}
+            address: Адрес кошелька платформы в raw формате (0:...)
+        """
+        nodes = [trace]
+        while nodes:
+            node = nodes.pop()
+            tx = node.get("transaction") or {}
+            if (tx.get("account") or {}).get("address", "").lower() == address.lower():
+                transfer = DepositWatcherService.parse_incoming(tx)
+                if transfer:
+                    return transfer
+            nodes.extend(node.get("children") or [])
+        return None
+
+    @staticmethod
+    async def _get_cursor(db: AsyncSession, address: str, ton: TONService) -> int:
+        """
+        Текущая позиция чтения
+
+        При первом запуске позиция ставится на последнюю транзакцию кошелька:
+        история до этого момента не сканируется (ручная проверка остается).
+        """
+        cursor = await db.scalar(
+            select(TonWalletCursor.last_lt).where(TonWalletCursor.address == address)
+        )
+        if cursor is not None:
+            return cursor
+
+        latest = await ton.get_account_transactions(address, limit=1, sort_order="desc")
+        last_lt = int(latest[0]["lt"]) if latest else 0
+        await db.execute(
+            insert(TonWalletCursor).values(address=address, last_lt=last_lt)
+            .on_conflict_do_nothing(index_elements=[TonWalletCursor.address])
+        )
+        await db.commit()
+        logger.info(f"🧭 Deposit watcher: начало чтения {address} с lt={last_lt}")
+        return last_lt
+
+    @staticmethod
+    async def _match(db: AsyncSession, address: str, transfers: List[Dict]) -> List[Tuple[Dict, int]]:
+        """Сопоставить переводы страницы с pending депозитами (два запроса на страницу)"""
+        hashes = [t["hash"] for t in transfers]
+        result = await db.execute(
+            text("SELECT tx_hash FROM transactions WHERE tx_hash = ANY(:hashes)"),
+            {"hashes": hashes}
+        )
+        used_hashes = {row.tx_hash for row in result}
+        transfers = [t for t in transfers if t["hash"] not in used_hashes]
+
+        memo_ids = [t["memo_id"] for t in transfers if t["memo_id"]]
+        amounts = [t["amount"].quantize(Decimal("0.01")) for t in transfers if not t["memo_id"]]
+
+        result = await db.execute(
+            text("""
+                SELECT id, amount, (expires_at IS NULL OR expires_at > now()) AS active
+                FROM transactions
+                WHERE status = 'PENDING'
+                  AND type = 'DEPOSIT'
+                  AND deposit_address = :address
+                  AND (id = ANY(:memo_ids) OR amount = ANY(:amounts))
+            """),
+            {"address": address, "memo_ids": memo_ids, "amounts": amounts}
+        )
+        pending = result.all()
+        by_id = {row.id: row for row in pending}
+        by_amount: Dict[Decimal, List] = {}
+        for row in pending:
+            # По сумме - только депозиты в пределах срока
+            if row.active:
+                by_amount.setdefault(row.amount, []).append(row)
+
+        matches = []
+        taken = set()
+        for transfer in transfers:
+            row = None
+            if transfer["memo_id"]:
+                row = by_id.get(transfer["memo_id"])
+                if row is not None and transfer["amount"] < row.amount - DepositWatcherService.AMOUNT_TOLERANCE:
+                    logger.warning(
+                        f"⚠️ Депозит #{row.id}: получено {transfer['amount']} TON вместо {row.amount}, "
+                        f"tx={transfer['hash']}"
+                    )
+                    row = None
+            else:
+                candidates = by_amount.get(transfer["amount"].quantize(Decimal("0.01")), [])
+                if len(candidates) == 1:
+                    row = candidates[0]
+
+            if row is None or row.id in taken:
+                logger.info(
+                    f"❔ Входящий перевод без депозита: {transfer['amount']} TON от {transfer['sender']}, "
+                    f"tx={transfer['hash']}"
+                )
+                continue
+
+            taken.add(row.id)
+            matches.append((transfer, row.id))
+
+        return matches
+
+    @staticmethod
+    async def credit(db: AsyncSession, matches: List[Tuple[Dict, int]]) -> int:
+        """
+        Зачислить сопоставленные депозиты (без commit)
+
+        Статусы, балансы, журнал и уведомления - set-based запросами на всю пачку.
+        Зачисляются только депозиты, еще находящиеся в PENDING, поэтому watcher и
+        ручная проверка (/wallet/deposit/verify) не зачислят один депозит дважды;
+        один перевод на два депозита не даст уникальный индекс по tx_hash.
+
+        Returns:
+            Количество зачисленных депозитов
+        """
+        if not matches:
+            return 0
+
+        result = await db.execute(
+            text("""
+                WITH matched AS (
+                    SELECT *
+                    FROM unnest(CAST(:ids AS BIGINT[]), CAST(:hashes AS VARCHAR[]), CAST(:senders AS VARCHAR[]))
+                        AS m(id, tx_hash, sender)
+                ), completed AS (
+                    UPDATE transactions t
+                    SET status = 'COMPLETED',
+                        tx_hash = m.tx_hash,
+                        ton_address = m.sender,
+                        confirmations = 1,
+                        completed_at = now()
+                    FROM matched m
+                    WHERE t.id = m.id
+                      AND t.status = 'PENDING'
+                      AND t.type = 'DEPOSIT'
+                    RETURNING t.id, t.user_id, t.amount, trunc(t.converted_amount) AS pred_amount
+                ), credited AS (
+                    UPDATE users u
+                    SET pred_balance = u.pred_balance + c.pred_amount,
+                        ton_balance = u.ton_balance + c.amount
+                    FROM (
+                        SELECT user_id, SUM(pred_amount) AS pred_amount, SUM(amount) AS amount
+                        FROM completed
+                        GROUP BY user_id
+                    ) c
+                    WHERE u.id = c.user_id
+                    RETURNING u.id, u.telegram_id, u.pred_balance
+                )
+                SELECT c.id, c.user_id, c.amount, c.pred_amount, cr.telegram_id, cr.pred_balance
+                FROM completed c
+                JOIN credited cr ON cr.id = c.user_id
+            """),
+            {
+                "ids": [transaction_id for _, transaction_id in matches],
+                "hashes": [transfer["hash"] for transfer, _ in matches],
+                "senders": [transfer["sender"] for transfer, _ in matches],
+            }
+        )
+        credited = result.all()
+
+        movements = []
+        notifications = []
+        for row in credited:
+            reference = f"transaction:{row.id}"
+            movements.append(LedgerService.movement(
+                row.user_id, row.pred_amount, "PRED", "deposit", LedgerService.DEPOSITS, reference
+            ))
+            movements.append(LedgerService.movement(
+                row.user_id, row.amount, "TON", "deposit", LedgerService.DEPOSITS, reference
+            ))
+            notifications.append({
+                "telegram_id": row.telegram_id,
+                "user_id": row.user_id,
+                "message_text": (
+                    f"✅ <b>Депозит успешно зачислен!</b>\n\n"
+                    f"💎 TON: <b>+{row.amount}</b>\n"
+                    f"🪙 PRED: <b>+{int(row.pred_amount)}</b>\n\n"
+                    f"Новый баланс: <b>{row.pred_balance}</b> PRED"
+                ),
+                "notification_type": NotificationType.SYSTEM,
+                "metadata": {"transaction_id": row.id},
+            })
+
+        await LedgerService.post(db, movements)
+        await TelegramQueueService.add_notifications(db, notifications)
+        return len(credited)
+
+    @staticmethod
+    async def poll(
+        db: AsyncSession,
+        ton: Optional[TONService] = None,
+        max_pages: int = MAX_PAGES
+    ) -> Dict[str, int]:
+        """
+        Прочитать новые входящие транзакции кошелька и зачислить депозиты
+
+        Args:
+            db: Database session
+            ton: Клиент TonAPI (по умолчанию общий экземпляр)
+            max_pages: Максимум страниц за запуск
+
+        Returns:
+            Количество прочитанных транзакций и зачисленных депозитов
+        """
+        address = settings.TON_DEPOSIT_ADDRESS
+        if not address:
+            return {"scanned": 0, "credited": 0}
+
+        ton = ton or get_ton_service()
+        last_lt = await DepositWatcherService._get_cursor(db, address, ton)
+        scanned = 0
+        credited_total = 0
+
+        for _ in range(max_pages):
+            page = await ton.get_account_transactions(
+                address, after_lt=last_lt, limit=DepositWatcherService.PAGE_SIZE
+            )
+            page = [tx for tx in page if int(tx.get("lt") or 0) > last_lt]
+            if not page:
+                break
+
+            transfers = [t for t in map(DepositWatcherService.parse_incoming, page) if t]
+            page_lt = max(int(tx["lt"]) for tx in page)
+
+            try:
+                matches = await DepositWatcherService._match(db, address, transfers) if transfers else []
+                credited = await DepositWatcherService.credit(db, matches)
+                await db.execute(
+                    text("""
+                        UPDATE ton_wallet_cursors
+                        SET last_lt = :last_lt, updated_at = now()
+                        WHERE address = :address
+                    """),
+                    {"address": address, "last_lt": page_lt}
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+            scanned += len(page)
+            credited_total += credited
+            last_lt = page_lt
+
+            if credited:
+                logger.info(f"💎 Зачислено {credited} TON депозитов (lt до {page_lt})")
+            if len(page) < DepositWatcherService.PAGE_SIZE:
+                break
+
+        return {"scanned": scanned, "credited": credited_total}
@@ -2,17 +2,22 @@
 Leaderboard Period Service - Управление периодами и расчет наград
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, case, desc
+from sqlalchemy import select, update, insert, and_, or_, func, case, desc, literal
+from app.core.redis import get_redis
 from app.models.leaderboard_period import LeaderboardPeriod, PeriodType, PeriodStatus
 from app.models.leaderboard_reward import LeaderboardReward, RewardPeriod
+from app.models.leaderboard_snapshot import LeaderboardSnapshot
 from app.models.user import User
-from app.models.bet import Bet, BetStatus
-from app.models.telegram_notification import NotificationType
-from app.services.telegram_queue_service import TelegramQueueService
+from app.models.user_stats import UserStats
+from app.services.user_stats_service import UserStatsService
+from app.services.ledger_service import LedgerService
+from app.models.bet import Bet
+from app.models.telegram_notification import TelegramNotification, NotificationType, NotificationStatus
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from typing import List, Dict, Optional, Tuple
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +25,102 @@ logger = logging.getLogger(__name__)
 class LeaderboardService:
     """Сервис для работы с периодами лидерборда"""
 
+    # Кэш границ текущего периода в Redis (сбрасывается при закрытии периода)
+    PERIOD_START_CACHE_KEY = "leaderboard:period_start:{period_type}"
+    PERIOD_START_CACHE_TTL = 3600  # секунд
+
+    @staticmethod
+    def _compute_period_start(
+        period_type: str,
+        last_period: Optional[LeaderboardPeriod],
+        now: datetime
+    ) -> datetime:
+        """Вычислить начало текущего периода по последнему закрытому"""
+        if period_type == "week":
+            # НЕДЕЛИ ВСЕГДА: Понедельник 00:00 - Воскресенье 23:59
+            if last_period:
+                # Следующий понедельник после закрытия предыдущего периода
+                days_until_monday = (7 - last_period.end_date.weekday()) % 7
+                if days_until_monday == 0:
+                    days_until_monday = 7  # Если закрыли в воскресенье, берем следующий понедельник
+                start_date = last_period.end_date + timedelta(days=days_until_monday)
+            else:
+                # Начало текущей недели (понедельник)
+                start_date = now - timedelta(days=now.weekday())
+            return start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # МЕСЯЦЫ ВСЕГДА: 1-е число 00:00 - Последнее число 23:59
+        if last_period:
+            # 1-е число следующего месяца после закрытия предыдущего
+            if last_period.end_date.month == 12:
+                # Если декабрь, переходим на январь следующего года
+                return last_period.end_date.replace(year=last_period.end_date.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            # Иначе просто следующий месяц
+            return last_period.end_date.replace(month=last_period.end_date.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        # Начало текущего месяца
+        return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    async def get_current_period_start(
+        db: AsyncSession,
+        period_type: str,  # "week" or "month"
+        use_cache: bool = True
+    ) -> datetime:
+        """
+        Получить начало текущего (незакрытого) периода
+
+        Граница меняется только при закрытии периода, поэтому кэшируется
+        в Redis и не требует запроса к leaderboard_periods на каждый запрос.
+        """
+        cache_key = LeaderboardService.PERIOD_START_CACHE_KEY.format(period_type=period_type)
+
+        if use_cache:
+            try:
+                redis = await get_redis()
+                cached = await redis.get(cache_key)
+                if cached:
+                    return datetime.fromisoformat(cached)
+            except Exception as e:
+                logger.warning(f"⚠️ Redis недоступен для границ периода: {e}")
+
+        db_period_type = PeriodType.WEEK if period_type == "week" else PeriodType.MONTH
+
+        # Находим последний закрытый период этого типа
+        last_period_result = await db.execute(
+            select(LeaderboardPeriod).where(
+                and_(
+                    LeaderboardPeriod.period_type == db_period_type,
+                    LeaderboardPeriod.status == PeriodStatus.CLOSED
+                )
+            ).order_by(desc(LeaderboardPeriod.closed_at)).limit(1)
+        )
+        last_period = last_period_result.scalar_one_or_none()
+
+        start_date = LeaderboardService._compute_period_start(
+            period_type=period_type,
+            last_period=last_period,
+            now=datetime.now(timezone.utc)
+        )
+
+        if use_cache:
+            try:
+                redis = await get_redis()
+                await redis.set(cache_key, start_date.isoformat(), ex=LeaderboardService.PERIOD_START_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось закэшировать границы периода: {e}")
+
+        return start_date
+
+    @staticmethod
+    async def _invalidate_period_start(period_type: str) -> None:
+        """Сбросить кэш начала периода после закрытия"""
+        try:
+            redis = await get_redis()
+            await redis.delete(LeaderboardService.PERIOD_START_CACHE_KEY.format(period_type=period_type))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сбросить кэш границ периода: {e}")
+
     @staticmethod
     async def close_period_and_calculate_rewards(
         db: AsyncSession,
@@ -49,174 +150,189 @@ class LeaderboardService:
             reward_period = RewardPeriod.MONTH
             db_period_type = PeriodType.MONTH
 
-        # Находим последний закрытый период этого типа
-        last_period_query = select(LeaderboardPeriod).where(
-            and_(
-                LeaderboardPeriod.period_type == db_period_type,
-                LeaderboardPeriod.status == PeriodStatus.CLOSED
-            )
-        ).order_by(desc(LeaderboardPeriod.closed_at)).limit(1)
-
-        last_period_result = await db.execute(last_period_query)
-        last_period = last_period_result.scalar_one_or_none()
-
-        if period_type == "week":
-            # НЕДЕЛИ ВСЕГДА: Понедельник 00:00 - Воскресенье 23:59
-            if last_period:
-                # Следующий понедельник после закрытия предыдущего периода
-                days_until_monday = (7 - last_period.end_date.weekday()) % 7
-                if days_until_monday == 0:
-                    days_until_monday = 7  # Если закрыли в воскресенье, берем следующий понедельник
-                start_date = last_period.end_date + timedelta(days=days_until_monday)
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                logger.info(f"📅 Следующий недельный период начинается с понедельника: {start_date}")
-            else:
-                # Начало текущей недели (понедельник)
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                logger.info(f"📅 Первый период недели, начало с понедельника: {start_date}")
-        else:
-            # МЕСЯЦЫ ВСЕГДА: 1-е число 00:00 - Последнее число 23:59
-            if last_period:
-                # 1-е число следующего месяца после закрытия предыдущего
-                if last_period.end_date.month == 12:
-                    # Если декабрь, переходим на январь следующего года
-                    start_date = last_period.end_date.replace(year=last_period.end_date.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                else:
-                    # Иначе просто следующий месяц
-                    start_date = last_period.end_date.replace(month=last_period.end_date.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                logger.info(f"📅 Следующий месячный период начинается с 1-го числа: {start_date}")
-            else:
-                # Начало текущего месяца
-                start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                logger.info(f"📅 Первый период месяца, начало с 1-го числа: {start_date}")
+        start_date = await LeaderboardService.get_current_period_start(
+            db=db,
+            period_type=period_type,
+            use_cache=False
+        )
+        logger.info(f"📅 Закрываемый период {period_type} начался: {start_date}")
 
         end_date = now
 
-        # 2. Получаем rewards configuration
-        rewards_query = select(LeaderboardReward).where(
-            and_(
-                LeaderboardReward.period == reward_period,
-                LeaderboardReward.is_active == True
+        # 2. Проверяем что награды настроены
+        rewards_count = await db.scalar(
+            select(func.count(LeaderboardReward.id)).where(
+                and_(
+                    LeaderboardReward.period == reward_period,
+                    LeaderboardReward.is_active == True
+                )
             )
-        ).order_by(LeaderboardReward.rank_from)
-
-        result = await db.execute(rewards_query)
-        rewards = result.scalars().all()
+        )
 
-        if not rewards:
+        if not rewards_count:
             logger.warning(f"⚠️ Нет настроенных наград для {period_type}")
             return {
                 "success": False,
                 "error": f"No rewards configured for {period_type}"
             }
 
-        # 3. Рассчитываем leaderboard за период
-        profit_subquery = (
-            select(
-                Bet.user_id,
-                func.sum(
-                    case(
-                        (Bet.status == BetStatus.WON, Bet.payout - Bet.amount),
-                        (Bet.status == BetStatus.LOST, -Bet.amount),
-                        else_=Decimal("0.00")
-                    )
-                ).label("profit"),
-                func.count().label("bets_count")
+        try:
+            # Сериализуем закрытия одного типа периода (админ + scheduler одновременно).
+            # Второй вызов дождется коммита первого и увидит уже закрытый период.
+            await db.execute(
+                select(func.pg_advisory_xact_lock(func.hashtext(f"leaderboard_close_{period_type}")))
             )
-            .where(and_(
-                Bet.created_at >= start_date,
-                Bet.created_at <= end_date
-            ))
-            .group_by(Bet.user_id)
-            .subquery()
-        )
 
-        query = (
-            select(
-                User,
-                func.coalesce(profit_subquery.c.profit, Decimal("0.00")).label("profit"),
-                func.coalesce(profit_subquery.c.bets_count, 0).label("period_bets")
-            )
-            .outerjoin(profit_subquery, User.id == profit_subquery.c.user_id)
-            .where(profit_subquery.c.bets_count > 0)
-            .order_by(desc("profit"))
-            .order_by(desc(User.total_wins))
-        )
-
-        result = await db.execute(query)
-        leaderboard = result.all()
-
-        if not leaderboard:
-            logger.warning(f"⚠️ Нет участников в лидерборде за {period_type}")
-            return {
-                "success": False,
-                "error": "No participants in leaderboard"
-            }
-
-        # 4. Начисляем награды и создаем уведомления
-        total_rewards = 0
-        total_ton_rewards = 0
-        total_pred_rewards = 0
-        winners_count = 0
-        participants_count = len(leaderboard)
-
-        for rank, (user, profit, period_bets) in enumerate(leaderboard, start=1):
-            # Находим награду для этого rank
-            reward_info = LeaderboardService._find_reward_for_rank(rank, rewards)
-
-            if reward_info:
-                reward_amount, currency = reward_info
-
-                if reward_amount > 0:
-                    # Начисляем награду на правильный баланс
-                    if currency == "TON":
-                        user.ton_balance += reward_amount
-                        total_ton_rewards += reward_amount
-                    else:  # PRED
-                        user.pred_balance += reward_amount
-                        total_pred_rewards += reward_amount
-
-                    total_rewards += reward_amount
-                    winners_count += 1
-
-                    # Создаем уведомление
-                    message = LeaderboardService._format_reward_notification(
-                        rank=rank,
-                        reward_amount=reward_amount,
-                        currency=currency,
-                        profit=profit,
-                        period_type=period_type
+            already_closed = await db.scalar(
+                select(func.count(LeaderboardPeriod.id)).where(
+                    and_(
+                        LeaderboardPeriod.period_type == db_period_type,
+                        LeaderboardPeriod.status == PeriodStatus.CLOSED,
+                        LeaderboardPeriod.start_date == start_date
                     )
-
-                    await TelegramQueueService.add_notification(
-                        db=db,
-                        telegram_id=user.telegram_id,
-                        user_id=user.id,
-                        message_text=message,
-                        notification_type=NotificationType.LEADERBOARD_REWARD,
-                        parse_mode="HTML"
+                )
+            )
+            if already_closed:
+                await db.rollback()
+                logger.warning(f"⚠️ Период {period_type} с {start_date} уже закрыт")
+                return {
+                    "success": False,
+                    "error": "Period already closed"
+                }
+
+            # 3. Итоговая таблица периода из user_stats: те же участники, профит
+            # и порядок, что и у живого лидерборда (_ranked_subquery)
+            ranked, _ = await LeaderboardService._ranked_subquery(db, period_type, start_date)
+
+            participants_count = await db.scalar(
+                select(func.count()).select_from(ranked)
+            ) or 0
+
+            if not participants_count:
+                await db.rollback()
+                logger.warning(f"⚠️ Нет участников в лидерборде за {period_type}")
+                return {
+                    "success": False,
+                    "error": "No participants in leaderboard"
+                }
+
+            period = LeaderboardPeriod(
+                period_type=db_period_type,
+                start_date=start_date,
+                end_date=end_date,
+                status=PeriodStatus.CLOSED,
+                participants_count=participants_count,
+                closed_at=now,
+                closed_by_admin_id=admin_id
+            )
+            db.add(period)
+            await db.flush()
+
+            # 4. Замораживаем итоговую таблицу периода в leaderboard_snapshot.
+            # Range join рангов на тиры наград; при пересечении тиров берем тир
+            # с меньшим rank_from (как раньше _find_reward_for_rank)
+            tiered = (
+                select(
+                    literal(period.id).label("period_id"),
+                    ranked.c.rank,
+                    ranked.c.user_id,
+                    ranked.c.profit,
+                    ranked.c.bets_count,
+                    LeaderboardReward.reward_amount,
+                    LeaderboardReward.currency
+                )
+                .distinct(ranked.c.rank)
+                .outerjoin(
+                    LeaderboardReward,
+                    and_(
+                        ranked.c.rank.between(LeaderboardReward.rank_from, LeaderboardReward.rank_to),
+                        LeaderboardReward.period == reward_period,
+                        LeaderboardReward.is_active == True,
+                        LeaderboardReward.reward_amount > 0
                     )
+                )
+                .order_by(ranked.c.rank, LeaderboardReward.rank_from)
+            )
 
-                    logger.info(f"💰 Награда {reward_amount} {currency} для {user.username or user.first_name} (rank #{rank})")
-
-        # 5. Сохраняем период в историю
-        period = LeaderboardPeriod(
-            period_type=db_period_type,
-            start_date=start_date,
-            end_date=end_date,
-            status=PeriodStatus.CLOSED,
-            total_rewards_distributed=total_rewards,
-            total_ton_rewards=total_ton_rewards,
-            total_pred_rewards=total_pred_rewards,
-            participants_count=participants_count,
-            winners_count=winners_count,
-            closed_at=now,
-            closed_by_admin_id=admin_id
-        )
+            await db.execute(
+                insert(LeaderboardSnapshot).from_select(
+                    ["period_id", "rank", "user_id", "profit", "bets_count", "reward_amount", "reward_currency"],
+                    tiered
+                )
+            )
 
-        db.add(period)
-        await db.commit()
+            # 5. Начисляем награды одним UPDATE ... FROM по снапшоту
+            credit_result = await db.execute(
+                update(User)
+                .where(and_(
+                    User.id == LeaderboardSnapshot.user_id,
+                    LeaderboardSnapshot.period_id == period.id,
+                    LeaderboardSnapshot.reward_amount.isnot(None)
+                ))
+                .values(
+                    ton_balance=User.ton_balance + case(
+                        (LeaderboardSnapshot.reward_currency == "TON", LeaderboardSnapshot.reward_amount), else_=0
+                    ),
+                    pred_balance=User.pred_balance + case(
+                        (LeaderboardSnapshot.reward_currency == "TON", 0), else_=LeaderboardSnapshot.reward_amount
+                    )
+                )
+                .returning(
+                    User.id,
+                    User.telegram_id,
+                    LeaderboardSnapshot.rank,
+                    LeaderboardSnapshot.profit,
+                    LeaderboardSnapshot.reward_amount,
+                    LeaderboardSnapshot.reward_currency.label("currency")
+                )
+                .execution_options(synchronize_session=False)
+            )
+            credited = sorted(credit_result.all(), key=lambda row: row.rank)
+            await LedgerService.post_leaderboard_rewards(db, period.id)
+
+            total_ton_rewards = sum(row.reward_amount for row in credited if row.currency == "TON")
+            total_pred_rewards = sum(row.reward_amount for row in credited if row.currency != "TON")
+            total_rewards = total_ton_rewards + total_pred_rewards
+            winners_count = len(credited)
+
+            # 6. Уведомления одной multi-row вставкой в той же транзакции
+            if credited:
+                await db.execute(
+                    insert(TelegramNotification).values([
+                        {
+                            "telegram_id": row.telegram_id,
+                            "user_id": row.id,
+                            "message_text": LeaderboardService._format_reward_notification(
+                                rank=row.rank,
+                                reward_amount=row.reward_amount,
+                                currency=row.currency,
+                                profit=row.profit,
+                                period_type=period_type
+                            ),
+                            "parse_mode": "HTML",
+                            "notification_type": NotificationType.LEADERBOARD_REWARD,
+                            "status": NotificationStatus.PENDING,
+                            "attempts": 0,
+                            "max_attempts": 5,
+                            "created_at": now
+                        }
+                        for row in credited
+                    ])
+                )
+
+            # 7. Итоги периода
+            period.total_rewards_distributed = total_rewards
+            period.total_ton_rewards = total_ton_rewards
+            period.total_pred_rewards = total_pred_rewards
+            period.winners_count = winners_count
+
+            await db.commit()
+        except Exception:
+            # Все или ничего: начисления, уведомления и период откатываются вместе
+            await db.rollback()
+            raise
+
+        await LeaderboardService._invalidate_period_start(period_type)
 
         logger.info(f"✅ Период {period_type} закрыт. Награды: {total_ton_rewards} TON + {total_pred_rewards} PRED для {winners_count} пользователей")
 
@@ -299,6 +415,289 @@ class LeaderboardService:
         result = await db.execute(query)
         return list(result.scalars().all())
 
+    @staticmethod
+    async def get_period_snapshot(
+        db: AsyncSession,
+        period_id: int,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Tuple[LeaderboardSnapshot, User]]:
+        """
+        Получить замороженную таблицу закрытого периода
+
+        Одно чтение диапазона по индексу (period_id, rank).
+        """
+        result = await db.execute(
+            select(LeaderboardSnapshot, User)
+            .join(User, User.id == LeaderboardSnapshot.user_id)
+            .where(and_(
+                LeaderboardSnapshot.period_id == period_id,
+                LeaderboardSnapshot.rank > offset,
+                LeaderboardSnapshot.rank <= offset + limit
+            ))
+            .order_by(LeaderboardSnapshot.rank)
+        )
+        return list(result.all())
+
+    # Индекс рангов текущего периода: Redis ZSET (score = место) + HASH профитов.
+    # Строится scheduler'ом (rebuild_rank_index) раз в минуту, живет дольше интервала
+    RANK_INDEX_KEY = "leaderboard:rank:{period_type}:{start}"
+    RANK_INDEX_TTL = 180  # секунд
+    RANK_INDEX_CHUNK = 1000
+
+    @staticmethod
+    async def _ranked_subquery(db: AsyncSession, period_type: str, start_date: Optional[datetime] = None):
+        """
+        Участники периода с местом (row_number)
+
+        Те же участники и тот же порядок, что и в GET /leaderboard/:
+        профит по убыванию, затем total_wins по убыванию, затем id.
+        По умолчанию берется текущий период.
+        """
+        if start_date is None:
+            start_date = await LeaderboardService.get_current_period_start(db=db, period_type=period_type)
+        period_key = UserStatsService.period_key(period_type, start_date)
+        profit = func.coalesce(UserStats.realized_profit, Decimal("0.00"))
+
+        return (
+            select(
+                User.id.label("user_id"),
+                profit.label("profit"),
+                func.coalesce(UserStats.bets_count, 0).label("bets_count"),
+                func.row_number().over(order_by=(desc(profit), desc(User.total_wins), User.id)).label("rank")
+            )
+            .outerjoin(UserStats, and_(UserStats.user_id == User.id, UserStats.period_key == period_key))
+            .where(User.total_bets > 0)
+            .subquery()
+        ), start_date
+
+    @staticmethod
+    async def _rank_index_key(db: AsyncSession, period_type: str, start_date: Optional[datetime] = None) -> str:
+        if start_date is None:
+            start_date = await LeaderboardService.get_current_period_start(db=db, period_type=period_type)
+        return LeaderboardService.RANK_INDEX_KEY.format(
+            period_type=period_type,
+            start=int(start_date.timestamp())
+        )
+
+    @staticmethod
+    async def rebuild_rank_index(db: AsyncSession, period_type: str) -> int:
+        """
+        Перестроить индекс рангов текущего периода (scheduler)
+
+        Места считаются одним запросом (row_number в SQL) и читаются потоком
+        пачками по RANK_INDEX_CHUNK: ZSET {key} со score = место и HASH
+        {key}:profit собираются во временных ключах и атомарно подменяются,
+        так что читатели никогда не видят наполовину построенный индекс.
+
+        Returns:
+            Количество участников в индексе
+        """
+        ranked, start_date = await LeaderboardService._ranked_subquery(db, period_type)
+        key = await LeaderboardService._rank_index_key(db, period_type, start_date)
+        build_key = f"{key}:build:{uuid.uuid4().hex}"
+
+        redis = await get_redis()
+        total = 0
+        try:
+            stream = await db.stream(select(ranked.c.user_id, ranked.c.profit, ranked.c.rank))
+            async for chunk in stream.partitions(LeaderboardService.RANK_INDEX_CHUNK):
+                pipe = redis.pipeline(transaction=False)
+                pipe.zadd(build_key, {str(row.user_id): row.rank for row in chunk})
+                pipe.hset(f"{build_key}:profit", mapping={str(row.user_id): str(row.profit) for row in chunk})
+                pipe.expire(build_key, LeaderboardService.RANK_INDEX_TTL)
+                pipe.expire(f"{build_key}:profit", LeaderboardService.RANK_INDEX_TTL)
+                await pipe.execute()
+                total += len(chunk)
+            await db.rollback()
+
+            if not total:
+                # Пустой период: индекс без участников
+                await redis.delete(key, f"{key}:profit")
+                return 0
+
+            pipe = redis.pipeline(transaction=True)
+            pipe.rename(f"{build_key}:profit", f"{key}:profit")
+            pipe.rename(build_key, key)
+            await pipe.execute()
+        except Exception:
+            await redis.delete(build_key, f"{build_key}:profit")
+            raise
+
+        return total
+
+    @staticmethod
+    async def _get_rank_index(db: AsyncSession, period_type: str) -> Tuple[object, str]:
+        """
+        Получить (redis, key) индекса рангов текущего периода
+
+        Запросы индекс не строят: если его еще нет (или Redis недоступен),
+        бросается исключение и вызывающие методы переходят на SQL.
+        Место и соседи читаются через ZRANK/ZRANGE за O(log N).
+        """
+        key = await LeaderboardService._rank_index_key(db, period_type)
+        redis = await get_redis()
+        if not await redis.exists(key):
+            raise LookupError(f"индекс рангов {key} еще не построен")
+        return redis, key
+
+    @staticmethod
+    async def _ranks_from_sql(db: AsyncSession, period_type: str, where) -> List[Tuple[int, int, Decimal]]:
+        """[(rank, user_id, profit), ...] напрямую из SQL (индекс рангов недоступен)"""
+        ranked, _ = await LeaderboardService._ranked_subquery(db, period_type)
+        result = await db.execute(
+            select(ranked.c.rank, ranked.c.user_id, ranked.c.profit)
+            .where(where(ranked))
+            .order_by(ranked.c.rank)
+        )
+        return [(rank, user_id, Decimal(profit)) for rank, user_id, profit in result.all()]
+
+    @staticmethod
+    async def _total_players_from_sql(db: AsyncSession) -> int:
+        return await db.scalar(select(func.count(User.id)).where(User.total_bets > 0)) or 0
+
+    @staticmethod
+    async def get_user_rank(db: AsyncSession, user_id: int, period_type: str) -> Dict:
+        """Получить ранг пользователя в текущем периоде"""
+        try:
+            redis, key = await LeaderboardService._get_rank_index(db, period_type)
+
+            pipe = redis.pipeline(transaction=False)
+            pipe.zrank(key, str(user_id))
+            pipe.hget(f"{key}:profit", str(user_id))
+            pipe.zcard(key)
+            rank, profit, total_players = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Индекс рангов недоступен, ранг из SQL: {e}")
+            entries = await LeaderboardService._ranks_from_sql(
+                db, period_type, lambda ranked: ranked.c.user_id == user_id
+            )
+            rank = entries[0][0] - 1 if entries else None
+            profit = entries[0][2] if entries else None
+            total_players = await LeaderboardService._total_players_from_sql(db)
+
+        return {
+            "user_id": user_id,
+            "rank": rank + 1 if rank is not None else None,
+            "total_players": total_players or 0,
+            "profit": Decimal(profit) if profit is not None else Decimal("0.00")
+        }
+
+    @staticmethod
+    async def get_rank_window(
+        db: AsyncSession,
+        user_id: int,
+        period_type: str,
+        neighbours: int = 5
+    ) -> Dict:
+        """
+        Получить ранг пользователя и по N соседей выше и ниже
+
+        Returns:
+            rank, total_players и entries: [(rank, user_id, profit), ...]
+        """
+        try:
+            redis, key = await LeaderboardService._get_rank_index(db, period_type)
+
+            pipe = redis.pipeline(transaction=False)
+            pipe.zrank(key, str(user_id))
+            pipe.zcard(key)
+            rank, total_players = await pipe.execute()
+
+            if rank is None:
+                return {"rank": None, "total_players": total_players or 0, "entries": []}
+
+            first = max(rank - neighbours, 0)
+            members = await redis.zrange(key, first, rank + neighbours)
+            profits = await redis.hmget(f"{key}:profit", members) if members else []
+            entries = [
+                (first + i + 1, int(member), Decimal(profit or "0.00"))
+                for i, (member, profit) in enumerate(zip(members, profits))
+            ]
+        except Exception as e:
+            logger.warning(f"⚠️ Индекс рангов недоступен, соседи из SQL: {e}")
+            own = await LeaderboardService._ranks_from_sql(
+                db, period_type, lambda ranked: ranked.c.user_id == user_id
+            )
+            total_players = await LeaderboardService._total_players_from_sql(db)
+            if not own:
+                return {"rank": None, "total_players": total_players, "entries": []}
+
+            rank = own[0][0] - 1
+            entries = await LeaderboardService._ranks_from_sql(
+                db, period_type,
+                lambda ranked: ranked.c.rank.between(rank + 1 - neighbours, rank + 1 + neighbours)
+            )
+
+        return {
+            "rank": rank + 1,
+            "total_players": total_players,
+            "entries": entries
+        }
+
+    @staticmethod
+    async def get_referral_circle_ranks(
+        db: AsyncSession,
+        user_id: int,
+        period_type: str,
+        limit: int = 100
+    ) -> List[Tuple[int, int, Decimal]]:
+        """
+        Лидерборд реферального круга пользователя
+
+        Круг: сам пользователь, его реферер, другие приглашенные тем же
+        реферером и собственные рефералы (индекс ix_users_referrer_id).
+
+        Returns:
+            [(глобальный rank, user_id, profit), ...] по убыванию профита
+        """
+        referrer_id = await db.scalar(select(User.referrer_id).where(User.id == user_id))
+
+        circle_filter = [User.id == user_id, User.referrer_id == user_id]
+        if referrer_id:
+            circle_filter += [User.id == referrer_id, User.referrer_id == referrer_id]
+
+        # Круг упорядочивается так же, как глобальный рейтинг, и только потом
+        # обрезается до limit, чтобы не потерять лучших участников
+        start_date = await LeaderboardService.get_current_period_start(db=db, period_type=period_type)
+        period_key = UserStatsService.period_key(period_type, start_date)
+        profit = func.coalesce(UserStats.realized_profit, Decimal("0.00"))
+        result = await db.execute(
+            select(User.id)
+            .outerjoin(UserStats, and_(UserStats.user_id == User.id, UserStats.period_key == period_key))
+            .where(and_(or_(*circle_filter), User.total_bets > 0))
+            .order_by(desc(profit), desc(User.total_wins), User.id)
+            .limit(limit)
+        )
+        circle_ids = list(result.scalars().all())
+
+        if not circle_ids:
+            return []
+
+        try:
+            redis, key = await LeaderboardService._get_rank_index(db, period_type)
+
+            members = [str(uid) for uid in circle_ids]
+            pipe = redis.pipeline(transaction=False)
+            for member in members:
+                pipe.zrank(key, member)
+            pipe.hmget(f"{key}:profit", members)
+            values = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Индекс рангов недоступен, круг из SQL: {e}")
+            return await LeaderboardService._ranks_from_sql(
+                db, period_type, lambda ranked: ranked.c.user_id.in_(circle_ids)
+            )
+
+        ranks, profits = values[:-1], values[-1]
+        entries = []
+        for member, rank, profit in zip(members, ranks, profits):
+            if rank is None:
+                continue
+            entries.append((rank + 1, int(member), Decimal(profit or "0.00")))
+
+        return sorted(entries)
+
     @staticmethod
     async def get_current_period_stats(
         db: AsyncSession,
@@ -306,11 +705,7 @@ class LeaderboardService:
     ) -> Dict:
         """Получить статистику текущего периода"""
         now = datetime.now(timezone.utc)
-
-        if period_type == "week":
-            start_date = now - timedelta(days=7)
-        else:
-            start_date = now - timedelta(days=30)
+        start_date = await LeaderboardService.get_current_period_start(db=db, period_type=period_type)
 
         # Считаем количество участников (пользователи со ставками)
         participants_count = await db.scalar(
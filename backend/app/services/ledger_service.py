@@ -0,0 +1,277 @@
+"""
+Ledger Service - Журнал движений балансов (append-only, double-entry)
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, text, insert
+from app.models.ledger import LedgerEntry, BalanceSnapshot
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+import enum
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerService:
+    """
+    Проводки по балансам пользователей
+
+    Каждое движение записывается двумя проводками (пользователь и системный
+    контрсчет) с общим txn_id. Запись идет в транзакции вызывающего кода,
+    рядом с обновлением users.*_balance - без отдельного commit.
+    """
+
+    USER_ACCOUNT = "user"
+
+    # Системные контрсчета
+    SIGNUP = "system:signup_bonus"
+    REFERRALS = "system:referrals"
+    BETS = "system:bets"
+    DEPOSITS = "system:deposits"
+    WITHDRAWALS = "system:withdrawals"
+    EXCHANGE = "system:exchange"
+    MISSIONS = "system:missions"
+    PROMOTIONS = "system:promotions"
+    LEADERBOARD = "system:leaderboard"
+    ADJUSTMENTS = "system:adjustments"
+
+    # Advisory lock журнала: писатели берут его shared до конца транзакции,
+    # снимок - exclusive, чтобы граница не обогнала незакоммиченные проводки
+    WRITE_LOCK = "ledger_entries"
+    # Свертка снимков выполняется одним процессом за раз
+    SNAPSHOT_LOCK = "balance_snapshots"
+    SNAPSHOT_LOCK_TIMEOUT = "5s"
+
+    @staticmethod
+    def movement(
+        user_id: int,
+        amount: Decimal,
+        currency,
+        entry_type: str,
+        counter_account: str,
+        reference: Optional[str] = None
+    ) -> Dict:
+        """
+        Описать движение по балансу пользователя
+
+        Args:
+            user_id: ID пользователя
+            amount: Сумма со знаком (+ зачисление, - списание)
+            currency: PRED или TON (строка или enum)
+            entry_type: Тип операции (bet, payout, refund, deposit, ...)
+            counter_account: Системный контрсчет (LedgerService.BETS, ...)
+            reference: Ссылка на объект (bet:1, market:2, ...)
+        """
+        return {
+            "user_id": user_id,
+            "amount": Decimal(str(amount)),
+            "currency": currency.value if isinstance(currency, enum.Enum) else str(currency),
+            "entry_type": entry_type,
+            "counter_account": counter_account,
+            "reference": reference,
+        }
+
+    @staticmethod
+    async def lock_for_write(db: AsyncSession) -> None:
+        """Shared lock журнала до конца транзакции (перед любым INSERT в ledger_entries)"""
+        await db.execute(select(func.pg_advisory_xact_lock_shared(func.hashtext(LedgerService.WRITE_LOCK))))
+
+    @staticmethod
+    async def post(db: AsyncSession, movements: Iterable[Dict]) -> int:
+        """
+        Записать движения одним INSERT (без commit)
+
+        Returns:
+            Количество записанных проводок
+        """
+        rows: List[Dict] = []
+        for move in movements:
+            if not move["amount"]:
+                continue
+            txn_id = str(uuid.uuid4())
+            common = {
+                "txn_id": txn_id,
+                "currency": move["currency"],
+                "entry_type": move["entry_type"],
+                "reference": move["reference"],
+            }
+            rows.append({**common, "account": LedgerService.USER_ACCOUNT,
+                         "user_id": move["user_id"], "amount": move["amount"]})
+            rows.append({**common, "account": move["counter_account"],
+                         "user_id": None, "amount": -move["amount"]})
+
+        if rows:
+            await LedgerService.lock_for_write(db)
+            await db.execute(insert(LedgerEntry), rows)
+        return len(rows)
+
+    @staticmethod
+    async def record(
+        db: AsyncSession,
+        user_id: int,
+        amount: Decimal,
+        currency,
+        entry_type: str,
+        counter_account: str,
+        reference: Optional[str] = None
+    ) -> None:
+        """Записать одно движение (без commit)"""
+        await LedgerService.post(db, [LedgerService.movement(
+            user_id, amount, currency, entry_type, counter_account, reference
+        )])
+
+    @staticmethod
+    async def post_leaderboard_rewards(db: AsyncSession, period_id: int) -> int:
+        """
+        Записать награды закрытого периода из leaderboard_snapshot (INSERT ... SELECT, без commit)
+
+        Returns:
+            Количество записанных проводок
+        """
+        await LedgerService.lock_for_write(db)
+        result = await db.execute(
+            text("""
+                INSERT INTO ledger_entries (txn_id, account, user_id, currency, amount, entry_type, reference)
+                SELECT 'leaderboard-' || s.period_id || '-' || s.rank, leg.account, leg.user_id,
+                       CASE WHEN s.reward_currency = 'TON' THEN 'TON' ELSE 'PRED' END,
+                       leg.sign * s.reward_amount, 'leaderboard_reward', 'leaderboard_period:' || s.period_id
+                FROM leaderboard_snapshot s
+                CROSS JOIN LATERAL (VALUES
+                    (:user_account, s.user_id, 1),
+                    (:counter_account, NULL::bigint, -1)
+                ) AS leg(account, user_id, sign)
+                WHERE s.period_id = :period_id
+                  AND s.reward_amount IS NOT NULL
+                  AND s.reward_amount <> 0
+            """),
+            {
+                "period_id": period_id,
+                "user_account": LedgerService.USER_ACCOUNT,
+                "counter_account": LedgerService.LEADERBOARD,
+            }
+        )
+        return result.rowcount or 0
+
+    @staticmethod
+    async def get_balance(db: AsyncSession, user_id: int, currency: str) -> Decimal:
+        """Баланс по журналу: последний снимок + хвост проводок после него"""
+        snapshot = await db.scalar(
+            select(BalanceSnapshot).where(
+                BalanceSnapshot.user_id == user_id,
+                BalanceSnapshot.currency == currency
+            )
+        )
+        base = snapshot.balance if snapshot else Decimal("0")
+        last_entry_id = snapshot.last_entry_id if snapshot else 0
+
+        tail = await db.scalar(
+            select(func.coalesce(func.sum(LedgerEntry.amount), 0)).where(
+                LedgerEntry.user_id == user_id,
+                LedgerEntry.currency == currency,
+                LedgerEntry.account == LedgerService.USER_ACCOUNT,
+                LedgerEntry.id > last_entry_id
+            )
+        )
+        return base + Decimal(tail)
+
+    @staticmethod
+    async def snapshot_balances(db: AsyncSession) -> int:
+        """
+        Свернуть хвост журнала в balance_snapshots (set-based)
+
+        Граница хвоста - MAX(id) под exclusive advisory lock журнала: lock
+        дожидается всех транзакций, пишущих проводки, поэтому каждая проводка
+        с id не больше границы уже закоммичена или откачена. Lock отпускается
+        сразу, свертка идет отдельной транзакцией под своим advisory lock
+        (параллельные запуски, например на двух репликах, ждут друг друга и
+        читают уже обновленные снимки). Снимок сдвигается только вперед.
+
+        Returns:
+            Количество обновленных снимков
+        """
+        try:
+            await db.execute(text(f"SET LOCAL lock_timeout = '{LedgerService.SNAPSHOT_LOCK_TIMEOUT}'"))
+            await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(LedgerService.WRITE_LOCK))))
+            max_id = await db.scalar(select(func.coalesce(func.max(LedgerEntry.id), 0)))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"⚠️ Журнал занят, снимок балансов отложен: {e}")
+            return 0
+
+        try:
+            await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(LedgerService.SNAPSHOT_LOCK))))
+            result = await db.execute(text("""
+                WITH tail AS (
+                    SELECT e.user_id, e.currency, SUM(e.amount) AS delta, MAX(e.id) AS last_entry_id
+                    FROM ledger_entries e
+                    LEFT JOIN balance_snapshots s ON s.user_id = e.user_id AND s.currency = e.currency
+                    WHERE e.account = 'user'
+                      AND e.id > COALESCE(s.last_entry_id, 0)
+                      AND e.id <= :max_id
+                    GROUP BY e.user_id, e.currency
+                )
+                INSERT INTO balance_snapshots AS s (user_id, currency, balance, last_entry_id)
+                SELECT user_id, currency, delta, last_entry_id FROM tail
+                ON CONFLICT (user_id, currency) DO UPDATE SET
+                    balance = s.balance + EXCLUDED.balance,
+                    last_entry_id = EXCLUDED.last_entry_id,
+                    created_at = now()
+                WHERE s.last_entry_id < EXCLUDED.last_entry_id
+            """), {"max_id": max_id})
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return result.rowcount or 0
+
+    @staticmethod
+    async def audit(db: AsyncSession, max_reported: int = 50) -> Dict:
+        """
+        Сверить кэш балансов users с журналом
+
+        Читает суммы по журналу потоком (server-side cursor) и сравнивает
+        с users.pred_balance/ton_balance; отдельно ищет транзакции,
+        сумма проводок которых не равна нулю.
+
+        Returns:
+            Количество проверенных балансов, расхождений и несбалансированных транзакций
+        """
+        checked = 0
+        mismatches = 0
+
+        stream = await db.stream(text("""
+            SELECT u.id, c.currency, c.cached, COALESCE(j.balance, 0) AS derived
+            FROM users u
+            CROSS JOIN LATERAL (VALUES ('PRED', u.pred_balance), ('TON', u.ton_balance)) AS c(currency, cached)
+            LEFT JOIN (
+                SELECT user_id, currency, SUM(amount) AS balance
+                FROM ledger_entries
+                WHERE account = 'user'
+                GROUP BY user_id, currency
+            ) j ON j.user_id = u.id AND j.currency = c.currency
+            ORDER BY u.id
+        """))
+        async for user_id, currency, cached, derived in stream:
+            checked += 1
+            if cached != derived:
+                mismatches += 1
+                if mismatches <= max_reported:
+                    logger.error(
+                        f"❌ Ledger: баланс user {user_id} {currency} = {cached}, по журналу {derived}"
+                    )
+
+        unbalanced = await db.scalar(text("""
+            SELECT COUNT(*) FROM (
+                SELECT txn_id FROM ledger_entries GROUP BY txn_id HAVING SUM(amount) <> 0
+            ) t
+        """))
+        await db.rollback()
+
+        if unbalanced:
+            logger.error(f"❌ Ledger: {unbalanced} транзакций с ненулевой суммой проводок")
+        if not mismatches and not unbalanced:
+            logger.info(f"✅ Ledger: {checked} балансов совпадают с журналом")
+
+        return {"checked": checked, "mismatches": mismatches, "unbalanced_txns": unbalanced or 0}
@@ -0,0 +1,151 @@
+"""
+Market Lifecycle Service - Автоматическое закрытие рынков и истечение продвижения
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MarketLifecycleService:
+    """
+    Фоновые переходы статусов рынков
+
+    Задачи идут пакетами по partial индексам и берут строки через
+    FOR UPDATE SKIP LOCKED, поэтому их можно запускать на нескольких
+    репликах одновременно: каждая реплика закрывает свои рынки.
+    """
+
+    CLOSE_BATCH_SIZE = 200
+    PROMOTION_BATCH_SIZE = 500
+
+    @staticmethod
+    async def close_due_markets(db: AsyncSession, batch_size: int = CLOSE_BATCH_SIZE, max_batches: int = 10) -> Dict:
+        """
+        Закрыть открытые рынки, у которых наступил resolve_date
+
+        В той же транзакции, что и закрытие пакета, ставятся в очередь
+        уведомления MARKET_CLOSED участникам с незавершенными ставками.
+
+        Args:
+            db: Database session
+            batch_size: Рынков за один UPDATE
+            max_batches: Максимум пакетов за запуск
+
+        Returns:
+            Количество закрытых рынков и поставленных уведомлений
+        """
+        closed_total = 0
+        notified_total = 0
+
+        for _ in range(max_batches):
+            try:
+                result = await db.execute(
+                    text("""
+                        WITH due AS (
+                            SELECT id
+                            FROM markets
+                            WHERE status = 'OPEN'
+                              AND resolve_date <= now()
+                            ORDER BY resolve_date
+                            LIMIT :batch_size
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        UPDATE markets m
+                        SET status = 'CLOSED', updated_at = now()
+                        FROM due
+                        WHERE m.id = due.id
+                        RETURNING m.id
+                    """),
+                    {"batch_size": batch_size}
+                )
+                market_ids = [market_id for (market_id,) in result.all()]
+
+                if not market_ids:
+                    await db.rollback()
+                    break
+
+                # Одно уведомление на пользователя и рынок
+                notified = await db.execute(
+                    text("""
+                        INSERT INTO telegram_notifications_queue
+                            (telegram_id, user_id, message_text, parse_mode, notification_type,
+                             status, attempts, max_attempts, notification_metadata)
+                        SELECT u.telegram_id, u.id,
+                               '⏳ <b>Прием ставок закрыт</b>' || chr(10) || chr(10) ||
+                               replace(replace(replace(m.title, '&', '&amp;'), '<', '&lt;'), '>', '&gt;') ||
+                               chr(10) || chr(10) || 'Ожидайте результат события.',
+                               'HTML', 'MARKET_CLOSED', 'PENDING', 0, 5,
+                               json_build_object('market_id', m.id)::text
+                        FROM (
+                            SELECT DISTINCT market_id, user_id
+                            FROM bets
+                            WHERE market_id = ANY(:market_ids) AND status = 'PENDING'
+                        ) b
+                        JOIN markets m ON m.id = b.market_id
+                        JOIN users u ON u.id = b.user_id
+                        WHERE u.is_banned = false
+                    """),
+                    {"market_ids": market_ids}
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+            closed_total += len(market_ids)
+            notified_total += notified.rowcount or 0
+            logger.info(f"🔒 Закрыто {len(market_ids)} рынков по resolve_date")
+
+            if len(market_ids) < batch_size:
+                break
+
+        return {"closed": closed_total, "notified": notified_total}
+
+    @staticmethod
+    async def expire_promotions(db: AsyncSession, batch_size: int = PROMOTION_BATCH_SIZE, max_batches: int = 10) -> int:
+        """
+        Снять продвижение с рынков, у которых истек promoted_until
+
+        promotion_rank - генерируемая колонка, она обнуляется вместе с is_promoted.
+
+        Returns:
+            Количество рынков со снятым продвижением
+        """
+        expired_total = 0
+
+        for _ in range(max_batches):
+            try:
+                result = await db.execute(
+                    text("""
+                        WITH expired AS (
+                            SELECT id
+                            FROM markets
+                            WHERE is_promoted <> 'none'
+                              AND promoted_until IS NOT NULL
+                              AND promoted_until <= now()
+                            LIMIT :batch_size
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        UPDATE markets m
+                        SET is_promoted = 'none', updated_at = now()
+                        FROM expired
+                        WHERE m.id = expired.id
+                    """),
+                    {"batch_size": batch_size}
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+            expired = result.rowcount or 0
+            expired_total += expired
+            if expired < batch_size:
+                break
+
+        if expired_total:
+            logger.info(f"📉 Снято продвижение с {expired_total} рынков")
+        return expired_total
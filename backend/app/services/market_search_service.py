@@ -0,0 +1,161 @@
+"""
+Market Search Service - Полнотекстовый поиск рынков и фасеты по категориям
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, desc, or_
+from app.core.redis import get_redis
+from app.models.market import Market, MarketStatus, ModerationStatus
+from typing import Dict, List, Optional
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MarketSearchService:
+    """
+    Поиск по title/description через markets.search_vector (GIN)
+
+    search_vector содержит русскую и английскую морфологию, запрос
+    разбирается обеими конфигурациями и объединяется через OR.
+    Результаты популярных запросов и фасеты кэшируются в Redis.
+    """
+
+    FACETS_CACHE_KEY = "markets:facets:{status}"
+    FACETS_CACHE_TTL = 60  # секунд
+    SEARCH_CACHE_KEY = "markets:search:{digest}"
+    SEARCH_CACHE_TTL = 60  # секунд
+    UNCATEGORIZED = "other"
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Нормализация запроса для ключа кэша: регистр и пробелы"""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _ts_query(query: str):
+        return func.websearch_to_tsquery("russian", query).op("||")(
+            func.websearch_to_tsquery("english", query)
+        )
+
+    @staticmethod
+    def _base_filter(status: str):
+        conditions = [Market.moderation_status == ModerationStatus.APPROVED]
+        if status != "all":
+            conditions.append(Market.status == MarketStatus(status))
+        return conditions
+
+    @staticmethod
+    def category_filter(category: str):
+        """Условие по категории; фасет UNCATEGORIZED включает рынки без категории"""
+        if category == MarketSearchService.UNCATEGORIZED:
+            return or_(Market.category.is_(None), Market.category == category)
+        return Market.category == category
+
+    @staticmethod
+    async def _cache_get(key: str):
+        try:
+            redis = await get_redis()
+            cached = await redis.get(key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен для поиска рынков: {e}")
+            return None
+
+    @staticmethod
+    async def _cache_set(key: str, value, ttl: int) -> None:
+        try:
+            redis = await get_redis()
+            await redis.set(key, json.dumps(value, default=str), ex=ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось закэшировать результат поиска: {e}")
+
+    @staticmethod
+    async def get_category_facets(db: AsyncSession, status: str = "open") -> List[Dict]:
+        """
+        Количество рынков по категориям (кэшируемый агрегат)
+
+        Returns:
+            [{"category": ..., "count": ...}] по убыванию количества
+        """
+        key = MarketSearchService.FACETS_CACHE_KEY.format(status=status)
+        cached = await MarketSearchService._cache_get(key)
+        if cached is not None:
+            return cached
+
+        category = func.coalesce(Market.category, MarketSearchService.UNCATEGORIZED)
+        result = await db.execute(
+            select(category, func.count())
+            .where(*MarketSearchService._base_filter(status))
+            .group_by(category)
+            .order_by(desc(func.count()))
+        )
+        facets = [{"category": name, "count": count} for name, count in result.all()]
+
+        await MarketSearchService._cache_set(key, facets, MarketSearchService.FACETS_CACHE_TTL)
+        return facets
+
+    @staticmethod
+    async def search(
+        db: AsyncSession,
+        query: str,
+        category: Optional[str] = None,
+        status: str = "open",
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict:
+        """
+        Поиск рынков по тексту с фильтром по категории
+
+        Args:
+            db: Database session
+            query: Поисковая строка (синтаксис websearch: "фраза", -слово, or)
+            category: Фильтр по категории
+            status: Статус рынков (open, closed, resolved, all)
+            limit: Размер страницы
+            offset: Смещение
+
+        Returns:
+            ID найденных рынков по релевантности, фасеты по категориям для запроса
+        """
+        normalized = MarketSearchService.normalize_query(query)
+        digest = hashlib.sha1(
+            json.dumps([normalized, category, status, limit, offset]).encode()
+        ).hexdigest()
+        key = MarketSearchService.SEARCH_CACHE_KEY.format(digest=digest)
+
+        cached = await MarketSearchService._cache_get(key)
+        if cached is not None:
+            return cached
+
+        ts_query = MarketSearchService._ts_query(normalized)
+        matches = MarketSearchService._base_filter(status) + [Market.search_vector.op("@@")(ts_query)]
+
+        # Фасеты считаются по всему запросу без фильтра категории
+        category_column = func.coalesce(Market.category, MarketSearchService.UNCATEGORIZED)
+        facets_result = await db.execute(
+            select(category_column, func.count())
+            .where(*matches)
+            .group_by(category_column)
+            .order_by(desc(func.count()))
+        )
+        facets = [{"category": name, "count": count} for name, count in facets_result.all()]
+
+        if category:
+            matches.append(MarketSearchService.category_filter(category))
+
+        rank = func.ts_rank_cd(Market.search_vector, ts_query)
+        result = await db.execute(
+            select(Market.id)
+            .where(*matches)
+            .order_by(desc(rank), desc(Market.total_volume_pred), desc(Market.id))
+            .limit(limit)
+            .offset(offset)
+        )
+        market_ids = [market_id for (market_id,) in result.all()]
+        total = sum(f["count"] for f in facets if not category or f["category"] == category)
+
+        found = {"market_ids": market_ids, "total": total, "facets": facets}
+        await MarketSearchService._cache_set(key, found, MarketSearchService.SEARCH_CACHE_TTL)
+        return found
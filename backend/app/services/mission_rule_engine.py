@@ -0,0 +1,384 @@
+"""
+Mission Rule Engine - Компиляция требований миссий в SQL агрегаты
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from app.models.mission import Mission
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MissionRule(ABC):
+    """
+    Тип требования миссии
+
+    key - ключ в Mission.requirements. progress_sql возвращает SELECT
+    с колонками (user_id, progress); в нем должен быть маркер
+    {user_filter} внутри WHERE (фильтр по user_column для расчета
+    одного пользователя), параметры пишутся как :{p}name.
+    Правила без SQL (external=True) проверяются вне БД.
+    """
+
+    key: str = ""
+    external: bool = False
+    user_column: str = "b.user_id"
+
+    def target(self, value: Any) -> int:
+        return int(value)
+
+    @abstractmethod
+    def progress_sql(self, value: Any) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """SELECT (user_id, progress) и его параметры; None для external правил"""
+
+    def runtime_params(self, value: Any, now: datetime) -> Dict[str, Any]:
+        """Параметры, зависящие от момента вычисления (начало периода)"""
+        return {}
+
+
+class UserCounterRule(MissionRule):
+    """Счетчик из таблицы users"""
+
+    column: str = ""
+    user_column = "u.id"
+
+    def progress_sql(self, value: Any) -> Tuple[str, Dict[str, Any]]:
+        return f"""
+            SELECT u.id AS user_id, u.{self.column} AS progress
+            FROM users u
+            WHERE true {{user_filter}}
+        """, {}
+
+
+class BetsCountRule(UserCounterRule):
+    key = "bets_count"
+    column = "total_bets"
+
+
+class WinsCountRule(UserCounterRule):
+    key = "wins_count"
+    column = "total_wins"
+
+
+class WinStreakRule(UserCounterRule):
+    key = "win_streak"
+    column = "win_streak"
+
+
+class CategoryBetsRule(MissionRule):
+    """Ставки в категории, включая заархивированные рынки"""
+
+    key = "category_bets"
+
+    def target(self, value: Any) -> int:
+        return int(value["count"])
+
+    def progress_sql(self, value: Any) -> Tuple[str, Dict[str, Any]]:
+        return """
+            SELECT b.user_id, COUNT(*) AS progress
+            FROM (
+                SELECT b.user_id
+                FROM bets b
+                JOIN markets m ON m.id = b.market_id
+                WHERE m.category = :{p}category {user_filter}
+                UNION ALL
+                SELECT b.user_id
+                FROM archived_bets b
+                JOIN archived_markets m ON m.id = b.market_id
+                WHERE m.category = :{p}category {user_filter}
+            ) b
+            GROUP BY b.user_id
+        """, {"category": value["category"]}
+
+
+class ReferralsCountRule(MissionRule):
+    key = "referrals_count"
+    user_column = "u.referrer_id"
+
+    def progress_sql(self, value: Any) -> Tuple[str, Dict[str, Any]]:
+        return """
+            SELECT u.referrer_id AS user_id, COUNT(*) AS progress
+            FROM users u
+            WHERE u.referrer_id IS NOT NULL {user_filter}
+            GROUP BY u.referrer_id
+        """, {}
+
+
+class PeriodBetsRule(MissionRule):
+    """Ставки с начала текущего дня / недели (UTC)"""
+
+    period: str = "daily"
+
+    def progress_sql(self, value: Any) -> Tuple[str, Dict[str, Any]]:
+        return """
+            SELECT b.user_id, COUNT(*) AS progress
+            FROM bets b
+            WHERE b.created_at >= :{p}since {user_filter}
+            GROUP BY b.user_id
+        """, {}
+
+    def runtime_params(self, value: Any, now: datetime) -> Dict[str, Any]:
+        day_start = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.period == "weekly":
+            day_start -= timedelta(days=day_start.weekday())
+        return {"since": day_start}
+
+
+class DailyBetsRule(PeriodBetsRule):
+    key = "daily_bets"
+    period = "daily"
+
+
+class WeeklyBetsRule(PeriodBetsRule):
+    key = "weekly_bets"
+    period = "weekly"
+
+
+class SubscriptionRule(MissionRule):
+    """Подписка на канал - проверяется через Bot API (ChannelSubscriptionService)"""
+
+    key = "subscription"
+    external = True
+
+    def target(self, value: Any) -> int:
+        return 1
+
+    def progress_sql(self, value: Any) -> None:
+        return None
+
+
+class CompiledMission:
+    """Скомпилированная миссия: SQL прогресса с параметрами и цель"""
+
+    def __init__(self, mission: Mission, rule: MissionRule, value: Any):
+        self.mission_id = mission.id
+        self.mission_type = mission.type
+        self.updated_at = mission.updated_at
+        self.rule = rule
+        self.value = value
+        self.target = rule.target(value)
+        self.prefix = f"m{mission.id}_"
+
+        if rule.external:
+            self.sql = None
+            self.params = {}
+            return
+
+        sql, params = rule.progress_sql(value)
+        self.sql = sql.replace(":{p}", f":{self.prefix}")
+        self.params = {f"{self.prefix}{name}": v for name, v in params.items()}
+
+    def query(self, for_user: bool = False) -> str:
+        user_filter = f"AND {self.rule.user_column} = :user_id" if for_user else ""
+        return self.sql.replace("{user_filter}", user_filter)
+
+    def bind(self, now: datetime, period_key: str) -> Dict[str, Any]:
+        params = dict(self.params)
+        for name, v in self.rule.runtime_params(self.value, now).items():
+            params[f"{self.prefix}{name}"] = v
+        params[f"{self.prefix}mission_id"] = self.mission_id
+        params[f"{self.prefix}target"] = self.target
+        params[f"{self.prefix}period_key"] = period_key
+        return params
+
+
+class MissionRuleEngine:
+    """
+    Требования миссии -> SQL агрегат (user_id, progress)
+
+    Миссия компилируется один раз и кэшируется в процессе до изменения
+    updated_at. Прогресс одного пользователя по всем миссиям считается
+    одним INSERT ... SELECT (UNION ALL агрегатов), прогресс всех
+    пользователей по новой/измененной миссии - одним set-based проходом.
+    Новый тип требования - подкласс MissionRule + MissionRuleEngine.register.
+    """
+
+    _rules: Dict[str, MissionRule] = {}
+    _compiled: Dict[int, CompiledMission] = {}
+
+    # Выполненная миссия остается выполненной
+    UPSERT = """
+        ON CONFLICT (user_id, mission_id, period_key) DO UPDATE SET
+            progress = EXCLUDED.progress,
+            completed = um.completed OR EXCLUDED.completed,
+            completed_at = COALESCE(um.completed_at, EXCLUDED.completed_at)
+        WHERE um.progress IS DISTINCT FROM EXCLUDED.progress
+           OR (EXCLUDED.completed AND NOT um.completed)
+    """
+
+    # Пересчет после создания/изменения миссии: прогресс и выполнение
+    # задаются заново (в том числе вниз), получившие награду не трогаются
+    REBUILD_UPSERT = """
+        ON CONFLICT (user_id, mission_id, period_key) DO UPDATE SET
+            progress = EXCLUDED.progress,
+            completed = um.claimed OR EXCLUDED.completed,
+            completed_at = CASE WHEN um.claimed OR EXCLUDED.completed
+                                THEN COALESCE(um.completed_at, EXCLUDED.completed_at) END
+        WHERE um.progress IS DISTINCT FROM EXCLUDED.progress
+           OR um.completed IS DISTINCT FROM (um.claimed OR EXCLUDED.completed)
+    """
+
+    @classmethod
+    def register(cls, rule: MissionRule) -> MissionRule:
+        cls._rules[rule.key] = rule
+        return rule
+
+    @classmethod
+    def get_rule(cls, requirements: Optional[dict]) -> Tuple[Optional[MissionRule], Any]:
+        """Правило для requirements (первый известный ключ)"""
+        for key, value in (requirements or {}).items():
+            rule = cls._rules.get(key)
+            if rule is not None:
+                return rule, value
+        return None, None
+
+    @classmethod
+    def get_target(cls, requirements: Optional[dict]) -> int:
+        """Цель миссии из requirements (0 для неизвестного типа)"""
+        rule, value = cls.get_rule(requirements)
+        return rule.target(value) if rule is not None else 0
+
+    @classmethod
+    def compile(cls, mission: Mission) -> Optional[CompiledMission]:
+        """Скомпилировать миссию (кэш по id и updated_at)"""
+        compiled = cls._compiled.get(mission.id)
+        if compiled is not None and compiled.updated_at == mission.updated_at:
+            return compiled
+
+        rule, value = cls.get_rule(mission.requirements)
+        if rule is None:
+            logger.warning(f"⚠️ Миссия {mission.id}: неизвестные требования {mission.requirements}")
+            return None
+
+        compiled = CompiledMission(mission, rule, value)
+        cls._compiled[mission.id] = compiled
+        return compiled
+
+    @classmethod
+    async def evaluate_user(
+        cls,
+        db: AsyncSession,
+        user_id: int,
+        missions: List[Mission],
+        period_keys: Dict[int, str],
+        now: Optional[datetime] = None
+    ) -> None:
+        """
+        Пересчитать прогресс пользователя по всем SQL миссиям одним запросом (без commit)
+
+        Args:
+            db: Database session
+            user_id: ID пользователя
+            missions: Активные миссии (external правила пропускаются)
+            period_keys: period_key по ID миссии
+        """
+        now = now or datetime.now(timezone.utc)
+        parts = []
+        params: Dict[str, Any] = {"user_id": user_id}
+
+        for mission in missions:
+            compiled = cls.compile(mission)
+            if compiled is None or compiled.sql is None:
+                continue
+            p = compiled.prefix
+            parts.append(f"""
+                SELECT CAST(:{p}mission_id AS BIGINT) AS mission_id,
+                       CAST(:{p}period_key AS VARCHAR) AS period_key,
+                       q.progress, q.progress >= :{p}target AS completed
+                FROM ({compiled.query(for_user=True)}) q
+            """)
+            params.update(compiled.bind(now, period_keys[mission.id]))
+
+        if not parts:
+            return
+
+        await db.execute(
+            text(f"""
+                INSERT INTO user_missions AS um
+                    (user_id, mission_id, period_key, progress, completed, claimed, completed_at)
+                SELECT CAST(:user_id AS BIGINT), p.mission_id, p.period_key, p.progress, p.completed, false,
+                       CASE WHEN p.completed THEN now() END
+                FROM ({" UNION ALL ".join(parts)}) p
+                {cls.UPSERT}
+            """),
+            params
+        )
+
+    @classmethod
+    async def backfill(cls, db: AsyncSession, mission: Mission, period_key: str) -> int:
+        """
+        Пересчитать прогресс всех пользователей по миссии (после создания или изменения)
+
+        Одним запросом: строки пользователей с активностью пишутся через
+        REBUILD_UPSERT, строки текущего периода, которых больше нет в агрегате
+        (например, после смены категории или цели), сбрасываются в 0.
+        Полученные награды не отменяются. Для правил без SQL только сброс,
+        прогресс пересчитается при следующем запросе миссий.
+
+        Returns:
+            Количество вставленных/обновленных/сброшенных строк
+        """
+        compiled = cls.compile(mission)
+        reset_params = {"mission_id": mission.id, "period_key": period_key}
+        reset_sql = """
+            UPDATE user_missions um
+            SET progress = 0, completed = false, completed_at = NULL
+            WHERE um.mission_id = :mission_id
+              AND um.period_key = :period_key
+              AND NOT um.claimed
+              AND (um.progress <> 0 OR um.completed)
+              {absent}
+        """
+
+        if compiled is None or compiled.sql is None:
+            result = await db.execute(text(reset_sql.format(absent="")), reset_params)
+            await db.commit()
+            count = result.rowcount or 0
+            logger.info(f"✅ Миссия {mission.id}: прогресс сброшен для {count} пользователей")
+            return count
+
+        p = compiled.prefix
+        result = await db.execute(
+            text(f"""
+                WITH q AS (
+                    SELECT user_id, progress
+                    FROM ({compiled.query()}) q
+                    WHERE q.progress > 0
+                ), reset AS (
+                    {reset_sql.format(absent="AND NOT EXISTS (SELECT 1 FROM q WHERE q.user_id = um.user_id)")}
+                    RETURNING 1
+                ), upserted AS (
+                    INSERT INTO user_missions AS um
+                        (user_id, mission_id, period_key, progress, completed, claimed, completed_at)
+                    SELECT q.user_id, CAST(:{p}mission_id AS BIGINT), CAST(:{p}period_key AS VARCHAR),
+                           q.progress, q.progress >= :{p}target, false,
+                           CASE WHEN q.progress >= :{p}target THEN now() END
+                    FROM q
+                    {cls.REBUILD_UPSERT}
+                    RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM upserted) + (SELECT count(*) FROM reset)
+            """),
+            {**compiled.bind(datetime.now(timezone.utc), period_key), **reset_params}
+        )
+        await db.commit()
+
+        count = result.scalar() or 0
+        logger.info(f"✅ Миссия {mission.id}: прогресс пересчитан для {count} пользователей")
+        return count
+
+
+for _rule in (
+    BetsCountRule(),
+    WinsCountRule(),
+    WinStreakRule(),
+    CategoryBetsRule(),
+    ReferralsCountRule(),
+    DailyBetsRule(),
+    WeeklyBetsRule(),
+    SubscriptionRule(),
+):
+    MissionRuleEngine.register(_rule)
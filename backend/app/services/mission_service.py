@@ -1,13 +1,19 @@
 """Mission Service - Автоматическое обновление прогресса миссий"""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, func, text, case, and_
+from sqlalchemy.dialects.postgresql import insert
 from app.models.mission import Mission, UserMission
 from app.models.user import User
-from app.models.bet import Bet, BetStatus
+from app.core.redis import get_redis
+from app.services.user_stats_service import UserStatsService
+from app.services.channel_subscription_service import ChannelSubscriptionService
+from app.services.mission_rule_engine import MissionRuleEngine, SubscriptionRule
+from app.services.ledger_service import LedgerService
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
+import json
 import logging
-import aiohttp
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -15,49 +21,87 @@ logger = logging.getLogger(__name__)
 class MissionService:
     """Сервис для управления миссиями и прогрессом"""
 
+    ALL_TIME_KEY = "all"
+
+    # Сколько прошедших периодов хранить (для истории), остальные удаляются
+    DAILY_RETENTION_DAYS = 7
+    WEEKLY_RETENTION_WEEKS = 5
+    PRUNE_BATCH_SIZE = 1000
+
+    # Кэш списка миссий пользователя и фоновый пересчет прогресса
+    LIST_CACHE_KEY = "missions:list:{user_id}"
+    LIST_CACHE_TTL = 60  # секунд
+    REFRESH_QUEUE_KEY = "missions:refresh_queue"
+    REFRESHED_KEY = "missions:refreshed:{user_id}"
+    REFRESH_INTERVAL = 60  # секунд, не чаще для одного пользователя при чтении списка
+    REFRESH_BATCH_SIZE = 100
+
+    @staticmethod
+    def day_key(moment: datetime) -> str:
+        """Ключ дня по UTC"""
+        moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment
+        return f"day:{moment.date().isoformat()}"
+
+    @staticmethod
+    def period_key(mission_type: str, moment: Optional[datetime] = None) -> str:
+        """Ключ текущего периода миссии: день для daily, неделя для weekly, иначе all"""
+        moment = moment or datetime.now(timezone.utc)
+        if mission_type == "daily":
+            return MissionService.day_key(moment)
+        if mission_type == "weekly":
+            return UserStatsService.week_key(moment)
+        return MissionService.ALL_TIME_KEY
+
+    @staticmethod
+    def current_period_keys(moment: Optional[datetime] = None) -> List[str]:
+        """Все ключи, актуальные в данный момент"""
+        moment = moment or datetime.now(timezone.utc)
+        return [
+            MissionService.ALL_TIME_KEY,
+            MissionService.period_key("daily", moment),
+            MissionService.period_key("weekly", moment),
+        ]
+
     @staticmethod
     async def update_user_mission_progress(
         db: AsyncSession,
         user_id: int,
         mission_id: int,
         progress: int,
-        completed: bool = False
+        completed: bool = False,
+        period_key: str = ALL_TIME_KEY
     ):
-        """Обновить прогресс пользователя по миссии"""
-        # Check if user mission exists
-        result = await db.execute(
-            select(UserMission).where(
-                and_(
-                    UserMission.user_id == user_id,
-                    UserMission.mission_id == mission_id
-                )
-            )
+        """Обновить прогресс пользователя по миссии за период"""
+        stmt = insert(UserMission).values(
+            user_id=user_id,
+            mission_id=mission_id,
+            period_key=period_key,
+            progress=progress,
+            completed=completed,
+            claimed=False,
+            completed_at=datetime.now(timezone.utc) if completed else None
         )
-        user_mission = result.scalar_one_or_none()
-
-        if user_mission:
-            # Update existing
-            user_mission.progress = progress
-            if completed and not user_mission.completed:
-                user_mission.completed = True
-                user_mission.completed_at = datetime.now(timezone.utc)
-        else:
-            # Create new
-            user_mission = UserMission(
-                user_id=user_id,
-                mission_id=mission_id,
-                progress=progress,
-                completed=completed,
-                completed_at=datetime.now(timezone.utc) if completed else None
-            )
-            db.add(user_mission)
-
+        # Выполненная миссия остается выполненной
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserMission.user_id, UserMission.mission_id, UserMission.period_key],
+            set_={
+                "progress": stmt.excluded.progress,
+                "completed": UserMission.completed | stmt.excluded.completed,
+                "completed_at": func.coalesce(UserMission.completed_at, stmt.excluded.completed_at),
+            }
+        )
+        await db.execute(stmt)
         await db.commit()
-        return user_mission
+        await MissionService.invalidate_list_cache(user_id)
 
     @staticmethod
     async def check_and_update_all_missions(db: AsyncSession, user_id: int):
-        """Проверить и обновить все миссии пользователя"""
+        """
+        Проверить и обновить все миссии пользователя
+
+        SQL миссии пересчитываются одним запросом через MissionRuleEngine,
+        подписки проверяются параллельно через Bot API.
+        """
         # Get all active missions
         result = await db.execute(
             select(Mission).where(Mission.is_active == True)
@@ -71,213 +115,332 @@ class MissionService:
         if not user:
             return
 
-        for mission in missions:
-            await MissionService._check_mission_progress(db, user, mission)
+        now = datetime.now(timezone.utc)
+        period_keys = {m.id: MissionService.period_key(m.type, now) for m in missions}
 
-    @staticmethod
-    async def _check_mission_progress(db: AsyncSession, user: User, mission: Mission):
-        """Проверить прогресс конкретной миссии"""
-        requirements = mission.requirements
-        progress = 0
-        completed = False
-
-        # Bets count
-        if "bets_count" in requirements:
-            target = requirements["bets_count"]
-            progress = user.total_bets
-            completed = progress >= target
-
-        # Wins count
-        elif "wins_count" in requirements:
-            target = requirements["wins_count"]
-            progress = user.total_wins
-            completed = progress >= target
-
-        # Win streak
-        elif "win_streak" in requirements:
-            target = requirements["win_streak"]
-            progress = user.win_streak
-            completed = progress >= target
-
-        # Category bets
-        elif "category_bets" in requirements:
-            category_req = requirements["category_bets"]
-            category = category_req["category"]
-            target = category_req["count"]
-
-            # Count bets in specific category
-            from app.models.market import Market
-            result = await db.execute(
-                select(func.count(Bet.id))
-                .join(Market, Bet.market_id == Market.id)
-                .where(
-                    and_(
-                        Bet.user_id == user.id,
-                        Market.category == category
-                    )
-                )
-            )
-            progress = result.scalar() or 0
-            completed = progress >= target
+        await MissionRuleEngine.evaluate_user(db, user.id, missions, period_keys, now)
+        await db.commit()
+        await MissionService.invalidate_list_cache(user.id)
 
-        # Referrals count
-        elif "referrals_count" in requirements:
-            target = requirements["referrals_count"]
-            # Count referred users (users who have this user as referrer)
-            result = await db.execute(
-                select(func.count(User.id)).where(User.referrer_id == user.id)
-            )
-            progress = result.scalar() or 0
-            completed = progress >= target
+        # Subscription (check via Telegram Bot API)
+        subscription_missions = [
+            m for m in missions
+            if isinstance(MissionRuleEngine.get_rule(m.requirements)[0], SubscriptionRule)
+            and m.channel_id and m.channel_username
+        ]
+        if not subscription_missions:
+            return
 
-        # Daily bets (reset daily)
-        elif "daily_bets" in requirements:
-            target = requirements["daily_bets"]
-            today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-            result = await db.execute(
-                select(func.count(Bet.id)).where(
-                    and_(
-                        Bet.user_id == user.id,
-                        Bet.created_at >= today_start
-                    )
-                )
+        results = await ChannelSubscriptionService.check_many(
+            (user.telegram_id, m.channel_id, m.channel_username) for m in subscription_missions
+        )
+        for mission, subscribed in zip(subscription_missions, results):
+            await MissionService.update_user_mission_progress(
+                db=db,
+                user_id=user.id,
+                mission_id=mission.id,
+                progress=1 if subscribed else 0,
+                completed=subscribed,
+                period_key=period_keys[mission.id]
             )
-            progress = result.scalar() or 0
-            completed = progress >= target
 
-        # Weekly bets (reset weekly)
-        elif "weekly_bets" in requirements:
-            target = requirements["weekly_bets"]
-            week_start = datetime.now(timezone.utc) - timedelta(days=7)
-            result = await db.execute(
-                select(func.count(Bet.id)).where(
-                    and_(
-                        Bet.user_id == user.id,
-                        Bet.created_at >= week_start
-                    )
+    @staticmethod
+    async def get_user_missions(db: AsyncSession, user_id: int) -> List[Dict]:
+        """
+        Активные миссии с прогрессом пользователя за текущие периоды
+
+        Один запрос (missions LEFT JOIN user_missions по period_key миссии),
+        результат кэшируется в Redis до события прогресса или LIST_CACHE_TTL.
+        Пересчет прогресса ставится в фоновую очередь не чаще REFRESH_INTERVAL.
+        """
+        cache_key = MissionService.LIST_CACHE_KEY.format(user_id=user_id)
+
+        redis = None
+        try:
+            redis = await get_redis()
+            cached = await redis.get(cache_key)
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен для кэша миссий: {e}")
+            redis = None
+
+        # Без Redis нет фоновой очереди - пересчет на месте, как раньше
+        if redis is None:
+            await MissionService.check_and_update_all_missions(db, user_id)
+
+        now = datetime.now(timezone.utc)
+        period_key = case(
+            (Mission.type == "daily", MissionService.period_key("daily", now)),
+            (Mission.type == "weekly", MissionService.period_key("weekly", now)),
+            else_=MissionService.ALL_TIME_KEY
+        )
+        result = await db.execute(
+            select(Mission, UserMission.progress, UserMission.completed, UserMission.claimed)
+            .outerjoin(
+                UserMission,
+                and_(
+                    UserMission.mission_id == Mission.id,
+                    UserMission.user_id == user_id,
+                    UserMission.period_key == period_key
                 )
             )
-            progress = result.scalar() or 0
-            completed = progress >= target
+            .where(Mission.is_active == True)
+            .order_by(Mission.type, Mission.id)
+        )
 
-        # Subscription (check via Telegram Bot API)
-        elif "subscription" in requirements:
-            if mission.channel_id and mission.channel_username:
-                subscribed = await MissionService.check_channel_subscription(
-                    user_id=user.telegram_id,
-                    channel_id=mission.channel_id,
-                    channel_username=mission.channel_username
+        missions = []
+        for mission, progress, completed, claimed in result.all():
+            # Get icon URL (custom or default)
+            icon = mission.custom_icon_url or mission.icon or "🎯"
+            missions.append({
+                "id": mission.id,
+                "title": mission.title,
+                "description": mission.description,
+                "icon": icon if not mission.custom_icon_url else mission.icon,
+                "custom_icon_url": mission.custom_icon_url,
+                "reward_amount": str(mission.reward_amount),
+                "reward_currency": mission.reward_currency,
+                "type": mission.type,
+                "requirements": mission.requirements,
+                "progress": progress or 0,
+                "target": MissionRuleEngine.get_target(mission.requirements),
+                "completed": bool(completed),
+                "claimed": bool(claimed),
+                "channel_url": mission.channel_url,
+            })
+
+        if redis is not None:
+            try:
+                await redis.set(cache_key, json.dumps(missions), ex=MissionService.LIST_CACHE_TTL)
+                # Прогресс по рефералам, подпискам и смене периода пересчитывается в фоне
+                refreshed = await redis.set(
+                    MissionService.REFRESHED_KEY.format(user_id=user_id), "1",
+                    ex=MissionService.REFRESH_INTERVAL, nx=True
                 )
-                progress = 1 if subscribed else 0
-                completed = subscribed
-            else:
-                return  # Skip if channel info missing
-
-        # Update user mission progress
-        await MissionService.update_user_mission_progress(
-            db=db,
-            user_id=user.id,
-            mission_id=mission.id,
-            progress=progress,
-            completed=completed
-        )
+                if refreshed:
+                    await redis.sadd(MissionService.REFRESH_QUEUE_KEY, user_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось закэшировать миссии: {e}")
 
-    @staticmethod
-    async def check_channel_subscription(
-        user_id: int,
-        channel_id: str,
-        channel_username: str,
-        bot_token: Optional[str] = None
-    ) -> bool:
-        """Проверить подписку пользователя на канал через Telegram Bot API"""
-        if not bot_token:
-            # Get bot token from env
-            import os
-            bot_token = os.getenv("BOT_TOKEN")
-
-        if not bot_token:
-            logger.error("BOT_TOKEN not found in environment")
-            return False
+        return missions
 
+    @staticmethod
+    async def invalidate_list_cache(user_id: int) -> None:
+        """Сбросить кэш списка миссий пользователя (после изменения прогресса)"""
         try:
-            # Try by channel ID first
-            url = f"https://api.telegram.org/bot{bot_token}/getChatMember"
-            params = {
-                "chat_id": channel_id,
-                "user_id": user_id
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("ok"):
-                            status = data["result"]["status"]
-                            # Member, administrator, creator = subscribed
-                            return status in ["member", "administrator", "creator"]
-
-                    # Try with @username if ID failed
-                    if channel_username:
-                        params["chat_id"] = f"@{channel_username}"
-                        async with session.get(url, params=params) as response2:
-                            if response2.status == 200:
-                                data = await response2.json()
-                                if data.get("ok"):
-                                    status = data["result"]["status"]
-                                    return status in ["member", "administrator", "creator"]
-
-            return False
+            redis = await get_redis()
+            await redis.delete(MissionService.LIST_CACHE_KEY.format(user_id=user_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сбросить кэш миссий: {e}")
 
+    @staticmethod
+    async def schedule_refresh(user_ids: Iterable[int]) -> bool:
+        """
+        Поставить пересчет прогресса пользователей в фоновую очередь
+
+        Returns:
+            False, если Redis недоступен (вызывающий код пересчитывает сам)
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return True
+        try:
+            redis = await get_redis()
+            await redis.sadd(MissionService.REFRESH_QUEUE_KEY, *user_ids)
+            return True
         except Exception as e:
-            logger.error(f"Error checking channel subscription: {e}")
+            logger.warning(f"⚠️ Redis недоступен для очереди пересчета миссий: {e}")
             return False
 
     @staticmethod
-    async def reset_daily_missions(db: AsyncSession):
-        """Сбросить прогресс ежедневных миссий (вызывать по cron)"""
-        # Get all daily missions
-        result = await db.execute(
-            select(Mission).where(
-                and_(
-                    Mission.type == "daily",
-                    Mission.is_active == True
-                )
-            )
-        )
-        daily_missions = result.scalars().all()
+    async def process_refresh_queue(db: AsyncSession, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+        """
+        Пересчитать прогресс пользователей из очереди (задача планировщика)
+
+        Returns:
+            Количество обработанных пользователей
+        """
+        redis = await get_redis()
+        user_ids = await redis.spop(MissionService.REFRESH_QUEUE_KEY, batch_size)
+        if not user_ids:
+            return 0
+
+        for user_id in user_ids:
+            try:
+                await MissionService.check_and_update_all_missions(db, int(user_id))
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Failed to refresh missions for user {user_id}: {e}")
+
+        return len(user_ids)
+
+    @staticmethod
+    async def backfill_mission(db: AsyncSession, mission: Mission) -> int:
+        """Пересчитать прогресс всех пользователей по новой/измененной миссии"""
+        if not mission.is_active:
+            return 0
+        return await MissionRuleEngine.backfill(db, mission, MissionService.period_key(mission.type))
 
-        # Reset user progress for daily missions
-        for mission in daily_missions:
-            await db.execute(
-                UserMission.__table__.delete().where(
-                    UserMission.mission_id == mission.id
+    @staticmethod
+    async def claim_reward(
+        db: AsyncSession,
+        user_id: int,
+        mission: Mission,
+        idempotency_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Получить награду за миссию одним запросом
+
+        Отметка claimed (условный UPDATE ... WHERE NOT claimed), зачисление
+        на баланс и проводки в журнал выполняются одним statement, поэтому
+        параллельные запросы не могут получить награду дважды. Повтор
+        запроса с тем же idempotency_key возвращает тот же успешный ответ.
+
+        Returns:
+            {"status": claimed | replayed | not_found | not_completed | already_claimed,
+             "new_balance": ...}
+        """
+        period_key = MissionService.period_key(mission.type)
+        params = {
+            "user_id": user_id,
+            "mission_id": mission.id,
+            "period_key": period_key,
+            "claim_key": idempotency_key,
+            "currency": mission.reward_currency,
+            "amount": mission.reward_amount,
+            "txn_id": str(uuid.uuid4()),
+            "reference": f"mission:{mission.id}",
+            "user_account": LedgerService.USER_ACCOUNT,
+            "counter_account": LedgerService.MISSIONS,
+        }
+
+        try:
+            await LedgerService.lock_for_write(db)
+            result = await db.execute(
+                text("""
+                    WITH claimed AS (
+                        UPDATE user_missions
+                        SET claimed = true, claimed_at = now(), claim_key = :claim_key
+                        WHERE user_id = :user_id
+                          AND mission_id = :mission_id
+                          AND period_key = :period_key
+                          AND completed
+                          AND NOT claimed
+                        RETURNING user_id
+                    ), credited AS (
+                        UPDATE users u
+                        SET pred_balance = u.pred_balance
+                                + CASE WHEN :currency = 'PRED' THEN CAST(:amount AS NUMERIC) ELSE 0 END,
+                            ton_balance = u.ton_balance
+                                + CASE WHEN :currency = 'PRED' THEN 0 ELSE CAST(:amount AS NUMERIC) END
+                        FROM claimed c
+                        WHERE u.id = c.user_id
+                        RETURNING u.pred_balance, u.ton_balance
+                    ), ledger AS (
+                        INSERT INTO ledger_entries (txn_id, account, user_id, currency, amount, entry_type, reference)
+                        SELECT :txn_id, leg.account, leg.user_id, :currency,
+                               leg.sign * CAST(:amount AS NUMERIC), 'mission_reward', :reference
+                        FROM claimed
+                        CROSS JOIN (VALUES
+                            (CAST(:user_account AS VARCHAR), CAST(:user_id AS BIGINT), 1),
+                            (CAST(:counter_account AS VARCHAR), NULL::bigint, -1)
+                        ) AS leg(account, user_id, sign)
+                    )
+                    SELECT pred_balance, ton_balance FROM credited
+                """),
+                params
+            )
+            credited = result.first()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        if credited is not None:
+            status = "claimed"
+            balances = credited
+            await MissionService.invalidate_list_cache(user_id)
+        else:
+            # Ничего не обновлено: выясняем причину
+            result = await db.execute(
+                select(UserMission.completed, UserMission.claimed, UserMission.claim_key).where(
+                    UserMission.user_id == user_id,
+                    UserMission.mission_id == mission.id,
+                    UserMission.period_key == period_key
                 )
             )
+            row = result.first()
+            if row is None:
+                return {"status": "not_found"}
+            if not row.completed:
+                return {"status": "not_completed"}
+            if not idempotency_key or row.claim_key != idempotency_key:
+                return {"status": "already_claimed"}
+
+            status = "replayed"
+            result = await db.execute(
+                select(User.pred_balance, User.ton_balance).where(User.id == user_id)
+            )
+            balances = result.first()
 
-        await db.commit()
-        logger.info(f"✅ Reset {len(daily_missions)} daily missions")
+        return {
+            "status": status,
+            "new_balance": balances.pred_balance if mission.reward_currency == "PRED" else balances.ton_balance,
+        }
 
     @staticmethod
-    async def reset_weekly_missions(db: AsyncSession):
-        """Сбросить прогресс еженедельных миссий (вызывать по cron)"""
-        # Get all weekly missions
-        result = await db.execute(
-            select(Mission).where(
-                and_(
-                    Mission.type == "weekly",
-                    Mission.is_active == True
-                )
-            )
+    async def check_channel_subscription(
+        user_id: int,
+        channel_id: str,
+        channel_username: str,
+        bot_token: Optional[str] = None,
+        use_cache: bool = True
+    ) -> bool:
+        """Проверить подписку пользователя на канал через Telegram Bot API (с кэшем)"""
+        return await ChannelSubscriptionService.is_member(
+            user_id=user_id,
+            channel_id=channel_id,
+            channel_username=channel_username,
+            use_cache=use_cache,
+            bot_token=bot_token
         )
-        weekly_missions = result.scalars().all()
 
-        # Reset user progress for weekly missions
-        for mission in weekly_missions:
-            await db.execute(
-                UserMission.__table__.delete().where(
-                    UserMission.mission_id == mission.id
+    @staticmethod
+    async def prune_old_periods(db: AsyncSession, max_batches: int = 50) -> int:
+        """
+        Удалить прогресс прошедших периодов daily/weekly небольшими пакетами
+
+        Сброс миссий происходит сам собой (новый period_key), эта задача
+        только освобождает место, не блокируя таблицу надолго.
+
+        Returns:
+            Количество удаленных строк
+        """
+        now = datetime.now(timezone.utc)
+        ranges = [
+            ("day:", MissionService.day_key(now - timedelta(days=MissionService.DAILY_RETENTION_DAYS))),
+            ("week:", UserStatsService.week_key(now - timedelta(weeks=MissionService.WEEKLY_RETENTION_WEEKS))),
+        ]
+        deleted = 0
+
+        for prefix, cutoff in ranges:
+            for _ in range(max_batches):
+                result = await db.execute(
+                    text("""
+                        DELETE FROM user_missions
+                        WHERE ctid IN (
+                            SELECT ctid FROM user_missions
+                            WHERE period_key >= :prefix AND period_key < :cutoff
+                            LIMIT :batch_size
+                        )
+                    """),
+                    {"prefix": prefix, "cutoff": cutoff, "batch_size": MissionService.PRUNE_BATCH_SIZE}
                 )
-            )
+                await db.commit()
+                deleted += result.rowcount or 0
+                if (result.rowcount or 0) < MissionService.PRUNE_BATCH_SIZE:
+                    break
 
-        await db.commit()
-        logger.info(f"✅ Reset {len(weekly_missions)} weekly missions")
+        logger.info(f"✅ Удалено {deleted} строк прогресса прошедших периодов")
+        return deleted
@@ -0,0 +1,267 @@
+"""
+Odds History Service - История коэффициентов рынков и даунсэмплинг для графиков
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, text
+from app.core.redis import get_redis
+from app.models.market import Market
+from app.models.market_odds import MarketOddsTick
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+import json
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+class OddsHistoryService:
+    """
+    Тики на каждую ставку -> свечи 1m -> 1h -> 1d
+
+    Запрос графика выбирает самое мелкое доступное разрешение и прореживает
+    свечи до MAX_POINTS, поэтому число точек не зависит от количества ставок.
+    """
+
+    RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+    # Из чего строится разрешение и за какое окно пересчитываются свечи
+    ROLLUPS = [
+        ("1h", "1m", "hour", "2 hours"),
+        ("1d", "1h", "day", "2 days"),
+    ]
+    TICKS_LOOKBACK = "5 minutes"
+
+    # Срок хранения (сырые тики и мелкие свечи нужны только для коротких диапазонов)
+    TICKS_RETENTION = timedelta(days=2)
+    RETENTION = {"1m": timedelta(days=7), "1h": timedelta(days=180)}
+    PRUNE_BATCH_SIZE = 10000
+
+    RANGES = {
+        "1h": timedelta(hours=1),
+        "24h": timedelta(days=1),
+        "7d": timedelta(days=7),
+        "30d": timedelta(days=30),
+        "all": None,
+    }
+    MAX_POINTS = 200
+    # Сколько свечей можно прочитать на одну точку графика перед прореживанием
+    READ_FACTOR = 10
+
+    CACHE_KEY = "odds_history:{market_id}:{range_key}:{points}"
+    CACHE_TTL = 30  # секунд
+
+    @staticmethod
+    async def record_tick(db: AsyncSession, market: Market) -> None:
+        """Записать снимок коэффициентов рынка (без commit - в транзакции ставки)"""
+        await db.execute(
+            insert(MarketOddsTick).values(
+                market_id=market.id,
+                yes_odds=market.yes_odds,
+                no_odds=market.no_odds,
+                yes_pool_pred=market.yes_pool_pred,
+                no_pool_pred=market.no_pool_pred,
+                yes_pool_ton=market.yes_pool_ton,
+                no_pool_ton=market.no_pool_ton
+            )
+        )
+
+    @staticmethod
+    async def downsample(db: AsyncSession) -> Dict[str, int]:
+        """
+        Пересчитать свечи за последние интервалы (идемпотентно)
+
+        1m строятся из тиков, 1h - из 1m, 1d - из 1h. Незакрытые интервалы
+        пересчитываются при каждом запуске.
+
+        Returns:
+            Количество вставленных/обновленных свечей по разрешениям
+        """
+        upsert = """
+            ON CONFLICT (market_id, resolution, bucket) DO UPDATE SET
+                yes_open = EXCLUDED.yes_open,
+                yes_high = EXCLUDED.yes_high,
+                yes_low = EXCLUDED.yes_low,
+                yes_close = EXCLUDED.yes_close,
+                no_close = EXCLUDED.no_close,
+                ticks = EXCLUDED.ticks,
+                updated_at = now()
+            WHERE h.ticks IS DISTINCT FROM EXCLUDED.ticks
+               OR h.yes_close IS DISTINCT FROM EXCLUDED.yes_close
+        """
+        counts = {}
+
+        result = await db.execute(text(f"""
+            INSERT INTO market_odds_history AS h
+                (market_id, resolution, bucket, yes_open, yes_high, yes_low, yes_close, no_close, ticks)
+            SELECT market_id, '1m', date_trunc('minute', created_at),
+                   (array_agg(yes_odds ORDER BY id))[1],
+                   MAX(yes_odds), MIN(yes_odds),
+                   (array_agg(yes_odds ORDER BY id DESC))[1],
+                   (array_agg(no_odds ORDER BY id DESC))[1],
+                   COUNT(*)
+            FROM market_odds_ticks
+            WHERE created_at >= date_trunc('minute', now() - interval '{OddsHistoryService.TICKS_LOOKBACK}')
+            GROUP BY market_id, date_trunc('minute', created_at)
+            {upsert}
+        """))
+        counts["1m"] = result.rowcount or 0
+
+        for target, source, unit, lookback in OddsHistoryService.ROLLUPS:
+            result = await db.execute(
+                text(f"""
+                    INSERT INTO market_odds_history AS h
+                        (market_id, resolution, bucket, yes_open, yes_high, yes_low, yes_close, no_close, ticks)
+                    SELECT market_id, :target, date_trunc('{unit}', bucket),
+                           (array_agg(yes_open ORDER BY bucket))[1],
+                           MAX(yes_high), MIN(yes_low),
+                           (array_agg(yes_close ORDER BY bucket DESC))[1],
+                           (array_agg(no_close ORDER BY bucket DESC))[1],
+                           SUM(ticks)
+                    FROM market_odds_history
+                    WHERE resolution = :source
+                      AND bucket >= date_trunc('{unit}', now() - interval '{lookback}')
+                    GROUP BY market_id, date_trunc('{unit}', bucket)
+                    {upsert}
+                """),
+                {"target": target, "source": source}
+            )
+            counts[target] = result.rowcount or 0
+
+        await db.commit()
+        return counts
+
+    @staticmethod
+    async def prune(db: AsyncSession, max_batches: int = 20) -> int:
+        """
+        Удалить старые тики и мелкие свечи небольшими пакетами
+
+        Returns:
+            Количество удаленных строк
+        """
+        now = datetime.now(timezone.utc)
+        deleted = 0
+
+        targets = [
+            ("market_odds_ticks", "id", "created_at < :cutoff", now - OddsHistoryService.TICKS_RETENTION, None),
+        ] + [
+            ("market_odds_history", "ctid", "resolution = :resolution AND bucket < :cutoff", now - keep, resolution)
+            for resolution, keep in OddsHistoryService.RETENTION.items()
+        ]
+
+        for table, key, condition, cutoff, resolution in targets:
+            for _ in range(max_batches):
+                result = await db.execute(
+                    text(f"""
+                        DELETE FROM {table}
+                        WHERE {key} IN (
+                            SELECT {key} FROM {table} WHERE {condition} LIMIT :batch_size
+                        )
+                    """),
+                    {"cutoff": cutoff, "resolution": resolution, "batch_size": OddsHistoryService.PRUNE_BATCH_SIZE}
+                )
+                await db.commit()
+                deleted += result.rowcount or 0
+                if (result.rowcount or 0) < OddsHistoryService.PRUNE_BATCH_SIZE:
+                    break
+
+        if deleted:
+            logger.info(f"🧹 История коэффициентов: удалено {deleted} старых строк")
+        return deleted
+
+    @staticmethod
+    def _pick_resolution(span: timedelta, max_points: int) -> str:
+        """Самое мелкое разрешение, которое укладывается в срок хранения и лимит чтения"""
+        for resolution, seconds in OddsHistoryService.RESOLUTIONS.items():
+            keep = OddsHistoryService.RETENTION.get(resolution)
+            if keep is not None and span > keep:
+                continue
+            if span.total_seconds() / seconds <= max_points * OddsHistoryService.READ_FACTOR:
+                return resolution
+        return "1d"
+
+    @staticmethod
+    async def get_history(
+        db: AsyncSession,
+        market: Market,
+        range_key: str = "24h",
+        max_points: Optional[int] = None
+    ) -> Dict:
+        """
+        Точки графика yes/no odds за диапазон
+
+        Args:
+            db: Database session
+            market: Рынок
+            range_key: 1h, 24h, 7d, 30d или all
+            max_points: Максимум точек (по умолчанию MAX_POINTS)
+
+        Returns:
+            Разрешение и список точек {t, yes, no}; последняя точка - текущие коэффициенты
+        """
+        max_points = min(max_points or OddsHistoryService.MAX_POINTS, OddsHistoryService.MAX_POINTS)
+        cache_key = OddsHistoryService.CACHE_KEY.format(
+            market_id=market.id, range_key=range_key, points=max_points
+        )
+
+        redis = None
+        try:
+            redis = await get_redis()
+            cached = await redis.get(cache_key)
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен для истории коэффициентов: {e}")
+            redis = None
+
+        now = datetime.now(timezone.utc)
+        span = OddsHistoryService.RANGES[range_key]
+        if span is None:
+            created_at = market.created_at or now
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            span = max(now - created_at, timedelta(hours=1))
+        since = now - span
+
+        resolution = OddsHistoryService._pick_resolution(span, max_points)
+        # Шаг прореживания: не меньше разрешения и не больше max_points точек
+        stride = max(
+            OddsHistoryService.RESOLUTIONS[resolution],
+            math.ceil(span.total_seconds() / max_points)
+        )
+
+        # Из каждого слота берется закрытие последней свечи
+        result = await db.execute(
+            text("""
+                SELECT DISTINCT ON (slot)
+                    to_timestamp(floor(extract(epoch FROM bucket) / :stride) * :stride) AS slot,
+                    yes_close, no_close
+                FROM market_odds_history
+                WHERE market_id = :market_id
+                  AND resolution = :resolution
+                  AND bucket >= :since
+                ORDER BY slot, bucket DESC
+            """),
+            {"market_id": market.id, "resolution": resolution, "since": since, "stride": stride}
+        )
+        points = [
+            {"t": slot.isoformat(), "yes": float(yes_close), "no": float(no_close)}
+            for slot, yes_close, no_close in result.all()
+        ][-(max_points - 1):]
+        # Текущие коэффициенты: свеча текущего интервала может быть еще не построена
+        points.append({"t": now.isoformat(), "yes": float(market.yes_odds), "no": float(market.no_odds)})
+
+        history = {
+            "market_id": market.id,
+            "range": range_key,
+            "resolution": resolution,
+            "points": points,
+        }
+
+        if redis is not None:
+            try:
+                await redis.set(cache_key, json.dumps(history), ex=OddsHistoryService.CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось закэшировать историю коэффициентов: {e}")
+
+        return history
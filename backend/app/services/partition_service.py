@@ -0,0 +1,84 @@
+"""
+Partition Service - Обслуживание партиций больших таблиц
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from datetime import date, datetime, timezone
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionService:
+    """Создание будущих месячных партиций (RANGE по created_at)"""
+
+    @staticmethod
+    def _add_months(day: date, months: int) -> date:
+        month_index = day.month - 1 + months
+        return day.replace(year=day.year + month_index // 12, month=month_index % 12 + 1, day=1)
+
+    @staticmethod
+    async def _existing_partitions(db: AsyncSession, table: str) -> List[str]:
+        result = await db.execute(
+            text("""
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = :parent
+            """),
+            {"parent": table}
+        )
+        return [name for (name,) in result.all()]
+
+    @staticmethod
+    async def ensure_monthly_partitions(
+        db: AsyncSession,
+        table: str,
+        months_ahead: int = 3
+    ) -> int:
+        """
+        Создать месячные партиции {table}_pYYYYMM на N месяцев вперед
+
+        Args:
+            db: Database session
+            table: Имя партиционированной таблицы
+            months_ahead: На сколько месяцев вперед (помимо текущего)
+
+        Returns:
+            Количество созданных партиций
+        """
+        existing = set(await PartitionService._existing_partitions(db, table))
+        current_month = datetime.now(timezone.utc).date().replace(day=1)
+        created = 0
+
+        for offset in range(months_ahead + 1):
+            month = PartitionService._add_months(current_month, offset)
+            name = f"{table}_p{month:%Y%m}"
+            if name in existing:
+                continue
+
+            next_month = PartitionService._add_months(current_month, offset + 1)
+            try:
+                await db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{next_month} 00:00:00+00')"
+                ))
+                await db.commit()
+                created += 1
+                logger.info(f"🗂 Создана партиция {name}")
+            except Exception as e:
+                await db.rollback()
+                # Месяц уже покрыт исторической партицией (bets_legacy до границы партиционирования)
+                if "would overlap partition" in str(e):
+                    continue
+                # Например, строки за этот месяц уже попали в DEFAULT партицию
+                logger.error(f"❌ Не удалось создать партицию {name}: {e}")
+
+        return created
+
+    @staticmethod
+    async def ensure_bets_partitions(db: AsyncSession, months_ahead: int = 3) -> int:
+        """Создать будущие партиции таблицы bets"""
+        return await PartitionService.ensure_monthly_partitions(db, "bets", months_ahead)
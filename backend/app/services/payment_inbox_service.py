@@ -0,0 +1,305 @@
+"""
+Payment Inbox Service - Асинхронная обработка webhook CryptoCloud
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.models.payment import PaymentWebhookEvent
+from app.services.ledger_service import LedgerService
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentInboxService:
+    """
+    Inbox webhook CryptoCloud
+
+    Callback сохраняет событие (уникально по invoice_id + status) и сразу
+    отвечает. Воркер разбирает inbox пачками через FOR UPDATE SKIP LOCKED:
+    платежи, балансы, транзакции и журнал обновляются set-based запросами,
+    событие отмечается обработанным в той же транзакции БД. Повторный
+    webhook или replay уже завершенного платежа ничего не меняет.
+    """
+
+    BATCH_SIZE = 100
+    MAX_ATTEMPTS = 5
+
+    SUCCESS_STATUSES = ("success",)
+    FAIL_STATUSES = ("fail", "cancelled")
+
+    @staticmethod
+    async def store(db: AsyncSession, data: Dict) -> Optional[bool]:
+        """
+        Сохранить webhook в inbox
+
+        Returns:
+            True - новое событие, False - повтор, None - нет invoice_id/status
+        """
+        invoice_id = data.get("invoice_id")
+        status = data.get("status")
+        if not invoice_id or not status:
+            return None
+
+        result = await db.execute(
+            insert(PaymentWebhookEvent)
+            .values(invoice_id=str(invoice_id), status=str(status), payload=json.dumps(data))
+            .on_conflict_do_nothing(index_elements=[PaymentWebhookEvent.invoice_id, PaymentWebhookEvent.status])
+            .returning(PaymentWebhookEvent.id)
+        )
+        created = result.scalar() is not None
+        await db.commit()
+        return created
+
+    @staticmethod
+    def _decimal(value) -> Decimal:
+        try:
+            return Decimal(str(value)) if value not in (None, "") else Decimal("0")
+        except InvalidOperation:
+            return Decimal("0")
+
+    @staticmethod
+    async def _claim(db: AsyncSession, limit: int, event_ids: Optional[List[int]] = None) -> List:
+        result = await db.execute(
+            text("""
+                SELECT id, invoice_id, status, payload
+                FROM payment_webhook_inbox
+                WHERE processed_at IS NULL
+                  AND attempts < :max_attempts
+                  AND (CAST(:ids AS BIGINT[]) IS NULL OR id = ANY(CAST(:ids AS BIGINT[])))
+                ORDER BY received_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            """),
+            {"max_attempts": PaymentInboxService.MAX_ATTEMPTS, "ids": event_ids, "limit": limit}
+        )
+        return result.all()
+
+    @staticmethod
+    async def _complete_payments(db: AsyncSession, events: List) -> int:
+        """Завершить платежи по success событиям и зачислить TON (без commit)"""
+        if not events:
+            return 0
+
+        payloads = [json.loads(event.payload) for event in events]
+        result = await db.execute(
+            text("""
+                WITH events AS (
+                    SELECT *
+                    FROM unnest(
+                        CAST(:invoice_ids AS VARCHAR[]), CAST(:crypto_amounts AS NUMERIC[]),
+                        CAST(:crypto_currencies AS VARCHAR[]), CAST(:payloads AS TEXT[])
+                    ) AS e(invoice_id, crypto_amount, crypto_currency, payload)
+                ), completed AS (
+                    UPDATE payments p
+                    SET status = 'COMPLETED',
+                        completed_at = now(),
+                        updated_at = now(),
+                        crypto_amount = e.crypto_amount,
+                        crypto_currency = left(e.crypto_currency, 10),
+                        payment_data = e.payload
+                    FROM events e
+                    WHERE p.invoice_id = e.invoice_id
+                      AND p.status <> 'COMPLETED'
+                    RETURNING p.id, p.user_id, p.amount, round(p.amount * CAST(:rate AS NUMERIC), 2) AS ton_amount
+                ), credited AS (
+                    UPDATE users u
+                    SET ton_balance = u.ton_balance + c.ton_amount
+                    FROM (
+                        SELECT user_id, SUM(ton_amount) AS ton_amount
+                        FROM completed
+                        GROUP BY user_id
+                    ) c
+                    WHERE u.id = c.user_id
+                ), recorded AS (
+                    INSERT INTO transactions (user_id, type, currency, amount, status, description, completed_at)
+                    SELECT c.user_id, 'DEPOSIT', 'TON', c.ton_amount, 'COMPLETED',
+                           'CryptoCloud deposit: $' || c.amount || ' USDT → ' || c.ton_amount || ' TON', now()
+                    FROM completed c
+                )
+                SELECT id, user_id, ton_amount FROM completed
+            """),
+            {
+                "invoice_ids": [event.invoice_id for event in events],
+                "crypto_amounts": [PaymentInboxService._decimal(p.get("amount_crypto")) for p in payloads],
+                "crypto_currencies": [str(p.get("currency") or "") for p in payloads],
+                "payloads": [event.payload for event in events],
+                "rate": str(settings.USD_TO_TON_RATE),
+            }
+        )
+        completed = result.all()
+
+        await LedgerService.post(db, [
+            LedgerService.movement(
+                row.user_id, row.ton_amount, "TON", "deposit", LedgerService.DEPOSITS, f"payment:{row.id}"
+            )
+            for row in completed
+        ])
+        for row in completed:
+            logger.info(f"💳 User {row.user_id} credited {row.ton_amount} TON (Payment {row.id})")
+        return len(completed)
+
+    @staticmethod
+    async def _apply(db: AsyncSession, events: List) -> Dict[str, int]:
+        """Обработать пачку событий и отметить их обработанными (без commit)"""
+        invoice_ids = list({event.invoice_id for event in events})
+        result = await db.execute(
+            text("SELECT invoice_id FROM payments WHERE invoice_id = ANY(:invoice_ids)"),
+            {"invoice_ids": invoice_ids}
+        )
+        known = {row.invoice_id for row in result}
+
+        errors: Dict[int, Optional[str]] = {}
+        success_events = []
+        fail_invoices = []
+        for event in events:
+            if event.invoice_id not in known:
+                errors[event.id] = "Payment not found"
+            elif event.status in PaymentInboxService.SUCCESS_STATUSES:
+                success_events.append(event)
+                errors[event.id] = None
+            elif event.status in PaymentInboxService.FAIL_STATUSES:
+                fail_invoices.append(event.invoice_id)
+                errors[event.id] = None
+            else:
+                errors[event.id] = f"Unknown payment status: {event.status}"
+
+        completed = await PaymentInboxService._complete_payments(db, success_events)
+
+        failed = 0
+        if fail_invoices:
+            result = await db.execute(
+                text("""
+                    UPDATE payments
+                    SET status = 'FAILED', updated_at = now()
+                    WHERE invoice_id = ANY(:invoice_ids)
+                      AND status <> 'COMPLETED'
+                """),
+                {"invoice_ids": fail_invoices}
+            )
+            failed = result.rowcount or 0
+
+        await db.execute(
+            text("""
+                UPDATE payment_webhook_inbox i
+                SET processed_at = now(), attempts = i.attempts + 1, last_error = e.error
+                FROM unnest(CAST(:ids AS BIGINT[]), CAST(:errors AS TEXT[])) AS e(id, error)
+                WHERE i.id = e.id
+            """),
+            {"ids": list(errors.keys()), "errors": list(errors.values())}
+        )
+
+        for event_id, error in errors.items():
+            if error:
+                logger.warning(f"⚠️ Webhook #{event_id}: {error}")
+
+        return {"processed": len(events), "completed": completed, "failed": failed}
+
+    @staticmethod
+    async def _record_error(db: AsyncSession, event_id: int, error: Exception) -> None:
+        await db.execute(
+            text("""
+                UPDATE payment_webhook_inbox
+                SET attempts = attempts + 1, last_error = :error
+                WHERE id = :id
+            """),
+            {"id": event_id, "error": str(error)[:1000]}
+        )
+        await db.commit()
+
+    @staticmethod
+    async def drain(db: AsyncSession, batch_size: int = BATCH_SIZE, max_batches: int = 10) -> Dict[str, int]:
+        """
+        Обработать необработанные события inbox
+
+        Пачка обрабатывается одной транзакцией БД. Если пачка падает, ее события
+        обрабатываются по одному, чтобы ошибка одного не блокировала остальные;
+        событие с MAX_ATTEMPTS неудачами остается для replay.
+
+        Returns:
+            Количество обработанных событий, завершенных и отмененных платежей
+        """
+        totals = {"processed": 0, "completed": 0, "failed": 0}
+
+        for _ in range(max_batches):
+            events = await PaymentInboxService._claim(db, batch_size)
+            if not events:
+                await db.rollback()
+                break
+
+            try:
+                stats = await PaymentInboxService._apply(db, events)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Error processing webhook batch, retrying one by one: {str(e)}")
+
+                stats = {"processed": 0, "completed": 0, "failed": 0}
+                for event_id in [event.id for event in events]:
+                    try:
+                        single = await PaymentInboxService._claim(db, 1, event_ids=[event_id])
+                        if not single:
+                            await db.rollback()
+                            continue
+                        event_stats = await PaymentInboxService._apply(db, single)
+                        await db.commit()
+                    except Exception as event_error:
+                        await db.rollback()
+                        logger.error(f"❌ Webhook #{event_id} failed: {str(event_error)}")
+                        await PaymentInboxService._record_error(db, event_id, event_error)
+                        continue
+                    for key, value in event_stats.items():
+                        stats[key] += value
+
+            for key, value in stats.items():
+                totals[key] += value
+
+            if len(events) < batch_size:
+                break
+
+        if totals["processed"]:
+            logger.info(
+                f"📥 Inbox CryptoCloud: {totals['processed']} событий, "
+                f"{totals['completed']} платежей зачислено, {totals['failed']} отменено"
+            )
+        return totals
+
+    @staticmethod
+    async def replay(
+        db: AsyncSession,
+        event_ids: Optional[List[int]] = None,
+        invoice_id: Optional[str] = None
+    ) -> int:
+        """
+        Поставить события на повторную обработку
+
+        Обработка идемпотентна: уже завершенный платеж повторно не зачисляется.
+
+        Args:
+            event_ids: ID событий inbox
+            invoice_id: Все события счета
+
+        Returns:
+            Количество событий, поставленных в очередь
+        """
+        if not event_ids and not invoice_id:
+            return 0
+
+        result = await db.execute(
+            text("""
+                UPDATE payment_webhook_inbox
+                SET processed_at = NULL, attempts = 0, last_error = NULL
+                WHERE id = ANY(CAST(:ids AS BIGINT[]))
+                   OR invoice_id = :invoice_id
+            """),
+            {"ids": event_ids or [], "invoice_id": invoice_id}
+        )
+        await db.commit()
+
+        count = result.rowcount or 0
+        logger.info(f"🔁 Replay webhook CryptoCloud: {count} событий")
+        return count
@@ -2,17 +2,47 @@
 Telegram Notifications Queue Service
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, delete
+from sqlalchemy import select, and_, or_, func, text, insert
 from sqlalchemy.orm import selectinload
 from app.models.telegram_notification import TelegramNotification, NotificationStatus, NotificationType
-from datetime import datetime, timedelta, timezone
+from app.core.redis import get_redis
+from datetime import datetime, timedelta, timezone, date
 from typing import List, Optional, Dict
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class TelegramQueueService:
     """Сервис для работы с очередью Telegram уведомлений"""
 
+    # Дневные партиции: telegram_notifications_queue_pYYYYMMDD
+    PARTITION_PREFIX = "telegram_notifications_queue_p"
+    DEFAULT_PARTITION = "telegram_notifications_queue_default"
+    CLEANUP_BATCH_SIZE = 5000
+
+    # Снимок статистики очереди в Redis
+    STATS_CACHE_KEY = "telegram_queue:stats"
+    STATS_CACHE_TTL = 5  # секунд
+    THROUGHPUT_WINDOW_MINUTES = 5
+
+    # Типы, которые можно склеивать в дайджест (рассылки и награды не трогаем)
+    COALESCE_TYPES = (
+        NotificationType.MARKET_RESOLVED,
+        NotificationType.BET_WON,
+        NotificationType.BET_LOST,
+        NotificationType.MISSION_COMPLETED,
+    )
+    DIGEST_HEADERS = {
+        NotificationType.MARKET_RESOLVED: "📢 <b>Рынки разрешены</b>",
+        NotificationType.BET_WON: "🎉 <b>Ваши выигрыши</b>",
+        NotificationType.BET_LOST: "📉 <b>Результаты ставок</b>",
+        NotificationType.MISSION_COMPLETED: "🎯 <b>Выполненные миссии</b>",
+    }
+    DIGEST_SEPARATOR = "\n\n➖➖➖\n\n"
+    MAX_MESSAGE_LENGTH = 4000  # Лимит Telegram 4096 символов, оставляем запас
+
     @staticmethod
     async def add_notification(
         db: AsyncSession,
@@ -54,11 +84,42 @@ class TelegramQueueService:
 
         return notification
 
+    @staticmethod
+    async def add_notifications(db: AsyncSession, notifications: List[Dict]) -> int:
+        """
+        Добавить пачку уведомлений одним INSERT (без commit - в транзакции вызывающего кода)
+
+        Args:
+            notifications: [{"telegram_id", "message_text", "notification_type",
+                             "user_id"?, "parse_mode"?, "metadata"?}]
+
+        Returns:
+            Количество поставленных уведомлений
+        """
+        rows = [
+            {
+                "telegram_id": n["telegram_id"],
+                "user_id": n.get("user_id"),
+                "message_text": n["message_text"],
+                "parse_mode": n.get("parse_mode", "HTML"),
+                "notification_type": n["notification_type"],
+                "status": NotificationStatus.PENDING,
+                "attempts": 0,
+                "max_attempts": 5,
+                "notification_metadata": json.dumps(n["metadata"]) if n.get("metadata") else None,
+            }
+            for n in notifications
+        ]
+        if rows:
+            await db.execute(insert(TelegramNotification), rows)
+        return len(rows)
+
     @staticmethod
     async def get_pending_messages(
         db: AsyncSession,
         limit: int = 10,
-        include_scheduled: bool = True
+        include_scheduled: bool = True,
+        coalesce_window_seconds: int = 0
     ) -> List[TelegramNotification]:
         """
         Получить pending сообщения для отправки
@@ -67,6 +128,8 @@ class TelegramQueueService:
             db: Database session
             limit: Максимальное количество сообщений
             include_scheduled: Включить запланированные сообщения, время которых наступило
+            coalesce_window_seconds: Сообщения типов COALESCE_TYPES придерживаются, пока
+                не пройдет окно склейки (их еще можно склеить в дайджест)
 
         Returns:
             Список сообщений для отправки
@@ -78,6 +141,14 @@ class TelegramQueueService:
             TelegramNotification.status == NotificationStatus.PENDING
         )
 
+        if coalesce_window_seconds > 0:
+            query = query.where(
+                or_(
+                    TelegramNotification.notification_type.notin_(TelegramQueueService.COALESCE_TYPES),
+                    TelegramNotification.created_at <= now - timedelta(seconds=coalesce_window_seconds)
+                )
+            )
+
         if include_scheduled:
             # Включаем сообщения, которые либо не запланированы, либо время наступило
             query = query.where(
@@ -99,6 +170,116 @@ class TelegramQueueService:
         result = await db.execute(query)
         return list(result.scalars().all())
 
+    @staticmethod
+    async def coalesce_pending_messages(
+        db: AsyncSession,
+        window_seconds: int,
+        limit: int = 500
+    ) -> int:
+        """
+        Склеить pending сообщения одного типа для одного получателя в дайджест
+
+        Сообщения группируются по (telegram_id, тип, parse_mode): группа начинается
+        с самого старого pending сообщения и включает все, созданные в течение
+        window_seconds после него. Склеиваются только группы, окно которых уже
+        прошло (до этого get_pending_messages их придерживает), поэтому вся пачка
+        попадает в один дайджест. Группа из нескольких сообщений заменяется одним
+        дайджестом, исходные строки удаляются. Сообщения с фото, запланированные
+        сообщения и уже собранные дайджесты не склеиваются.
+
+        Args:
+            db: Database session
+            window_seconds: Размер окна склейки в секундах
+            limit: Максимум pending сообщений за один проход
+
+        Returns:
+            Количество сообщений, замененных дайджестами
+        """
+        if window_seconds <= 0:
+            return 0
+
+        result = await db.execute(
+            select(TelegramNotification).where(
+                and_(
+                    TelegramNotification.status == NotificationStatus.PENDING,
+                    TelegramNotification.scheduled_at.is_(None),
+                    TelegramNotification.notification_type.in_(TelegramQueueService.COALESCE_TYPES),
+                    or_(
+                        TelegramNotification.notification_metadata.is_(None),
+                        and_(
+                            ~TelegramNotification.notification_metadata.contains('"photo_url"'),
+                            ~TelegramNotification.notification_metadata.contains('"coalesced_ids"')
+                        )
+                    )
+                )
+            ).order_by(
+                TelegramNotification.telegram_id,
+                TelegramNotification.notification_type,
+                TelegramNotification.created_at
+            ).limit(limit).with_for_update(skip_locked=True)
+        )
+        messages = list(result.scalars().all())
+
+        window = timedelta(seconds=window_seconds)
+        cutoff = datetime.now(timezone.utc) - window
+
+        groups: List[tuple] = []
+        open_groups: Dict[tuple, List[TelegramNotification]] = {}
+        for message in messages:
+            key = (message.telegram_id, message.notification_type, message.parse_mode)
+            group = open_groups.get(key)
+            if group is None or message.created_at >= group[0].created_at + window:
+                group = [message]
+                open_groups[key] = group
+                groups.append((key, group))
+            else:
+                group.append(message)
+
+        coalesced = 0
+        for (telegram_id, notification_type, parse_mode), group in groups:
+            # Окно еще не прошло - в группу могут прийти новые сообщения
+            if len(group) < 2 or group[0].created_at > cutoff:
+                continue
+
+            header = TelegramQueueService.DIGEST_HEADERS.get(notification_type, "🔔 <b>Уведомления</b>")
+            if parse_mode != "HTML":
+                header = header.replace("<b>", "*").replace("</b>", "*")
+
+            # Режем группу на части, чтобы дайджест влезал в одно сообщение Telegram
+            chunks: List[List[TelegramNotification]] = [[]]
+            length = len(header)
+            for message in group:
+                extra = len(TelegramQueueService.DIGEST_SEPARATOR) + len(message.message_text)
+                if chunks[-1] and length + extra > TelegramQueueService.MAX_MESSAGE_LENGTH:
+                    chunks.append([])
+                    length = len(header)
+                chunks[-1].append(message)
+                length += extra
+
+            for chunk in chunks:
+                if len(chunk) < 2:
+                    continue
+
+                digest_text = header + TelegramQueueService.DIGEST_SEPARATOR + \
+                    TelegramQueueService.DIGEST_SEPARATOR.join(m.message_text for m in chunk)
+
+                db.add(TelegramNotification(
+                    telegram_id=telegram_id,
+                    user_id=chunk[0].user_id,
+                    message_text=digest_text,
+                    parse_mode=parse_mode,
+                    notification_type=notification_type,
+                    status=NotificationStatus.PENDING,
+                    created_at=chunk[0].created_at,
+                    notification_metadata=json.dumps({"coalesced_ids": [m.id for m in chunk]})
+                ))
+                for message in chunk:
+                    await db.delete(message)
+                coalesced += len(chunk)
+
+        await db.commit()
+        return coalesced
+
     @staticmethod
     async def mark_processing(
         db: AsyncSession,
@@ -163,74 +344,246 @@ class TelegramQueueService:
             message.last_error_at = datetime.now(timezone.utc)
             await db.commit()
 
+    @staticmethod
+    async def _get_partition_days(db: AsyncSession) -> Dict[date, str]:
+        """Получить существующие дневные партиции очереди {день: имя таблицы}"""
+        result = await db.execute(
+            text("""
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = :parent
+            """),
+            {"parent": TelegramNotification.__tablename__}
+        )
+
+        partitions = {}
+        for (name,) in result.all():
+            if not name.startswith(TelegramQueueService.PARTITION_PREFIX):
+                continue
+            try:
+                day = datetime.strptime(name[len(TelegramQueueService.PARTITION_PREFIX):], "%Y%m%d").date()
+            except ValueError:
+                continue
+            partitions[day] = name
+
+        return partitions
+
+    @staticmethod
+    async def ensure_partitions(
+        db: AsyncSession,
+        days_ahead: int = 7
+    ) -> int:
+        """
+        Создать дневные партиции очереди на N дней вперед
+
+        Args:
+            db: Database session
+            days_ahead: На сколько дней вперед создавать партиции
+
+        Returns:
+            Количество созданных партиций
+        """
+        existing = await TelegramQueueService._get_partition_days(db)
+        today = datetime.now(timezone.utc).date()
+        created = 0
+
+        for offset in range(days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if day in existing:
+                continue
+
+            next_day = day + timedelta(days=1)
+            try:
+                await db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {TelegramQueueService.PARTITION_PREFIX}{day:%Y%m%d} "
+                    f"PARTITION OF {TelegramNotification.__tablename__} "
+                    f"FOR VALUES FROM ('{day} 00:00:00+00') TO ('{next_day} 00:00:00+00')"
+                ))
+                await db.commit()
+                created += 1
+            except Exception as e:
+                # Например, строки за этот день уже лежат в DEFAULT партиции
+                await db.rollback()
+                logger.error(f"❌ Не удалось создать партицию очереди за {day}: {e}")
+
+        return created
+
     @staticmethod
     async def cleanup_old_messages(
         db: AsyncSession,
         days: int = 7
     ) -> int:
         """
-        Удалить старые отправленные сообщения
+        Удалить старые сообщения целыми дневными партициями
+
+        Вместо построчного DELETE партиция отсоединяется (DETACH) и удаляется (DROP),
+        это не оставляет мертвых строк и не нагружает autovacuum. Партиции,
+        в которых еще остались неотправленные сообщения, пропускаются.
+        Строки, попавшие в DEFAULT партицию, удаляются DELETE пачками.
 
         Args:
             db: Database session
-            days: Удалить сообщения старше N дней
+            days: Удалить партиции старше N дней
 
         Returns:
-            Количество удаленных сообщений
+            Количество удаленных партиций
         """
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+        cutoff_day = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+        partitions = await TelegramQueueService._get_partition_days(db)
+        dropped = 0
+
+        for day, name in sorted(partitions.items()):
+            if day >= cutoff_day:
+                break
+
+            unfinished = await db.scalar(text(
+                f"SELECT count(*) FROM {name} "
+                f"WHERE status NOT IN ('{NotificationStatus.SENT.name}', '{NotificationStatus.PERMANENT_FAILURE.name}')"
+            ))
+            if unfinished:
+                logger.warning(f"⚠️ Партиция {name} содержит {unfinished} незавершенных сообщений, пропускаем")
+                continue
+
+            try:
+                await db.execute(text(f"ALTER TABLE {TelegramNotification.__tablename__} DETACH PARTITION {name}"))
+                await db.execute(text(f"DROP TABLE {name}"))
+                await db.commit()
+                dropped += 1
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"❌ Не удалось удалить партицию {name}: {e}")
+
+        await TelegramQueueService._cleanup_default_partition(db, cutoff_day)
+        return dropped
 
-        # Удаляем только отправленные и permanent_failure
-        result = await db.execute(
-            delete(TelegramNotification).where(
-                and_(
-                    or_(
-                        TelegramNotification.status == NotificationStatus.SENT,
-                        TelegramNotification.status == NotificationStatus.PERMANENT_FAILURE
-                    ),
-                    TelegramNotification.created_at < cutoff_date
+    @staticmethod
+    async def _cleanup_default_partition(db: AsyncSession, cutoff_day: date) -> int:
+        """
+        Удалить завершенные сообщения старше cutoff_day из DEFAULT партиции
+
+        Пачки по CLEANUP_BATCH_SIZE строк, commit после каждой.
+
+        Returns:
+            Количество удаленных строк
+        """
+        cutoff = datetime.combine(cutoff_day, datetime.min.time(), tzinfo=timezone.utc)
+        deleted = 0
+
+        while True:
+            try:
+                result = await db.execute(
+                    text(f"""
+                        DELETE FROM {TelegramQueueService.DEFAULT_PARTITION}
+                        WHERE ctid IN (
+                            SELECT ctid FROM {TelegramQueueService.DEFAULT_PARTITION}
+                            WHERE created_at < :cutoff
+                              AND status IN ('{NotificationStatus.SENT.name}', '{NotificationStatus.PERMANENT_FAILURE.name}')
+                            LIMIT :limit
+                        )
+                    """),
+                    {
+                        "cutoff": cutoff,
+                        "limit": TelegramQueueService.CLEANUP_BATCH_SIZE,
+                    }
                 )
-            )
-        )
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"❌ Не удалось очистить DEFAULT партицию: {e}")
+                break
 
-        await db.commit()
-        return result.rowcount
+            deleted += result.rowcount or 0
+            if (result.rowcount or 0) < TelegramQueueService.CLEANUP_BATCH_SIZE:
+                break
+
+        if deleted:
+            logger.info(f"🧹 DEFAULT партиция: удалено {deleted} старых сообщений")
+        return deleted
 
     @staticmethod
-    async def get_queue_stats(db: AsyncSession) -> Dict:
-        """Получить статистику очереди"""
-        total_count = await db.scalar(
-            select(func.count(TelegramNotification.id))
-        )
+    async def get_queue_stats(db: AsyncSession, use_cache: bool = True) -> Dict:
+        """
+        Получить статистику очереди
 
-        pending_count = await db.scalar(
-            select(func.count(TelegramNotification.id)).where(
-                TelegramNotification.status == NotificationStatus.PENDING
+        Счетчики по статусам и типам считаются одним GROUP BY проходом,
+        результат кэшируется в Redis на STATS_CACHE_TTL секунд.
+
+        Args:
+            db: Database session
+            use_cache: Использовать кэшированный снимок статистики
+
+        Returns:
+            Счетчики по статусам, разбивка по типам, throughput (sent/min)
+            и возраст самого старого pending сообщения
+        """
+        redis = None
+        if use_cache:
+            try:
+                redis = await get_redis()
+                cached = await redis.get(TelegramQueueService.STATS_CACHE_KEY)
+                if cached:
+                    return json.loads(cached)
+            except Exception as e:
+                logger.warning(f"⚠️ Redis недоступен для статистики очереди: {e}")
+                redis = None
+
+        now = datetime.now(timezone.utc)
+
+        counts = await db.execute(
+            select(
+                TelegramNotification.status,
+                TelegramNotification.notification_type,
+                func.count()
+            ).group_by(
+                TelegramNotification.status,
+                TelegramNotification.notification_type
             )
         )
 
-        processing_count = await db.scalar(
-            select(func.count(TelegramNotification.id)).where(
-                TelegramNotification.status == NotificationStatus.PROCESSING
+        stats = {status.value.lower(): 0 for status in NotificationStatus}
+        by_type: Dict[str, Dict[str, int]] = {}
+        for status, notification_type, count in counts.all():
+            stats[status.value.lower()] += count
+            type_stats = by_type.setdefault(notification_type.value.lower(), {})
+            type_stats[status.value.lower()] = count
+
+        # Самое старое pending сообщение берется из partial индекса незавершенных
+        oldest_pending = await db.scalar(
+            select(func.min(TelegramNotification.created_at)).where(
+                TelegramNotification.status == NotificationStatus.PENDING
             )
         )
 
-        sent_count = await db.scalar(
-            select(func.count(TelegramNotification.id)).where(
-                TelegramNotification.status == NotificationStatus.SENT
+        throughput_window = TelegramQueueService.THROUGHPUT_WINDOW_MINUTES
+        sent_recently = await db.scalar(
+            select(func.count()).where(
+                and_(
+                    TelegramNotification.status == NotificationStatus.SENT,
+                    # По времени отправки: повторы и отложенные сообщения
+                    # могли быть созданы сколь угодно давно
+                    TelegramNotification.sent_at >= now - timedelta(minutes=throughput_window)
+                )
             )
         )
 
-        failed_count = await db.scalar(
-            select(func.count(TelegramNotification.id)).where(
-                TelegramNotification.status == NotificationStatus.FAILED
-            )
+        stats["total"] = sum(stats.values())
+        stats["by_type"] = by_type
+        stats["sent_per_minute"] = round((sent_recently or 0) / throughput_window, 2)
+        stats["oldest_pending_age_seconds"] = (
+            int((now - oldest_pending).total_seconds()) if oldest_pending else None
         )
+        stats["generated_at"] = now.isoformat()
+
+        if redis is not None:
+            try:
+                await redis.set(
+                    TelegramQueueService.STATS_CACHE_KEY,
+                    json.dumps(stats),
+                    ex=TelegramQueueService.STATS_CACHE_TTL
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось закэшировать статистику очереди: {e}")
 
-        return {
-            "total": total_count or 0,
-            "pending": pending_count or 0,
-            "processing": processing_count or 0,
-            "sent": sent_count or 0,
-            "failed": failed_count or 0
-        }
+        return stats
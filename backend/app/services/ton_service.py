@@ -9,21 +9,50 @@ TON Blockchain Service
 """
 
 import aiohttp
+import asyncio
+import json
 import logging
+import random
+import time
 from decimal import Decimal
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime
 
+from app.core.config import settings
+from app.core.redis import get_redis
+
 logger = logging.getLogger(__name__)
 
 
+class TonAPIError(Exception):
+    """TonAPI недоступен (сеть, 429/5xx после повторов или открыт circuit breaker)"""
+
+
 class TONService:
     """
     Сервис для работы с TON blockchain через TonAPI
 
+    Один экземпляр на процесс (get_ton_service): общая aiohttp сессия с пулом
+    соединений, таймауты, не больше TON_API_CONCURRENCY запросов одновременно,
+    повторы с экспоненциальной задержкой на 429/5xx и circuit breaker после
+    серии ошибок. Аккаунты кэшируются в Redis на ACCOUNT_CACHE_TTL, завершенные
+    события по хэшу - надолго (они неизменяемы).
+
     TonAPI docs: https://docs.tonconsole.com/tonapi/api-v2
     """
 
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    BACKOFF_BASE = 0.5  # секунд, удваивается с каждой попыткой
+    BACKOFF_MAX = 8.0  # секунд
+
+    BREAKER_THRESHOLD = 5  # ошибок подряд до размыкания
+    BREAKER_COOLDOWN = 30  # секунд без запросов после размыкания
+
+    ACCOUNT_CACHE_KEY = "ton:account:{address}"
+    ACCOUNT_CACHE_TTL = 30  # секунд
+    EVENT_CACHE_KEY = "ton:event:{event_id}"
+    EVENT_CACHE_TTL = 7 * 86400  # секунд, завершенные события не меняются
+
     def __init__(self, api_url: str, api_key: Optional[str] = None):
         """
         Initialize TON Service
@@ -35,6 +64,170 @@ class TONService:
         self.base_url = api_url.rstrip('/')
         self.api_key = api_key
 
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self._get_headers(),
+                timeout=aiohttp.ClientTimeout(
+                    total=settings.TON_API_TIMEOUT_SECONDS,
+                    connect=min(5, settings.TON_API_TIMEOUT_SECONDS)
+                ),
+                connector=aiohttp.TCPConnector(limit=settings.TON_API_CONCURRENCY, ttl_dns_cache=300)
+            )
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.TON_API_CONCURRENCY)
+        return self._semaphore
+
+    async def close(self) -> None:
+        """Закрыть HTTP сессию (при остановке приложения)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.BACKOFF_MAX)
+            except ValueError:
+                pass
+        delay = min(self.BACKOFF_BASE * (2 ** attempt), self.BACKOFF_MAX)
+        return delay * (0.5 + random.random() / 2)
+
+    def _record_success(self) -> None:
+        self._failures = 0
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.BREAKER_THRESHOLD:
+            self._open_until = time.monotonic() + self.BREAKER_COOLDOWN
+            logger.error(f"🔌 TonAPI: {self._failures} ошибок подряд, запросы приостановлены на {self.BREAKER_COOLDOWN}с")
+
+    async def _request(self, path: str, params: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+        """
+        GET к TonAPI с повторами
+
+        Returns:
+            (HTTP статус, JSON или текст ответа) для любого статуса кроме 429/5xx
+
+        Raises:
+            TonAPIError: сеть/429/5xx после всех повторов или открыт circuit breaker
+        """
+        if time.monotonic() < self._open_until:
+            raise TonAPIError("TonAPI temporarily unavailable (circuit open)")
+
+        url = f"{self.base_url}{path}"
+        last_error = None
+
+        for attempt in range(settings.TON_API_MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                async with self._get_semaphore():
+                    async with self._get_session().get(url, params=params) as response:
+                        if response.status not in self.RETRY_STATUSES:
+                            self._record_success()
+                            if response.content_type == "application/json":
+                                return response.status, await response.json()
+                            return response.status, await response.text()
+
+                        retry_after = response.headers.get("Retry-After")
+                        last_error = f"TonAPI error: {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = f"Network error: {e or type(e).__name__}"
+
+            if attempt < settings.TON_API_MAX_RETRIES:
+                delay = self._backoff(attempt, retry_after)
+                logger.warning(f"⚠️ {last_error} ({path}), повтор через {delay:.1f}с")
+                await asyncio.sleep(delay)
+
+        self._record_failure()
+        raise TonAPIError(last_error)
+
+    @staticmethod
+    async def _cache_get(key: str) -> Optional[Any]:
+        try:
+            redis = await get_redis()
+            cached = await redis.get(key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен для кэша TonAPI: {e}")
+            return None
+
+    @staticmethod
+    async def _cache_set(key: str, value: Any, ttl: int) -> None:
+        try:
+            redis = await get_redis()
+            await redis.set(key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось закэшировать ответ TonAPI: {e}")
+
+    async def _get_account(self, address: str) -> Optional[Dict[str, Any]]:
+        """Сырые данные /accounts/{address} (кэш ACCOUNT_CACHE_TTL)"""
+        key = self.ACCOUNT_CACHE_KEY.format(address=address)
+        cached = await self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        status, data = await self._request(f"/accounts/{address}")
+        if status != 200:
+            logger.error(f"Failed to get account {address}: {status}")
+            return None
+
+        await self._cache_set(key, data, self.ACCOUNT_CACHE_TTL)
+        return data
+
+    async def get_event(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Событие по хэшу (/events/{event_id})
+
+        Завершенные события (in_progress = false) кэшируются надолго,
+        незавершенные не кэшируются.
+
+        Returns:
+            JSON события или None, если не найдено
+
+        Raises:
+            TonAPIError: TonAPI недоступен
+        """
+        key = self.EVENT_CACHE_KEY.format(event_id=event_id)
+        cached = await self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        status, data = await self._request(f"/events/{event_id}")
+        if status == 404:
+            return None
+        if status != 200:
+            raise TonAPIError(f"TonAPI error: {status}")
+
+        if data.get("event", data).get("in_progress") is False:
+            await self._cache_set(key, data, self.EVENT_CACHE_TTL)
+        return data
+
+    async def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Дерево транзакций по хэшу события или транзакции (/traces/{trace_id})
+
+        Returns:
+            JSON трейса или None, если не найден
+
+        Raises:
+            TonAPIError: TonAPI недоступен
+        """
+        status, data = await self._request(f"/traces/{trace_id}")
+        if status == 404:
+            return None
+        if status != 200:
+            raise TonAPIError(f"TonAPI error: {status}")
+        return data
+
     def _get_headers(self) -> Dict[str, str]:
         """Get HTTP headers with optional API key"""
         headers = {
@@ -63,6 +256,34 @@ class TONService:
         """
         return int(ton * Decimal(10**9))
 
+    async def get_account_transactions(
+        self,
+        address: str,
+        after_lt: Optional[int] = None,
+        limit: int = 100,
+        sort_order: str = "asc"
+    ) -> list:
+        """
+        Транзакции аккаунта по logical time (/blockchain/accounts/{address}/transactions)
+
+        Args:
+            address: Адрес аккаунта
+            after_lt: Только транзакции с lt больше указанного
+            limit: Размер страницы (TonAPI максимум 1000)
+            sort_order: asc (от старых к новым) или desc
+
+        Raises:
+            TonAPIError: TonAPI недоступен или вернул ошибку
+        """
+        params: Dict[str, Any] = {"limit": limit, "sort_order": sort_order}
+        if after_lt:
+            params["after_lt"] = after_lt
+
+        status, data = await self._request(f"/blockchain/accounts/{address}/transactions", params)
+        if status != 200:
+            raise TonAPIError(f"TonAPI error: {status}")
+        return data.get("transactions", [])
+
     async def verify_transaction(
         self,
         tx_hash: str,
@@ -96,96 +317,83 @@ class TONService:
             # Note: tx_hash должен быть в формате hash:lt:address
             # Для упрощения используем событие по хэшу
 
-            url = f"{self.base_url}/events/{tx_hash}"
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self._get_headers()) as response:
-                    if response.status == 404:
-                        return {
-                            "valid": False,
-                            "error": "Transaction not found on blockchain"
-                        }
-
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"TonAPI error: {response.status} - {error_text}")
-                        return {
-                            "valid": False,
-                            "error": f"TonAPI error: {response.status}"
-                        }
-
-                    data = await response.json()
-
-                    # Parse transaction data
-                    event = data.get("event", {})
-                    actions = event.get("actions", [])
-
-                    if not actions:
-                        return {
-                            "valid": False,
-                            "error": "No actions found in transaction"
-                        }
-
-                    # Найти действие перевода TON
-                    ton_transfer = None
-                    for action in actions:
-                        if action.get("type") == "TonTransfer":
-                            ton_transfer = action.get("TonTransfer", {})
-                            break
-
-                    if not ton_transfer:
-                        return {
-                            "valid": False,
-                            "error": "No TON transfer found in transaction"
-                        }
-
-                    # Извлечь данные
-                    sender = ton_transfer.get("sender", {}).get("address", "")
-                    recipient = ton_transfer.get("recipient", {}).get("address", "")
-                    amount_nanoton = int(ton_transfer.get("amount", 0))
-                    amount_ton = self.nanoton_to_ton(amount_nanoton)
-
-                    timestamp = event.get("timestamp", 0)
-                    is_successful = event.get("in_progress", True) == False
-
-                    # Проверка получателя
-                    if recipient.lower() != expected_destination.lower():
-                        return {
-                            "valid": False,
-                            "error": f"Wrong recipient. Expected: {expected_destination}, Got: {recipient}",
-                            "amount": amount_ton,
-                            "sender": sender,
-                            "recipient": recipient
-                        }
-
-                    # Проверка суммы (с учетом tolerance)
-                    amount_diff = abs(amount_ton - expected_amount)
-                    if amount_diff > tolerance:
-                        return {
-                            "valid": False,
-                            "error": f"Amount mismatch. Expected: {expected_amount}, Got: {amount_ton}",
-                            "amount": amount_ton,
-                            "sender": sender,
-                            "recipient": recipient
-                        }
-
-                    # Все проверки пройдены
-                    return {
-                        "valid": True,
-                        "amount": amount_ton,
-                        "sender": sender,
-                        "recipient": recipient,
-                        "timestamp": timestamp,
-                        "confirmations": 1,  # TonAPI показывает только подтвержденные транзакции
-                        "success": is_successful,
-                        "error": None
-                    }
-
-        except aiohttp.ClientError as e:
-            logger.error(f"Network error while verifying transaction: {e}")
+            data = await self.get_event(tx_hash)
+            if data is None:
+                return {
+                    "valid": False,
+                    "error": "Transaction not found on blockchain"
+                }
+
+            # Событие может прийти как есть или обернутым в "event"
+            event = data.get("event", data)
+            actions = event.get("actions", [])
+
+            if not actions:
+                return {
+                    "valid": False,
+                    "error": "No actions found in transaction"
+                }
+
+            # Найти действие перевода TON
+            ton_transfer = None
+            for action in actions:
+                if action.get("type") == "TonTransfer":
+                    ton_transfer = action.get("TonTransfer", {})
+                    break
+
+            if not ton_transfer:
+                return {
+                    "valid": False,
+                    "error": "No TON transfer found in transaction"
+                }
+
+            # Извлечь данные
+            sender = ton_transfer.get("sender", {}).get("address", "")
+            recipient = ton_transfer.get("recipient", {}).get("address", "")
+            amount_nanoton = int(ton_transfer.get("amount", 0))
+            amount_ton = self.nanoton_to_ton(amount_nanoton)
+
+            timestamp = event.get("timestamp", 0)
+            is_successful = event.get("in_progress", True) == False
+
+            # Проверка получателя
+            if recipient.lower() != expected_destination.lower():
+                return {
+                    "valid": False,
+                    "error": f"Wrong recipient. Expected: {expected_destination}, Got: {recipient}",
+                    "amount": amount_ton,
+                    "sender": sender,
+                    "recipient": recipient
+                }
+
+            # Проверка суммы (с учетом tolerance)
+            amount_diff = abs(amount_ton - expected_amount)
+            if amount_diff > tolerance:
+                return {
+                    "valid": False,
+                    "error": f"Amount mismatch. Expected: {expected_amount}, Got: {amount_ton}",
+                    "amount": amount_ton,
+                    "sender": sender,
+                    "recipient": recipient
+                }
+
+            # Все проверки пройдены
+            return {
+                "valid": True,
+                "amount": amount_ton,
+                "sender": sender,
+                "recipient": recipient,
+                "timestamp": timestamp,
+                "confirmations": 1,  # TonAPI показывает только подтвержденные транзакции
+                "success": is_successful,
+                "error": None
+            }
+
+        except TonAPIError as e:
+            logger.error(f"TonAPI unavailable while verifying transaction: {e}")
             return {
                 "valid": False,
-                "error": f"Network error: {str(e)}"
+                "error": str(e)
             }
         except Exception as e:
             logger.error(f"Error verifying transaction: {e}", exc_info=True)
@@ -205,18 +413,11 @@ class TONService:
             Balance in TON or None if error
         """
         try:
-            url = f"{self.base_url}/accounts/{address}"
+            data = await self._get_account(address)
+            if data is None:
+                return None
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self._get_headers()) as response:
-                    if response.status != 200:
-                        logger.error(f"Failed to get balance for {address}: {response.status}")
-                        return None
-
-                    data = await response.json()
-                    balance_nanoton = int(data.get("balance", 0))
-
-                    return self.nanoton_to_ton(balance_nanoton)
+            return self.nanoton_to_ton(int(data.get("balance", 0)))
 
         except Exception as e:
             logger.error(f"Error getting wallet balance: {e}")
@@ -233,21 +434,16 @@ class TONService:
             Account information or None if error
         """
         try:
-            url = f"{self.base_url}/accounts/{address}"
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self._get_headers()) as response:
-                    if response.status != 200:
-                        return None
-
-                    data = await response.json()
+            data = await self._get_account(address)
+            if data is None:
+                return None
 
-                    return {
-                        "address": data.get("address"),
-                        "balance": self.nanoton_to_ton(int(data.get("balance", 0))),
-                        "status": data.get("status"),
-                        "is_wallet": data.get("is_wallet", False)
-                    }
+            return {
+                "address": data.get("address"),
+                "balance": self.nanoton_to_ton(int(data.get("balance", 0))),
+                "status": data.get("status"),
+                "is_wallet": data.get("is_wallet", False)
+            }
 
         except Exception as e:
             logger.error(f"Error getting account info: {e}")
@@ -294,3 +490,25 @@ class TONService:
                     return False
 
         return False
+
+
+_ton_service: Optional[TONService] = None
+
+
+def get_ton_service() -> TONService:
+    """Общий экземпляр TONService (один пул соединений и circuit breaker на процесс)"""
+    global _ton_service
+    if _ton_service is None:
+        _ton_service = TONService(
+            api_url=settings.TON_API_URL,
+            api_key=settings.TON_API_KEY or None
+        )
+    return _ton_service
+
+
+async def close_ton_service() -> None:
+    """Закрыть общий экземпляр (при остановке приложения)"""
+    global _ton_service
+    if _ton_service is not None:
+        await _ton_service.close()
+        _ton_service = None
@@ -0,0 +1,74 @@
+"""
+Trending Service - Трендовый рейтинг рынков с затуханием по времени
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from app.core.config import settings
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+import math
+
+
+class TrendingService:
+    """
+    Трендовый рейтинг: сумма весов событий (ставки, просмотры), затухающая
+    экспоненциально с периодом полураспада TRENDING_HALF_LIFE_HOURS
+
+    Вместо уменьшения всех рейтингов со временем растет вес новых событий:
+    событие в момент t дает вклад w * exp(t / tau). В колонке хранится
+    логарифм суммы (log-sum-exp), поэтому порядок сортировки совпадает
+    с порядком затухающих сумм, а обновление - один UPDATE строки рынка
+    без фоновых пересчетов.
+    """
+
+    EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    BET_WEIGHT = 1.0
+    VIEW_WEIGHT = 0.1
+
+    @staticmethod
+    def _tau_seconds() -> float:
+        return settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+    @staticmethod
+    def event_score(weight: float, moment: Optional[datetime] = None) -> float:
+        """Логарифм вклада события с весом weight в момент moment"""
+        moment = moment or datetime.now(timezone.utc)
+        return math.log(weight) + (moment - TrendingService.EPOCH).total_seconds() / TrendingService._tau_seconds()
+
+    @staticmethod
+    def bet_weight(amount: Decimal, currency: str) -> float:
+        """Вес ставки: сама ставка + логарифм объема (в PRED эквиваленте)"""
+        amount_pred = float(amount) * (settings.TON_TO_PRED_RATE if currency == "TON" else 1)
+        return TrendingService.BET_WEIGHT + math.log1p(amount_pred) / 10
+
+    @staticmethod
+    async def bump(db: AsyncSession, market_id: int, weight: float) -> None:
+        """
+        Добавить событие к рейтингу рынка (без commit)
+
+        score = log(exp(score) + exp(event)) без переполнения:
+        max(a, b) + ln(1 + exp(-|a - b|))
+        """
+        await db.execute(
+            text("""
+                UPDATE markets
+                SET trending_score = CASE
+                    WHEN trending_score IS NULL THEN :event
+                    ELSE GREATEST(trending_score, :event) + ln(1 + exp(-abs(trending_score - :event)))
+                END
+                WHERE id = :market_id
+            """),
+            {"market_id": market_id, "event": TrendingService.event_score(weight)}
+        )
+
+    @staticmethod
+    async def record_bet(db: AsyncSession, market_id: int, amount: Decimal, currency: str) -> None:
+        """Учесть ставку в трендовом рейтинге"""
+        await TrendingService.bump(db, market_id, TrendingService.bet_weight(amount, currency))
+
+    @staticmethod
+    async def record_view(db: AsyncSession, market_id: int) -> None:
+        """Учесть просмотр в трендовом рейтинге"""
+        await TrendingService.bump(db, market_id, TrendingService.VIEW_WEIGHT)
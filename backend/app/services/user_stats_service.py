@@ -0,0 +1,247 @@
+"""
+User Stats Service - Поддержка денормализованной статистики пользователей
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.postgresql import insert
+from app.models.user_stats import UserStats
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UserStatsService:
+    """Сервис статистики пользователей (user_stats)"""
+
+    ALL_TIME_KEY = "all"
+
+    @staticmethod
+    def week_key(moment: datetime) -> str:
+        """Ключ недели: понедельник недели по UTC"""
+        moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment
+        monday = (moment - timedelta(days=moment.weekday())).date()
+        return f"week:{monday.isoformat()}"
+
+    @staticmethod
+    def month_key(moment: datetime) -> str:
+        """Ключ месяца по UTC"""
+        moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment
+        return f"month:{moment:%Y-%m}"
+
+    @staticmethod
+    def period_key(period_type: str, moment: datetime) -> str:
+        """Ключ недели или месяца (period_type: week или month), в который попадает moment"""
+        if period_type == "week":
+            return UserStatsService.week_key(moment)
+        return UserStatsService.month_key(moment)
+
+    @staticmethod
+    def _keys_for(moment: datetime) -> List[str]:
+        return [
+            UserStatsService.ALL_TIME_KEY,
+            UserStatsService.week_key(moment),
+            UserStatsService.month_key(moment),
+        ]
+
+    @staticmethod
+    async def record_bet_placed(
+        db: AsyncSession,
+        user_id: int,
+        amount: Decimal,
+        currency: str,
+        created_at: Optional[datetime] = None
+    ) -> None:
+        """
+        Учесть новую ставку (без commit - в транзакции вызывающего кода)
+
+        Args:
+            db: Database session
+            user_id: ID пользователя
+            amount: Сумма ставки
+            currency: PRED или TON
+            created_at: Время ставки (по умолчанию сейчас)
+        """
+        moment = created_at or datetime.now(timezone.utc)
+        volume_pred = amount if currency == "PRED" else Decimal("0")
+        volume_ton = amount if currency == "TON" else Decimal("0")
+
+        stmt = insert(UserStats).values([
+            {
+                "user_id": user_id,
+                "period_key": key,
+                "realized_profit": Decimal("0"),
+                "volume_pred": volume_pred,
+                "volume_ton": volume_ton,
+                "bets_count": 1,
+                "wins": 0,
+                "losses": 0,
+                "current_streak": 0,
+                "best_streak": 0,
+            }
+            for key in UserStatsService._keys_for(moment)
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id, UserStats.period_key],
+            set_={
+                "volume_pred": UserStats.volume_pred + stmt.excluded.volume_pred,
+                "volume_ton": UserStats.volume_ton + stmt.excluded.volume_ton,
+                "bets_count": UserStats.bets_count + 1,
+                "updated_at": func.now(),
+            }
+        )
+        await db.execute(stmt)
+
+    @staticmethod
+    async def record_bets_resolved(
+        db: AsyncSession,
+        results: Iterable[Tuple[int, datetime, bool, Decimal]]
+    ) -> None:
+        """
+        Учесть результаты разрешения рынка (без commit)
+
+        Args:
+            db: Database session
+            results: (user_id, bet.created_at, выиграла ли ставка, profit) в порядке обработки
+        """
+        # Агрегируем по (user_id, period_key), сохраняя исходы в порядке ставок
+        rows: Dict[Tuple[int, str], Dict] = {}
+        outcomes: Dict[Tuple[int, str], List[bool]] = {}
+        for user_id, created_at, won, profit in results:
+            for key in UserStatsService._keys_for(created_at):
+                row = rows.setdefault((user_id, key), {
+                    "user_id": user_id,
+                    "period_key": key,
+                    "realized_profit": Decimal("0"),
+                    "volume_pred": Decimal("0"),
+                    "volume_ton": Decimal("0"),
+                    "bets_count": 0,
+                    "wins": 0,
+                    "losses": 0,
+                    "current_streak": 0,
+                    "best_streak": 0,
+                })
+                row["realized_profit"] += profit
+                row["wins" if won else "losses"] += 1
+                outcomes.setdefault((user_id, key), []).append(won)
+
+        if not rows:
+            return
+
+        # Счетчики прибавляются upsert'ом; он же блокирует строки до конца
+        # транзакции и возвращает сохраненные серии (0 для новых строк)
+        stmt = insert(UserStats).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserStats.user_id, UserStats.period_key],
+            set_={
+                "realized_profit": UserStats.realized_profit + stmt.excluded.realized_profit,
+                "wins": UserStats.wins + stmt.excluded.wins,
+                "losses": UserStats.losses + stmt.excluded.losses,
+                "updated_at": func.now(),
+            }
+        ).returning(UserStats.user_id, UserStats.period_key, UserStats.current_streak, UserStats.best_streak)
+        stored = (await db.execute(stmt)).all()
+
+        # Исходы пакета применяются по порядку к сохраненной серии: победы
+        # до первого проигрыша продолжают ее и учитываются в best_streak
+        streaks = []
+        for user_id, period_key, current_streak, best_streak in stored:
+            current_streak = current_streak or 0
+            best_streak = best_streak or 0
+            for won in outcomes[(user_id, period_key)]:
+                current_streak = current_streak + 1 if won else 0
+                best_streak = max(best_streak, current_streak)
+            streaks.append((user_id, period_key, current_streak, best_streak))
+
+        await db.execute(
+            text("""
+                UPDATE user_stats s
+                SET current_streak = v.current_streak, best_streak = v.best_streak
+                FROM unnest(
+                    CAST(:user_ids AS BIGINT[]), CAST(:period_keys AS VARCHAR[]),
+                    CAST(:current_streaks AS INTEGER[]), CAST(:best_streaks AS INTEGER[])
+                ) AS v(user_id, period_key, current_streak, best_streak)
+                WHERE s.user_id = v.user_id AND s.period_key = v.period_key
+            """),
+            {
+                "user_ids": [row[0] for row in streaks],
+                "period_keys": [row[1] for row in streaks],
+                "current_streaks": [row[2] for row in streaks],
+                "best_streaks": [row[3] for row in streaks],
+            }
+        )
+
+    @staticmethod
+    async def get_profit(db: AsyncSession, user_id: int, period_key: str = ALL_TIME_KEY) -> Decimal:
+        """Реализованный профит пользователя (поиск по первичному ключу)"""
+        profit = await db.scalar(
+            select(UserStats.realized_profit).where(
+                UserStats.user_id == user_id,
+                UserStats.period_key == period_key
+            )
+        )
+        return profit or Decimal("0.00")
+
+    @staticmethod
+    async def reconcile(db: AsyncSession) -> int:
+        """
+        Сверить счетчики user_stats с таблицей bets
+
+        Пересчитывает профит, объемы и количество ставок/побед/поражений
+        одним set-based запросом по bets и archived_bets. Серии побед
+        не пересчитываются.
+
+        Returns:
+            Количество исправленных строк
+        """
+        result = await db.execute(text("""
+            WITH actual AS (
+                SELECT
+                    b.user_id,
+                    k.period_key,
+                    COALESCE(SUM(CASE WHEN b.status = 'WON' THEN b.payout - b.amount
+                                      WHEN b.status = 'LOST' THEN -b.amount ELSE 0 END), 0) AS realized_profit,
+                    COALESCE(SUM(b.amount) FILTER (WHERE b.currency = 'PRED'), 0) AS volume_pred,
+                    COALESCE(SUM(b.amount) FILTER (WHERE b.currency = 'TON'), 0) AS volume_ton,
+                    COUNT(*) AS bets_count,
+                    COUNT(*) FILTER (WHERE b.status = 'WON') AS wins,
+                    COUNT(*) FILTER (WHERE b.status = 'LOST') AS losses
+                FROM (
+                    SELECT user_id, status::text AS status, currency::text AS currency, amount, payout, created_at
+                    FROM bets
+                    UNION ALL
+                    -- Заархивированные ставки тоже входят в статистику
+                    SELECT user_id, upper(status), currency, amount, payout, created_at
+                    FROM archived_bets
+                ) b
+                CROSS JOIN LATERAL (VALUES
+                    ('all'),
+                    ('week:' || to_char(date_trunc('week', b.created_at AT TIME ZONE 'UTC'), 'YYYY-MM-DD')),
+                    ('month:' || to_char(b.created_at AT TIME ZONE 'UTC', 'YYYY-MM'))
+                ) AS k(period_key)
+                GROUP BY b.user_id, k.period_key
+            )
+            INSERT INTO user_stats AS s (user_id, period_key, realized_profit, volume_pred, volume_ton, bets_count, wins, losses)
+            SELECT user_id, period_key, realized_profit, volume_pred, volume_ton, bets_count, wins, losses
+            FROM actual
+            ON CONFLICT (user_id, period_key) DO UPDATE SET
+                realized_profit = EXCLUDED.realized_profit,
+                volume_pred = EXCLUDED.volume_pred,
+                volume_ton = EXCLUDED.volume_ton,
+                bets_count = EXCLUDED.bets_count,
+                wins = EXCLUDED.wins,
+                losses = EXCLUDED.losses,
+                updated_at = now()
+            WHERE (s.realized_profit, s.volume_pred, s.volume_ton, s.bets_count, s.wins, s.losses)
+                IS DISTINCT FROM
+                  (EXCLUDED.realized_profit, EXCLUDED.volume_pred, EXCLUDED.volume_ton,
+                   EXCLUDED.bets_count, EXCLUDED.wins, EXCLUDED.losses)
+        """))
+        await db.commit()
+
+        fixed = result.rowcount or 0
+        if fixed:
+            logger.warning(f"⚠️ user_stats: исправлено {fixed} расхождений с bets")
+        return fixed
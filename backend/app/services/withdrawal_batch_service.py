@@ -0,0 +1,246 @@
+"""
+Withdrawal Batch Service - Пакетная обработка заявок на вывод
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from app.models.telegram_notification import NotificationType
+from app.services.ledger_service import LedgerService
+from app.services.telegram_queue_service import TelegramQueueService
+from decimal import Decimal
+from typing import Dict, List, Optional
+import html
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WithdrawalBatchService:
+    """
+    Обработка заявок на вывод пачкой
+
+    Порядок работы админа:
+    1. export_payout - заявки PENDING переводятся в PROCESSING, формируется
+       файл выплат (address,amount) для multi-send кошелька
+    2. выплата одной транзакцией из кошелька
+    3. approve с tx_hash выплаты (или reject с причиной)
+
+    Каждый шаг - один commit: статусы заявок, связанные транзакции,
+    балансы, журнал и уведомления обновляются set-based запросами.
+    """
+
+    MAX_BATCH_SIZE = 500
+
+    # Транзакция заявки - последняя PENDING WITHDRAW транзакция пользователя,
+    # как в одиночных endpoints (у пользователя одна активная заявка)
+    TRANSACTION_MATCH = """
+        t.id IN (
+            SELECT DISTINCT ON (p.user_id) p.id
+            FROM transactions p
+            JOIN {requests} r ON r.user_id = p.user_id
+            WHERE p.type = 'WITHDRAW'
+              AND p.status = 'PENDING'
+            ORDER BY p.user_id, p.created_at DESC
+        )
+    """
+
+    @staticmethod
+    def payout_file(rows: List) -> str:
+        """CSV для multi-send кошелька: address,amount (TON)"""
+        lines = ["address,amount"]
+        for row in rows:
+            lines.append(f"{row.ton_address},{Decimal(row.ton_amount).normalize():f}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    async def export_payout(
+        db: AsyncSession,
+        withdrawal_ids: Optional[List[int]] = None,
+        limit: int = MAX_BATCH_SIZE
+    ) -> Dict:
+        """
+        Взять заявки в работу и сформировать файл выплат
+
+        Args:
+            db: Database session
+            withdrawal_ids: Конкретные заявки (по умолчанию - самые старые PENDING)
+            limit: Максимум заявок в файле
+
+        Returns:
+            {"withdrawal_ids", "total_ton", "file"}
+        """
+        try:
+            result = await db.execute(
+                text("""
+                    WITH picked AS (
+                        SELECT id
+                        FROM withdrawal_requests
+                        WHERE status = 'PENDING'
+                          AND ton_amount IS NOT NULL
+                          AND (CAST(:ids AS BIGINT[]) IS NULL OR id = ANY(CAST(:ids AS BIGINT[])))
+                        ORDER BY created_at
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE withdrawal_requests w
+                    SET status = 'PROCESSING', updated_at = now()
+                    FROM picked
+                    WHERE w.id = picked.id
+                    RETURNING w.id, w.ton_address, w.ton_amount
+                """),
+                {"ids": withdrawal_ids, "limit": limit}
+            )
+            rows = sorted(result.all(), key=lambda row: row.id)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        total_ton = sum((row.ton_amount for row in rows), Decimal("0"))
+        if rows:
+            logger.info(f"📤 Файл выплат: {len(rows)} заявок на {total_ton} TON")
+
+        return {
+            "withdrawal_ids": [row.id for row in rows],
+            "total_ton": total_ton,
+            "file": WithdrawalBatchService.payout_file(rows),
+        }
+
+    @staticmethod
+    async def approve(
+        db: AsyncSession,
+        withdrawal_ids: List[int],
+        tx_hash: str,
+        admin_note: Optional[str] = None
+    ) -> List[int]:
+        """
+        Отметить заявки выполненными по хэшу выплаты
+
+        Заявки не в статусе PENDING/PROCESSING пропускаются.
+
+        Returns:
+            ID выполненных заявок
+        """
+        try:
+            result = await db.execute(
+                text(f"""
+                    WITH completed AS (
+                        UPDATE withdrawal_requests w
+                        SET status = 'COMPLETED',
+                            tx_hash = :tx_hash,
+                            admin_note = COALESCE(:admin_note, w.admin_note),
+                            processed_at = now(),
+                            updated_at = now()
+                        WHERE w.id = ANY(CAST(:ids AS BIGINT[]))
+                          AND w.status IN ('PENDING', 'PROCESSING')
+                        RETURNING w.id, w.user_id, w.pred_amount, w.ton_amount
+                    ), transactions_done AS (
+                        UPDATE transactions t
+                        SET status = 'COMPLETED', tx_hash = :tx_hash, completed_at = now()
+                        WHERE {WithdrawalBatchService.TRANSACTION_MATCH.format(requests="completed")}
+                    )
+                    SELECT w.id, w.user_id, w.pred_amount, w.ton_amount, u.telegram_id
+                    FROM completed w
+                    JOIN users u ON u.id = w.user_id
+                """),
+                {"ids": withdrawal_ids, "tx_hash": tx_hash, "admin_note": admin_note}
+            )
+            rows = result.all()
+
+            await TelegramQueueService.add_notifications(db, [
+                {
+                    "telegram_id": row.telegram_id,
+                    "user_id": row.user_id,
+                    "message_text": (
+                        f"✅ <b>Вывод выполнен</b>\n\n"
+                        f"🪙 PRED: <b>{row.pred_amount}</b>\n"
+                        f"💎 TON: <b>{Decimal(row.ton_amount).normalize():f}</b>\n\n"
+                        f"Транзакция: <code>{html.escape(tx_hash)}</code>"
+                    ),
+                    "notification_type": NotificationType.SYSTEM,
+                    "metadata": {"withdrawal_id": row.id},
+                }
+                for row in rows
+            ])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        if rows:
+            logger.info(f"✅ Выполнено {len(rows)} заявок на вывод, tx_hash={tx_hash}")
+        return [row.id for row in rows]
+
+    @staticmethod
+    async def reject(db: AsyncSession, withdrawal_ids: List[int], reason: str) -> List[int]:
+        """
+        Отклонить заявки и вернуть PRED на балансы
+
+        Заявки не в статусе PENDING/PROCESSING пропускаются.
+
+        Returns:
+            ID отклоненных заявок
+        """
+        try:
+            result = await db.execute(
+                text(f"""
+                    WITH rejected AS (
+                        UPDATE withdrawal_requests w
+                        SET status = 'REJECTED',
+                            admin_note = :reason,
+                            processed_at = now(),
+                            updated_at = now()
+                        WHERE w.id = ANY(CAST(:ids AS BIGINT[]))
+                          AND w.status IN ('PENDING', 'PROCESSING')
+                        RETURNING w.id, w.user_id, w.pred_amount
+                    ), transactions_failed AS (
+                        UPDATE transactions t
+                        SET status = 'FAILED', description = t.description || ' (отклонена: ' || :reason || ')'
+                        WHERE {WithdrawalBatchService.TRANSACTION_MATCH.format(requests="rejected")}
+                    ), refunded AS (
+                        UPDATE users u
+                        SET pred_balance = u.pred_balance + r.pred_amount
+                        FROM (
+                            SELECT user_id, SUM(pred_amount) AS pred_amount
+                            FROM rejected
+                            GROUP BY user_id
+                        ) r
+                        WHERE u.id = r.user_id
+                        RETURNING u.id, u.telegram_id
+                    )
+                    SELECT w.id, w.user_id, w.pred_amount, r.telegram_id
+                    FROM rejected w
+                    JOIN refunded r ON r.id = w.user_id
+                """),
+                {"ids": withdrawal_ids, "reason": reason}
+            )
+            rows = result.all()
+
+            await LedgerService.post(db, [
+                LedgerService.movement(
+                    row.user_id, row.pred_amount, "PRED", "withdrawal_refund", LedgerService.WITHDRAWALS,
+                    f"withdrawal:{row.id}"
+                )
+                for row in rows
+            ])
+            await TelegramQueueService.add_notifications(db, [
+                {
+                    "telegram_id": row.telegram_id,
+                    "user_id": row.user_id,
+                    "message_text": (
+                        f"❌ <b>Заявка на вывод отклонена</b>\n\n"
+                        f"Причина: {html.escape(reason)}\n\n"
+                        f"🪙 <b>{row.pred_amount}</b> PRED возвращены на баланс"
+                    ),
+                    "notification_type": NotificationType.SYSTEM,
+                    "metadata": {"withdrawal_id": row.id},
+                }
+                for row in rows
+            ])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        if rows:
+            logger.info(f"❌ Отклонено {len(rows)} заявок на вывод: {reason}")
+        return [row.id for row in rows]
@@ -7,6 +7,7 @@ Consumer для отправки Telegram уведомлений из очере
 Цель: избежать spam filtering в Telegram за счет:
 - Rate limiting: 0.5 секунды между сообщениями + пауза 5 секунд каждые 20 сообщений
 - Дедупликация сообщений
+- Склейка однотипных сообщений одному пользователю в дайджест
 - Graceful degradation при ошибках
 - Retry логика с экспоненциальной задержкой
 """
@@ -64,7 +65,8 @@ class TelegramNotificationsConsumer:
 
         self.batch_size = 10               # Количество сообщений для обработки за раз
         self.poll_interval = 1             # Интервал опроса БД (секунды)
-        self.cleanup_interval = 3600       # Очистка старых сообщений каждый час
+        self.cleanup_interval = 3600       # Обслуживание партиций очереди каждый час
+        self.coalesce_window = settings.NOTIFICATION_COALESCE_WINDOW_SECONDS  # Окно склейки в дайджест
 
         logger.info("🚀 Telegram Notifications Consumer инициализирован")
 
@@ -93,11 +95,22 @@ class TelegramNotificationsConsumer:
         while self.running:
             try:
                 async with AsyncSessionLocal() as db:
+                    # Склеиваем однотипные сообщения одному пользователю в дайджест
+                    # прямо перед выборкой: склеиваемые сообщения ждут окончания окна
+                    if self.coalesce_window > 0:
+                        coalesced_count = await TelegramQueueService.coalesce_pending_messages(
+                            db=db,
+                            window_seconds=self.coalesce_window
+                        )
+                        if coalesced_count > 0:
+                            logger.info(f"🧩 Склеено {coalesced_count} сообщений в дайджесты")
+
                     # Получаем pending сообщения с блокировкой строк
                     messages = await TelegramQueueService.get_pending_messages(
                         db=db,
                         limit=self.batch_size,
-                        include_scheduled=True
+                        include_scheduled=True,
+                        coalesce_window_seconds=self.coalesce_window
                     )
 
                     if not messages:
@@ -231,27 +244,32 @@ class TelegramNotificationsConsumer:
                     )
 
     async def _cleanup_loop(self):
-        """Периодическая очистка старых сообщений"""
+        """Периодическое обслуживание партиций очереди"""
         while self.running:
             try:
-                await asyncio.sleep(self.cleanup_interval)
-
                 async with AsyncSessionLocal() as db:
-                    deleted_count = await TelegramQueueService.cleanup_old_messages(
+                    # Партиции на ближайшие дни создаем заранее
+                    created_count = await TelegramQueueService.ensure_partitions(db=db, days_ahead=7)
+                    if created_count > 0:
+                        logger.info(f"🗂 Создано {created_count} новых партиций очереди")
+
+                    dropped_count = await TelegramQueueService.cleanup_old_messages(
                         db=db,
-                        days=7  # Удаляем сообщения старше 7 дней
+                        days=7  # Удаляем партиции старше 7 дней
                     )
 
-                    if deleted_count > 0:
-                        logger.info(f"🧹 Очистка: удалено {deleted_count} старых сообщений")
+                    if dropped_count > 0:
+                        logger.info(f"🧹 Очистка: удалено {dropped_count} старых партиций")
 
                     # Логируем статистику очереди
-                    stats = await TelegramQueueService.get_queue_stats(db=db)
+                    stats = await TelegramQueueService.get_queue_stats(db=db, use_cache=False)
                     logger.info(f"📊 Статистика очереди: {stats}")
 
             except Exception as e:
                 logger.error(f"❌ Ошибка в cleanup loop: {e}", exc_info=True)
 
+            await asyncio.sleep(self.cleanup_interval)
+
 
 async def main():
     """Точка входа"""
@@ -4,6 +4,7 @@ Handles all HTTP requests to the FastAPI backend
 """
 import aiohttp
 import os
+from urllib.parse import urlencode
 from typing import Optional, Dict, List, Any
 
 
@@ -32,13 +33,13 @@ class BackendAPIClient:
             response.raise_for_status()
             return await response.json()
 
-    async def _post(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _post(self, endpoint: str, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """Make POST request"""
         if not self.session:
             self.session = aiohttp.ClientSession()
 
         url = f"{self.base_url}{endpoint}"
-        async with self.session.post(url, json=data) as response:
+        async with self.session.post(url, json=data, headers=headers) as response:
             response.raise_for_status()
             return await response.json()
 
@@ -58,9 +59,20 @@ class BackendAPIClient:
         """Get list of markets"""
         endpoint = f"/markets/"
         if category:
-            endpoint += f"?category={category}"
+            endpoint += f"?{urlencode({'category': category})}"
         return await self._get(endpoint)
 
+    async def search_markets(self, query: str, category: Optional[str] = None, limit: int = 20) -> Dict:
+        """Full-text search over markets with category facets"""
+        params = {"q": query, "limit": limit}
+        if category:
+            params["category"] = category
+        return await self._get(f"/markets/search?{urlencode(params)}")
+
+    async def get_market_categories(self) -> List[Dict]:
+        """Market counts per category"""
+        return await self._get("/markets/categories")
+
     async def get_market(self, market_id: int) -> Dict:
         """Get market details"""
         return await self._get(f"/markets/{market_id}")
@@ -352,6 +352,30 @@ async def api_markets():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/markets/search')
+async def api_markets_search():
+    """Search markets by title/description"""
+    try:
+        query = request.args.get('q', '').strip()
+        category = request.args.get('category')
+        if len(query) < 2:
+            return jsonify({"items": [], "total": 0, "facets": []})
+        result = await api_client.search_markets(query, category=category)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/markets/categories')
+async def api_market_categories():
+    """Get market counts per category from backend API"""
+    try:
+        categories = await api_client.get_market_categories()
+        return jsonify(categories)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/markets/<int:market_id>')
 async def api_market_detail(market_id):
     """Get market details from backend API"""
@@ -592,7 +616,9 @@ async def api_missions_by_user(user_id):
 async def api_claim_mission_new(user_id, mission_id):
     """Claim mission reward via backend API"""
     try:
-        response = await api_client._post(f"/missions/claim/{user_id}/{mission_id}", {})
+        idempotency_key = request.headers.get('Idempotency-Key')
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+        response = await api_client._post(f"/missions/claim/{user_id}/{mission_id}", {}, headers=headers)
         return jsonify(response)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
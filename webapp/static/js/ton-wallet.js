@@ -582,7 +582,7 @@ class TONWallet {
                     {
                         address: toAddress,
                         amount: (parseFloat(amountTON) * 1e9).toString(), // Convert to nanotons
-                        payload: comment ? btoa(comment) : undefined
+                        payload: comment ? textCommentPayload(comment) : undefined
                     }
                 ]
             };
@@ -645,23 +645,20 @@ class TONWallet {
             const txResult = await this.sendTransaction(
                 depositData.deposit_address,
                 depositData.amount_ton,
-                `ThePred Deposit #${depositData.transaction_id}`
+                depositData.comment || `ThePred Deposit #${depositData.transaction_id}`
             );
 
             if (!txResult.success) {
                 throw new Error('Transaction failed');
             }
 
-            // Step 3: Verify on backend
-            console.log('Verifying transaction...');
-            const verifyResult = await this.verifyDeposit(
-                depositData.transaction_id,
-                txResult.boc
-            );
+            // Step 3: Wait for the backend deposit watcher to credit it (matched by comment)
+            console.log('Waiting for deposit confirmation...');
+            const statusResult = await this.pollDepositStatus(depositData.transaction_id);
 
             return {
                 success: true,
-                ...verifyResult
+                ...statusResult
             };
 
         } catch (error) {
@@ -814,6 +811,46 @@ class TONWallet {
 window.tonWallet = new TONWallet();
 
 // Helper function to format TON amount
+/**
+ * CRC32C (Castagnoli) - checksum of a serialized BOC
+ */
+function crc32c(bytes) {
+    let crc = 0xFFFFFFFF;
+    for (const byte of bytes) {
+        crc ^= byte;
+        for (let i = 0; i < 8; i++) {
+            crc = (crc >>> 1) ^ (0x82F63B78 & -(crc & 1));
+        }
+    }
+    return (crc ^ 0xFFFFFFFF) >>> 0;
+}
+
+/**
+ * TON Connect payload for a text comment: base64 BOC of one cell
+ * with op = 0 (32 bits) followed by the UTF-8 text.
+ * Wallets and TonAPI show it as the transfer comment, which the
+ * backend deposit watcher uses to match the deposit.
+ */
+function textCommentPayload(comment) {
+    const text = new TextEncoder().encode(comment);
+    if (text.length > 123) {
+        throw new Error('Comment too long');
+    }
+
+    // Cell: refs descriptor, bits descriptor (byte-aligned data), data
+    const data = new Uint8Array(4 + text.length);
+    data.set(text, 4);
+    const cell = [0x00, data.length * 2, ...data];
+
+    // BOC: magic, flags (crc32c, 1-byte cell refs), 1-byte offsets,
+    // 1 cell, 1 root, 0 absent, cells size, root index 0
+    const boc = [0xb5, 0xee, 0x9c, 0x72, 0x41, 0x01, 0x01, 0x01, 0x00, cell.length, 0x00, ...cell];
+    const crc = crc32c(boc);
+    boc.push(crc & 0xff, (crc >>> 8) & 0xff, (crc >>> 16) & 0xff, (crc >>> 24) & 0xff);
+
+    return btoa(String.fromCharCode(...boc));
+}
+
 function formatTON(amount, decimals = 2) {
     return parseFloat(amount).toFixed(decimals);
 }